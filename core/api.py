@@ -0,0 +1,267 @@
+"""
+Read-only JSON API for the rider and collection-centre apps, under ``/api/v1/``.
+
+Every list endpoint takes:
+
+* ``?fields=id,status,...``: only these fields (default: all but the nested
+  ones). Only the columns and joins those fields need are queried.
+* ``?limit=``: page size, up to ``MAX_PAGE_SIZE``.
+* ``?cursor=``: the ``next`` value of the previous page. Pages are cut on
+  the ordering columns (newest first) rather than with OFFSET, so deep
+  pages cost the same as the first one and rows added meanwhile don't shift
+  the pages.
+
+Rows are read with ``values()`` and go straight into the JSON, no model
+instances. Each role only sees its own rows (``Resource.scopes``); the
+others get a 403. Uses the normal login session; without one it's a 401.
+"""
+import base64
+import binascii
+import functools
+import json
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import JsonResponse
+
+from core.decorators import query_budget, read_only_view
+from core.models import (
+    CustomUser, Delivery, Order, OrderItem, PaddyInventory, PaddyPrice, PaddySupply, ProcessedRiceInventory,
+    SoldRiceInventory,
+)
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+Role = CustomUser.Role
+
+
+class BadRequest(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Resource:
+    model: type
+    # API name -> ORM path
+    fields: dict
+    # ORM paths the pages are ordered by, newest first; the last one unique
+    ordering: tuple
+    # Role -> function(request) giving the filter() kwargs of the rows it sees
+    scopes: dict
+    # API name -> function(pks) giving {pk: value}, one query per page
+    nested: dict = field(default_factory=dict)
+
+
+def order_items(order_ids):
+    items = {}
+    rows = OrderItem.objects.filter(order_id__in=order_ids).values_list(
+        'order_id', 'package_size__label', 'package_size__weight_kg', 'package_size__price_per_package', 'quantity',
+    )
+    for order_id, label, weight_kg, price, quantity in rows:
+        items.setdefault(order_id, []).append(
+            {'package': label, 'weight_kg': weight_kg, 'price_per_package': price, 'quantity': quantity}
+        )
+    return items
+
+
+def everything(request):
+    return {}
+
+
+RESOURCES = {
+    'orders': Resource(
+        model=Order,
+        fields={
+            'id': 'id', 'status': 'status', 'created_at': 'created_at', 'updated_at': 'updated_at',
+            'customer_name': 'customer_name', 'phone_number': 'phone_number',
+            'delivery_address': 'delivery_address', 'delivery_date': 'delivery_date',
+            'delivery_personnel': 'delivery_personnel_id', 'total_kg': 'total_kg', 'total_amount': 'total_amount',
+        },
+        ordering=('created_at', 'id'),
+        scopes={
+            Role.ADMIN: everything,
+            Role.CUSTOMER: lambda request: {'customer': request.profile},
+            Role.DELIVERY: lambda request: {'delivery_personnel': request.profile},
+        },
+        nested={'items': order_items},
+    ),
+    'supplies': Resource(
+        model=PaddySupply,
+        fields={
+            'id': 'id', 'farmer': 'farmer_id', 'farmer_username': 'farmer__user__username',
+            'mill_operator': 'mill_operator_id', 'quantity': 'quantity', 'quality_rating': 'quality_rating',
+            'moisture_content': 'moisture_content', 'status': 'status', 'total_amount': 'total_amount',
+            'payment_status': 'payment_status', 'payment_approved_at': 'payment_approved_at',
+            'payment_reference_code': 'payment_reference_code', 'timestamp': 'timestamp',
+        },
+        ordering=('timestamp', 'id'),
+        # Same split as the supply list page
+        scopes={
+            Role.ADMIN: everything,
+            Role.MILL_OPERATOR: lambda request: {'mill_operator': request.user},
+            Role.FARMER: lambda request: {'farmer': request.profile},
+        },
+    ),
+    'deliveries': Resource(
+        model=Delivery,
+        fields={
+            'id': 'id', 'order': 'order_id', 'order_status': 'order__status',
+            'delivery_personnel': 'delivery_personnel_id', 'delivery_address': 'delivery_address',
+            'delivery_date': 'delivery_date', 'is_delivered': 'is_delivered',
+        },
+        ordering=('id',),
+        scopes={
+            Role.ADMIN: everything,
+            Role.CUSTOMER: lambda request: {'order__customer': request.profile},
+            Role.DELIVERY: lambda request: {'delivery_personnel': request.profile},
+        },
+    ),
+    'prices': Resource(
+        model=PaddyPrice,
+        fields={'id': 'id', 'price_per_kg': 'price_per_kg', 'effective_date': 'effective_date'},
+        ordering=('effective_date', 'id'),
+        scopes=dict.fromkeys(Role.values, everything),
+    ),
+}
+
+# Single-row inventories: API name -> model
+INVENTORIES = {'paddy_kg': PaddyInventory, 'processed_kg': ProcessedRiceInventory, 'sold_kg': SoldRiceInventory}
+
+
+def error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def requested_fields(request, available, default):
+    if not request.GET.get('fields'):
+        return list(default)
+    names = list(dict.fromkeys(name.strip() for name in request.GET['fields'].split(',') if name.strip()))
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}.")
+    return names
+
+
+def page_size(request):
+    try:
+        limit = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise BadRequest("limit must be a number.")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(values):
+    # str() rather than DjangoJSONEncoder, which cuts datetimes to milliseconds
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+
+def decode_cursor(cursor, model, ordering):
+    """The values of ``cursor``, converted for the ``ordering`` columns of ``model``."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeError, ValueError):
+        values = None
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise BadRequest("Invalid cursor.")
+    try:
+        # The ordering columns are never null
+        values = [model._meta.get_field(path).to_python(value) for path, value in zip(ordering, values)]
+    except (ValidationError, ValueError, TypeError):
+        raise BadRequest("Invalid cursor.")
+    if None in values:
+        raise BadRequest("Invalid cursor.")
+    return values
+
+
+def after(ordering, values):
+    """Rows after ``values`` in ``ordering`` (all descending)."""
+    condition = Q()
+    for i in reversed(range(len(ordering))):
+        step = Q(**{f'{ordering[i]}__lt': values[i]})
+        condition = step | (Q(**{ordering[i]: values[i]}) & condition) if condition else step
+    return condition
+
+
+def list_rows(request, resource):
+    scope = resource.scopes.get(request.user.role)
+    if scope is None:
+        return error("You don't have access to this resource.", status=403)
+
+    names = requested_fields(request, [*resource.fields, *resource.nested], resource.fields)
+    limit = page_size(request)
+    columns = [resource.fields[name] for name in names if name in resource.fields]
+    # The ordering columns are needed for the next cursor, and 'pk' to attach
+    # nested fields; they're dropped again below unless requested
+    extra = [path for path in [*resource.ordering, 'pk'] if path not in columns]
+
+    queryset = resource.model.objects.filter(**scope(request)).order_by(*(f'-{path}' for path in resource.ordering))
+    if request.GET.get('cursor'):
+        values = decode_cursor(request.GET['cursor'], resource.model, resource.ordering)
+        queryset = queryset.filter(after(resource.ordering, values))
+    rows = list(queryset.values(*columns, *extra)[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][path] for path in resource.ordering])
+
+    nested = {
+        name: resource.nested[name]([row['pk'] for row in rows]) for name in names if name in resource.nested
+    }
+    results = []
+    for row in rows:
+        item = {}
+        for name in names:
+            if name in nested:
+                item[name] = nested[name].get(row['pk'], [])
+            else:
+                item[name] = row[resource.fields[name]]
+        results.append(item)
+    return JsonResponse({'results': results, 'next': next_cursor})
+
+
+def api_view(*methods):
+    """
+    Only allow ``methods``, and answer with JSON errors instead of the login
+    redirect and HTML error pages.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return error("Authentication required.", status=401)
+            if request.method not in methods:
+                return error(f"Method not allowed; use {', '.join(methods)}.", status=405)
+            try:
+                return view(request, *args, **kwargs)
+            except BadRequest as e:
+                return error(str(e))
+        return wrapper
+    return decorator
+
+
+def resource_view(name):
+    def view(request):
+        return list_rows(request, RESOURCES[name])
+    view.__name__ = view.__qualname__ = f'api_{name}'
+    return read_only_view(query_budget(3)(api_view('GET', 'HEAD')(view)))
+
+
+orders = resource_view('orders')
+supplies = resource_view('supplies')
+deliveries = resource_view('deliveries')
+prices = resource_view('prices')
+
+
+@read_only_view
+@query_budget(4)
+@api_view('GET', 'HEAD')
+def inventory(request):
+    if request.user.role not in (Role.ADMIN, Role.MILL_OPERATOR):
+        return error("You don't have access to this resource.", status=403)
+    names = requested_fields(request, INVENTORIES, INVENTORIES)
+    return JsonResponse({
+        name: INVENTORIES[name].objects.values_list('quantity', flat=True).first() for name in names
+    })
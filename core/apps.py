@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.contrib.staticfiles.apps import StaticFilesConfig as BaseStaticFilesConfig
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core import checks  # noqa: F401  Registers the system checks
+        from core import db  # noqa: F401  Registers the connection_created receiver
+
+
+class StaticFilesConfig(BaseStaticFilesConfig):
+    # The full Font Awesome distribution is only the input of
+    # `manage.py buildicons`; pages use the subset in core/static/core/icons
+    ignore_patterns = BaseStaticFilesConfig.ignore_patterns + ['fontawsome']
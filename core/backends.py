@@ -1,18 +1,132 @@
+import hashlib
+
+from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Lower
+from django.db.models.lookups import Exact
 
 UserModel = get_user_model()
 
+LOGIN_MISS_CACHE_PREFIX = 'auth:login-miss:'
+USER_CACHE_PREFIX = 'auth:user:'
+
+
+def _login_miss_key(identifier):
+    # Folds only ASCII, like SQLite's LOWER(): identifiers the database tells
+    # apart must not share a remembered miss
+    folded = ''.join(c.lower() if c.isascii() else c for c in identifier.strip())
+    digest = hashlib.sha256(folded.encode()).hexdigest()
+    return LOGIN_MISS_CACHE_PREFIX + digest
+
+
+def forget_login_misses(*identifiers):
+    """Drop cached "unknown account" results for the given emails/usernames."""
+    cache.delete_many([_login_miss_key(i) for i in identifiers if i])
+
+
+def _user_cache_key(user_id):
+    # The session stores the id as text; normalise it so every spelling of
+    # the same UUID maps to one key
+    return USER_CACHE_PREFIX + str(UserModel._meta.pk.to_python(user_id))
+
+
+def forget_cached_user(user_id):
+    """Drop the cached copy of a user kept by ``get_user``."""
+    if user_id is not None:
+        key = _user_cache_key(user_id)
+        cache.delete(key)
+        # Again after the commit, in case a request cached the old row
+        # while the change was still uncommitted
+        transaction.on_commit(lambda: cache.delete(key))
+
+
+def _cacheable(user):
+    """
+    ``user`` without its password hash, for the cache. It keeps the session
+    hash worked out from it (``CustomUser.get_session_auth_hash``), and the
+    hash itself is loaded from the database on the rare request that needs
+    it (a password change) like any deferred field.
+    """
+    user._session_auth_hash = user.get_session_auth_hash()
+    del user.__dict__['password']
+    return user
+
+
 class EmailOrUsernameModelBackend(ModelBackend):
+    """
+    Log in with either the email or the username, ignoring case.
+
+    Anything containing an ``@`` is looked up as an email first, then as a
+    username; everything else only as a username. Both sides are lowercased
+    by the database, so they fold alike (SQLite's ``LOWER()`` only folds
+    ASCII), and ``LOWER(column)`` lets it use the functional indexes
+    declared on ``CustomUser``.
+    Identifiers that match no account are cached for
+    ``AUTH_NEGATIVE_CACHE_TIMEOUT`` seconds so a login flood for unknown
+    accounts doesn't hit the database again. The password hasher still
+    runs, so unknown accounts take as long as wrong passwords.
+
+    Permissions (``has_perm`` and friends, used by the admin) are
+    ``ModelBackend``'s, inherited unchanged.
+    """
+
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            user = UserModel.objects.get(
-                Q(username__iexact=username) | Q(email__iexact=username)
-            )
-        except UserModel.DoesNotExist:
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        miss_key = _login_miss_key(username)
+        if cache.get(miss_key):
+            # Spares the query, not the hasher: every miss takes as long as
+            # a wrong password, so timing doesn't tell which accounts exist
+            UserModel().set_password(password)
+            return None
+
+        identifier = Lower(Value(username.strip()))
+        for field in ('email', 'username') if '@' in username else ('username',):
+            try:
+                user = UserModel._default_manager.get(Exact(Lower(field), identifier))
+            except UserModel.DoesNotExist:
+                continue
+            except UserModel.MultipleObjectsReturned:
+                # Accounts differing only by case are ambiguous; refuse both.
+                UserModel().set_password(password)
+                return None
+            break
+        else:
+            cache.set(miss_key, True, getattr(settings, 'AUTH_NEGATIVE_CACHE_TIMEOUT', 60))
+            # Run the hasher once anyway, like ModelBackend
+            UserModel().set_password(password)
             return None
 
         if user.check_password(password) and self.user_can_authenticate(user):
             return user
         return None
+
+    def get_user(self, user_id):
+        # Called by AuthenticationMiddleware on every request. The user is
+        # loaded with its role profile in one query (request.profile, see
+        # ProfileMiddleware, then costs nothing) and kept in the cache for
+        # USER_CACHE_TIMEOUT seconds, without the password hash. Saving or
+        # deleting the user or its profile, and logging out, drop the cached
+        # copy (see core.models); that only reaches every worker when the
+        # cache is shared (core.checks.check_shared_cache).
+        try:
+            key = _user_cache_key(user_id)
+        except ValidationError:
+            return None
+        user = cache.get(key)
+        if user is None:
+            relations = UserModel.PROFILE_RELATIONS.values()
+            try:
+                user = UserModel._default_manager.select_related(*relations).get(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            cache.set(key, _cacheable(user), getattr(settings, 'USER_CACHE_TIMEOUT', 300))
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,153 @@
+"""
+Benchmarks for the order, supply and inventory hot paths.
+
+Each scenario requests one view as a user of the right role through the test
+client, timing every request and counting its queries. ``run_benchmarks``
+returns the numbers per scenario; the ``benchmark`` management command builds
+the datasets, prints the report and compares against a stored baseline.
+"""
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.instrumentation import percentile
+from core.models import CustomUser, Farmer, Order, OrderItem, PackageSize, PaddySupply, ProcessedRice, Transaction
+
+DATASET_SIZES = {
+    'small': dict(farmers=50, customers=100, riders=5, operators=3, months=1,
+                  supplies_per_day=30, orders_per_day=20),
+    'medium': dict(farmers=500, customers=1000, riders=30, operators=10, months=3,
+                   supplies_per_day=200, orders_per_day=150),
+    'large': dict(farmers=2000, customers=5000, riders=100, operators=20, months=12,
+                  supplies_per_day=500, orders_per_day=400),
+}
+
+
+@dataclass
+class Scenario:
+    name: str
+    url_name: str
+    role: str
+    method: str = 'get'
+    # Called before every request with the scenario's user; returns
+    # (url kwargs, POST data). Its queries are not counted.
+    prepare: Optional[Callable] = None
+    expected_status: int = 200
+    # Model a POST must add one row to, so a form re-rendered with its
+    # errors isn't timed as a success
+    creates: Optional[type] = None
+
+
+def _place_order(user):
+    return {}, {f'package_{p.id}': 1 for p in PackageSize.objects.all()[:2]}
+
+
+def _record_supply(user):
+    farmer = Farmer.objects.order_by('id').first()
+    return {}, {'farmer': farmer.pk, 'quantity': '120.00', 'quality_rating': 4, 'moisture_content': '13.50'}
+
+
+def _process_rice(user):
+    return {}, {'quantity': '1.00'}
+
+
+def _enter_transaction_code(user):
+    order = Order.objects.create(customer=user.customer)
+    OrderItem.objects.create(order=order, package_size=PackageSize.objects.order_by('weight_kg').first(), quantity=1)
+    order.calculate_totals()
+    return {'order_id': order.id}, {'transaction_code_customer': f'BENCH{order.id}'}
+
+
+SCENARIOS = [
+    Scenario('admin_dashboard', 'admin_dashboard', CustomUser.Role.ADMIN),
+    Scenario('farmer_dashboard', 'farmer_dashboard', CustomUser.Role.FARMER),
+    Scenario('customer_dashboard', 'customer_dashboard', CustomUser.Role.CUSTOMER),
+    Scenario('delivery_dashboard', 'delivery_dashboard', CustomUser.Role.DELIVERY),
+    Scenario('mill_operator_dashboard', 'mill_operator_dashboard', CustomUser.Role.MILL_OPERATOR),
+    Scenario('supply_list (admin)', 'supply_list', CustomUser.Role.ADMIN),
+    Scenario('supply_list (operator)', 'supply_list', CustomUser.Role.MILL_OPERATOR),
+    Scenario('order_list', 'order_list', CustomUser.Role.CUSTOMER),
+    Scenario('admin_order_list', 'admin_order_list', CustomUser.Role.ADMIN),
+    Scenario('all_transactions', 'all_transactions', CustomUser.Role.ADMIN),
+    Scenario('assign_delivery', 'assign_delivery', CustomUser.Role.ADMIN),
+    Scenario('user_list', 'admin-user-list', CustomUser.Role.ADMIN),
+    Scenario('inventory', 'inventory_view', CustomUser.Role.ADMIN),
+    Scenario('place_order', 'place_order', CustomUser.Role.CUSTOMER, 'post', _place_order, creates=Order),
+    Scenario('record_supply', 'record_supply', CustomUser.Role.MILL_OPERATOR, 'post', _record_supply,
+             expected_status=302, creates=PaddySupply),
+    Scenario('process_rice', 'process_rice', CustomUser.Role.MILL_OPERATOR, 'post', _process_rice,
+             creates=ProcessedRice),
+    Scenario('enter_transaction_code', 'enter_transaction_code', CustomUser.Role.CUSTOMER, 'post',
+             _enter_transaction_code, expected_status=302, creates=Transaction),
+]
+
+
+def benchmark_user(role):
+    """The first user of ``role`` (deterministic for a generated dataset)."""
+    return CustomUser.objects.filter(role=role, is_active=True).order_by('username').first()
+
+
+def run_scenario(scenario, iterations=20, warmup=2):
+    user = benchmark_user(scenario.role)
+    if user is None:
+        raise ValueError(f"No {scenario.role} user to run {scenario.name!r} as.")
+    client = Client()
+    client.force_login(user)
+
+    timings, queries = [], []
+    for i in range(warmup + iterations):
+        url_kwargs, data = scenario.prepare(user) if scenario.prepare else ({}, None)
+        url = reverse(scenario.url_name, kwargs=url_kwargs)
+        request = getattr(client, scenario.method)
+        rows = scenario.creates.objects.count() if scenario.creates else None
+
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = request(url, data) if data is not None else request(url)
+            elapsed = time.perf_counter() - started
+
+        if response.status_code != scenario.expected_status:
+            raise AssertionError(f"{scenario.name}: {url} returned {response.status_code}")
+        if rows is not None and scenario.creates.objects.count() != rows + 1:
+            raise AssertionError(f"{scenario.name}: {url} didn't create a {scenario.creates.__name__}")
+        if i >= warmup:
+            timings.append(elapsed * 1000)
+            queries.append(len(captured))
+
+    return {
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'queries': max(queries),
+    }
+
+
+def run_benchmarks(iterations=20, warmup=2, only=None):
+    return {
+        scenario.name: run_scenario(scenario, iterations, warmup)
+        for scenario in SCENARIOS
+        if not only or scenario.name in only or scenario.url_name in only
+    }
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    List regressions of ``results`` against ``baseline`` (same nested
+    ``{size: {scenario: metrics}}`` shape). A scenario regresses when it runs
+    more queries than before or its p95 grows by more than ``tolerance``.
+    """
+    regressions = []
+    for size, scenarios in results.items():
+        for name, metrics in scenarios.items():
+            before = baseline.get(size, {}).get(name)
+            if not before:
+                continue
+            if metrics['queries'] > before['queries']:
+                regressions.append(f"{size}/{name}: {before['queries']} -> {metrics['queries']} queries")
+            if metrics['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{size}/{name}: p95 {before['p95_ms']}ms -> {metrics['p95_ms']}ms")
+    return regressions
@@ -0,0 +1,91 @@
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+from django.template import Engine
+
+from core.warmup import template_files, template_loads
+
+
+@register(Tags.templates)
+def check_template_libraries(app_configs, **kwargs):
+    """
+    Every ``{% load %}`` in the project's templates must name an existing
+    library (core.E001) that the template actually uses (core.W001), and
+    every tag library the project ships should be loaded somewhere (core.W002).
+    """
+    engine = Engine.get_default()
+    messages = []
+    loaded = set()
+    for name, path in template_files(engine).items():
+        with open(path, encoding='utf-8') as f:
+            source = f.read()
+        for library, status in template_loads(source, engine):
+            loaded.add(library)
+            if status == 'unresolved':
+                messages.append(Error(
+                    f"{name} loads '{library}', which is not a registered tag library.",
+                    hint="Fix the name, or add the app providing it to INSTALLED_APPS.",
+                    obj=name, id='core.E001',
+                ))
+            elif status == 'unused':
+                messages.append(Warning(
+                    f"{name} loads '{library}' but uses none of its tags or filters.",
+                    hint="Remove the {% load %}.",
+                    obj=name, id='core.W001',
+                ))
+
+    # Only the project's own apps; installed packages may ship libraries
+    # for other people's templates
+    base = str(settings.BASE_DIR) + os.sep
+    project_apps = {
+        config.name for config in apps.get_app_configs()
+        if config.path.startswith(base) and 'site-packages' not in config.path
+    }
+    for library, module_path in engine.libraries.items():
+        if library in loaded or not any(module_path.startswith(app + '.') for app in project_apps):
+            continue
+        messages.append(Warning(
+            f"The tag library '{library}' ({module_path}) is not loaded by any template.",
+            hint="Delete it, or load it where it's needed.",
+            obj=module_path, id='core.W002',
+        ))
+    return messages
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Production needs a cache all workers share (core.E002). Sessions, the
+    users cached by the login backend and the fragment versions
+    (core.fragments) live in the default cache, and dropping or bumping an
+    entry (logout, password change, deactivation, a new price) only reaches
+    the worker that did it when each one has its own memory cache.
+    """
+    if settings.DEPLOYMENT_PROFILE != 'production':
+        return []
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend != 'django.core.cache.backends.locmem.LocMemCache':
+        return []
+    return [Error(
+        "The production profile uses the per-process memory cache.",
+        hint="Set RMAD_REDIS_URL to a shared Redis, or RMAD_CACHE_DIR on a single machine.",
+        obj='CACHES', id='core.E002',
+    )]
+
+
+@register()
+def check_release(app_configs, **kwargs):
+    """
+    Production needs a ``RELEASE`` every worker agrees on (core.E003): it is
+    part of the order pages' ETags, so a per-worker value would only let a
+    browser revalidate against the worker that served it.
+    """
+    if settings.DEPLOYMENT_PROFILE != 'production' or settings.RELEASE:
+        return []
+    return [Error(
+        "RELEASE is not set.",
+        hint="Set RMAD_RELEASE (e.g. to the deployed git commit), or deploy from a git checkout.",
+        obj='RELEASE', id='core.E003',
+    )]
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from core.fragments import CATALOG, PRICE, get_versions, profile_scope
+
+
+def fragment_cache(request):
+    """
+    ``fragment_versions`` (price, catalog and user) and ``fragment_timeout``
+    for the ``{% cache %}`` tags. The versions are only fetched from the cache
+    if a template actually uses them.
+    """
+    def versions():
+        profile = getattr(request, 'profile', None)
+        scope = profile_scope(profile.pk) if profile else None
+        found = get_versions(PRICE, CATALOG, *filter(None, [scope]))
+        return {'price': found[PRICE], 'catalog': found[CATALOG], 'user': found.get(scope, 0)}
+
+    return {
+        'fragment_versions': SimpleLazyObject(versions),
+        'fragment_timeout': getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 600),
+    }
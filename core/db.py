@@ -0,0 +1,22 @@
+"""
+Per-connection database setup.
+
+SQLite keeps most tuning in connection-level PRAGMAs, so they have to be
+re-applied to every new connection. ``settings.SQLITE_PRAGMAS`` lists them;
+it is empty unless the "sqlite-production" database profile is selected.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
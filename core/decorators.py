@@ -0,0 +1,55 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from core.httpcache import POLICIES
+
+
+@dataclass(frozen=True)
+class QueryBudget:
+    queries: int
+    duplicates: Optional[int] = None
+
+
+def query_budget(queries, duplicates=None):
+    """
+    Declare how many queries a view may run per request.
+
+    ``duplicates`` caps how often one SQL fingerprint may repeat (the shape of
+    an N+1 loop); it defaults to ``settings.QUERY_BUDGET_MAX_DUPLICATES``.
+    Budgets are enforced by ``core.middleware.QueryBudgetMiddleware`` when
+    ``QUERY_BUDGET_ENABLED`` is on. Works on view functions and on view
+    classes (decorate the class).
+    """
+    def decorator(view):
+        view.query_budget = QueryBudget(queries, duplicates)
+        return view
+    return decorator
+
+
+def read_only_view(view):
+    """
+    Let a view read from the replica database (see ``core.routers``).
+
+    Only GET/HEAD requests are routed there, and only when the user hasn't
+    written anything in the last ``REPLICA_STICKINESS_SECONDS``. Writes made
+    by the view still go to the primary. Works on view functions and classes.
+    """
+    view.read_only = True
+    return view
+
+
+def cache_policy(name):
+    """
+    Pick the ``Cache-Control`` policy of a view, one of
+    ``core.httpcache.POLICIES``. Views without one get
+    ``settings.CACHE_POLICY_DEFAULT``. Applied by
+    ``core.middleware.CachePolicyMiddleware`` to GET/HEAD responses that
+    don't set the header themselves. Works on view functions and classes.
+    """
+    if name not in POLICIES:
+        raise ValueError(f"Unknown cache policy {name!r}; pick one of {', '.join(POLICIES)}.")
+
+    def decorator(view):
+        view.cache_policy = name
+        return view
+    return decorator
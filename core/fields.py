@@ -0,0 +1,82 @@
+import secrets
+import threading
+import time
+import uuid
+
+from django.db import models
+
+_uuid7_lock = threading.Lock()
+_uuid7_last = [0, 0]  # [unix ms, sequence] of the last uuid7() in this process
+
+
+def uuid7(when=None, rng=None):
+    """
+    A time-ordered UUID (RFC 9562 version 7): 48 bits of Unix milliseconds,
+    then random bits. Keys made with it sort by creation time, so inserts
+    append to the end of the primary key B-tree instead of landing anywhere.
+
+    Within one process the ids are strictly increasing; the 12 bits after the
+    timestamp count up when several are made in the same millisecond. Pass a
+    datetime ``when`` and a ``random.Random`` ``rng`` to build reproducible
+    ids for past moments (e.g. generated data).
+    """
+    if when is not None:
+        ms = int(when.timestamp() * 1000)
+        rand = rng or secrets.SystemRandom()
+        sequence = rand.getrandbits(12)
+        tail = rand.getrandbits(62)
+    else:
+        ms = time.time_ns() // 1_000_000
+        tail = secrets.randbits(62)
+        with _uuid7_lock:
+            last_ms, last_sequence = _uuid7_last
+            if ms > last_ms:
+                # Start low enough in the millisecond to leave room for more
+                sequence = secrets.randbits(11)
+            else:
+                ms, sequence = last_ms, last_sequence + 1
+                if sequence > 0xFFF:
+                    ms, sequence = ms + 1, 0
+            _uuid7_last[:] = [ms, sequence]
+    return uuid.UUID(int=(ms & 0xFFFF_FFFF_FFFF) << 80 | 0x7 << 76 | sequence << 64 | 0b10 << 62 | tail)
+
+
+class CompactUUIDField(models.UUIDField):
+    """
+    A ``UUIDField`` stored as 16 raw bytes on SQLite.
+
+    Django's stock field keeps UUIDs in SQLite as 32-character hex text, which
+    doubles the size of every primary key, foreign key column and index built
+    on them. Databases with a native uuid type (PostgreSQL) use it as before.
+    Foreign keys pointing at this field get the same column type.
+    """
+    description = "Universally unique identifier (binary on SQLite)"
+
+    def get_internal_type(self):
+        # Not "UUIDField": backends would then run their own text-to-UUID
+        # converter on the raw bytes
+        return 'CompactUUIDField'
+
+    def db_type(self, connection):
+        if connection.vendor == 'sqlite':
+            return 'blob'
+        return connection.data_types['UUIDField']
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None:
+            return None
+        if not isinstance(value, uuid.UUID):
+            value = self.to_python(value)
+        if connection.vendor == 'sqlite':
+            return value.bytes
+        return super().get_db_prep_value(value, connection, prepared=True)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None or isinstance(value, uuid.UUID):
+            return value
+        if isinstance(value, bytes):
+            return uuid.UUID(bytes=value)
+        # Hex text on backends without a native uuid type
+        return uuid.UUID(value)
@@ -7,6 +7,7 @@ from django.contrib.auth.forms import (
 from django.utils.translation import gettext_lazy as _
 from .models import CustomUser, Delivery, Farmer, Customer, DeliveryPersonnel, MillOperator, Admin, Order, OrderItem, PackageSize, PaddyPrice, PaddySupply, ProcessedRice, SoldRiceInventory, Transaction
 from django.contrib.auth import get_user_model
+from django.urls import get_resolver
 
 
 class BaseForm:
@@ -195,6 +196,11 @@ class MillOperatorPaddySupplyForm(forms.ModelForm):
             'moisture_content': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Farmer.__str__ shows the user's name
+        self.fields['farmer'].queryset = Farmer.objects.select_related('user')
+
     def save(self, commit=True, user=None):
         instance = super().save(commit=False)
         if user:
@@ -340,7 +346,7 @@ class AssignDeliveryForm(forms.Form):
         queryset=Order.objects.filter(
             delivery_personnel__isnull=True,
             status='paid'
-        ).order_by('-created_at'),
+        ).select_related('customer__user').order_by('-created_at'),
         label='Select Order',
         empty_label="-- Select Order --",
         required=True,
@@ -353,7 +359,7 @@ class AssignDeliveryForm(forms.Form):
                 status='paid',
                 delivery_personnel__isnull=False
             ).values_list('delivery_personnel__id', flat=True)
-        ),
+        ).select_related('user'),
         label='Select Delivery Personnel',
         empty_label="-- Select Delivery Personnel --",
         required=True,
@@ -379,4 +385,44 @@ class DeliveryUpdateForm(forms.ModelForm):
 
         if commit:
             delivery.save()
-        return delivery
\ No newline at end of file
+        return delivery
+
+
+class ProfilerForm(BaseForm, forms.Form):
+    MODE_CHOICES = [
+        ('duration', 'Sample the whole worker for a number of seconds'),
+        ('requests', 'Profile the next requests to one URL name'),
+    ]
+
+    mode = forms.ChoiceField(choices=MODE_CHOICES, initial='duration')
+    seconds = forms.IntegerField(
+        min_value=1, max_value=120, initial=10,
+        help_text="How long to sample for. In request mode, how long to wait for matching requests.",
+    )
+    url_name = forms.CharField(required=False, label='URL name', help_text="e.g. customer_dashboard")
+    requests = forms.IntegerField(min_value=1, max_value=500, initial=10)
+    interval_ms = forms.IntegerField(
+        min_value=1, max_value=100, initial=5, label='Sampling interval (ms)',
+        help_text="Whole-worker sampling only; requests are profiled with cProfile.",
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        url_name = cleaned_data.get('url_name')
+        if cleaned_data.get('mode') == 'requests':
+            if not url_name:
+                self.add_error('url_name', "Enter the URL name of the view to profile.")
+            elif url_name not in get_resolver().reverse_dict:
+                self.add_error('url_name', f"No URL is named '{url_name}'.")
+        return cleaned_data
+
+
+class SupplySyncForm(forms.Form):
+    """One supply record of a tablet's sync batch (see core/sync.py)."""
+    key = forms.UUIDField()
+    farmer = forms.UUIDField()
+    quantity = forms.DecimalField(max_digits=10, decimal_places=2, min_value=0.01)
+    quality_rating = forms.IntegerField(min_value=1, max_value=5)
+    moisture_content = forms.DecimalField(max_digits=5, decimal_places=2, min_value=0)
+    # When the supply was weighed; defaults to the upload time
+    timestamp = forms.DateTimeField(required=False)
@@ -0,0 +1,59 @@
+"""
+Version counters for template fragment caching.
+
+Cached fragments (``{% cache %}`` in the templates) put a version number in
+their key instead of being deleted when the data behind them changes:
+
+* ``price``: the current paddy price (``core/partials/paddy_price.html``)
+* ``catalog``: the package sizes on sale
+* ``profile:<pk>``: the orders, supplies and deliveries of one farmer,
+  customer or delivery profile (the ``user`` version in templates)
+
+Saving a model bumps the matching counter (see the receivers in
+``core.models``), so the next render misses and the stale fragments simply
+expire. ``core.context_processors.fragment_cache`` puts the versions of the
+current request into every template as ``fragment_versions``.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+PREFIX = 'fragment-version:'
+PRICE = 'price'
+CATALOG = 'catalog'
+
+
+def profile_scope(pk):
+    return f'profile:{pk}'
+
+
+def _initial():
+    # Counters start from the clock so one that was evicted from the cache
+    # comes back higher than any value it had before
+    return time.time_ns()
+
+
+def get_versions(*scopes):
+    """The current version of each scope, as a dict."""
+    keys = {PREFIX + scope: scope for scope in scopes}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        cache.add(key, _initial(), timeout=None)
+        found[key] = cache.get(key)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def bump(*scopes):
+    """
+    Move the given scopes to a new version once the current transaction
+    commits; bumping earlier would let another request cache a fragment
+    built from the old rows under the new version.
+    """
+    def run():
+        for scope in scopes:
+            try:
+                cache.incr(PREFIX + scope)
+            except ValueError:
+                cache.add(PREFIX + scope, _initial(), timeout=None)
+    transaction.on_commit(run)
@@ -0,0 +1,75 @@
+"""
+HTTP caching: Cache-Control policies and conditional GETs.
+
+Every GET/HEAD response gets a ``Cache-Control`` header from one of the
+``POLICIES`` below, picked per view with ``core.decorators.cache_policy``
+(``CACHE_POLICY_DEFAULT`` otherwise) and applied by
+``core.middleware.CachePolicyMiddleware``.
+
+``conditional_page`` gives the order and delivery pages an ETag and a
+Last-Modified worked out from ``Order.updated_at`` before the view runs, so a
+browser revalidating an unchanged page gets a 304 after one small query
+instead of the whole render. Everything else gets a content-hash ETag from
+``ConditionalGetMiddleware``, which saves the bytes but not the render.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max
+from django.views.decorators.http import condition
+
+from core.fragments import CATALOG, get_versions
+
+# Keyword arguments for django.utils.cache.patch_cache_control
+POLICIES = {
+    # Per-user pages: the browser may keep a copy but has to revalidate it
+    # (cheap when the page has an ETag)
+    'private': {'private': True, 'no_cache': True},
+    # Forms, secrets and one-off pages that shouldn't be stored anywhere
+    'no-store': {'private': True, 'no_store': True},
+}
+
+
+def _page_version(request, rows, args, kwargs):
+    if not hasattr(request, '_page_version'):
+        request._page_version = None
+        # Queued messages are shown by the next full render; a 304 would leave
+        # them hanging around for some later page
+        if not len(get_messages(request)):
+            stats = rows(request, *args, **kwargs).aggregate(updated_at=Max('updated_at'), count=Count('pk'))
+            if stats['count']:
+                request._page_version = stats
+    return request._page_version
+
+
+def conditional_page(rows):
+    """
+    ETag and Last-Modified for a page built from the orders returned by
+    ``rows(request, *view_args, **view_kwargs)``, answering conditional GETs
+    with a 304 before the view runs. The ETag also covers the user, the
+    package catalog (item prices), the CSRF cookie and ``RELEASE``, so a
+    different user or a deploy never matches; Last-Modified only follows the
+    orders and is only used by clients that don't send the ETag back. When
+    ``rows`` is empty the view renders as usual.
+
+    Goes under ``login_required``. Writes that change one of these pages
+    without saving the order must touch ``Order.updated_at`` (see the
+    ``Delivery`` receiver in ``core.models``).
+    """
+    def etag(request, *args, **kwargs):
+        stats = _page_version(request, rows, args, kwargs)
+        if stats is None:
+            return None
+        parts = [
+            settings.RELEASE, request.get_full_path(), request.user.pk, request.user.role,
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+            stats['updated_at'].isoformat(), stats['count'], get_versions(CATALOG)[CATALOG],
+        ]
+        return hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        stats = _page_version(request, rows, args, kwargs)
+        return stats and stats['updated_at']
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
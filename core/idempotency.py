@@ -0,0 +1,140 @@
+"""
+Idempotency keys for form posts and API calls that create things.
+
+A client sends a key with the request, either as an ``Idempotency-Key``
+header (API clients) or as an ``idempotency_key`` form field (the
+``{% idempotency_field %}`` tag in ``core/templatetags/idempotency.py``
+puts a fresh one in each rendered form). For ``@idempotent`` views:
+
+* the first request with a key runs the view and stores its response in
+  ``IdempotencyKey``;
+* a retry with the same key gets the stored response back without running
+  the view. One arriving while the first request is still running gets a
+  JSON 409 with ``Retry-After`` straight away if it's an API call; a form
+  post (a double-tap) waits up to ``FORM_WAIT_SECONDS`` for the first
+  response to replay it, and otherwise gets an HTML page saying the first
+  submit is still being processed;
+* requests without a key behave as before.
+
+Keys are per user, and kept for ``IDEMPOTENCY_KEY_TTL`` seconds.
+"""
+import functools
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render
+from django.utils import timezone
+
+from core.models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+FIELD = 'idempotency_key'
+# Seconds a request told the key is still in use should wait before retrying
+RETRY_AFTER = 1
+# How long a double-tapped form post waits for the first one; short, since
+# it holds a worker meanwhile
+FORM_WAIT_SECONDS = 3
+POLL_SECONDS = 0.1
+
+
+def request_key(request):
+    key = request.headers.get(HEADER) or request.POST.get(FIELD)
+    return key.strip()[:64] if key else None
+
+
+def expired_before():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400))
+
+
+def replay(record):
+    response = HttpResponse(bytes(record.body), status=record.status_code, content_type=record.content_type)
+    if record.location:
+        response['Location'] = record.location
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def claim(request, key):
+    """
+    Take ``key`` for this request. Returns None if it's ours to run, or the
+    earlier request's record.
+    """
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(user=request.user, key=key, path=request.path)
+            return None
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+            if record is None:
+                continue  # purged in between
+            if record.created_at < expired_before():
+                # Stale: the key is free again
+                record.delete()
+                continue
+            return record
+    return None
+
+
+def wait_for(record):
+    """``record`` once its request has stored a response, or after ``FORM_WAIT_SECONDS``."""
+    deadline = time.monotonic() + FORM_WAIT_SECONDS
+    while record.status_code is None and time.monotonic() < deadline:
+        time.sleep(POLL_SECONDS)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if record is None:
+            break  # The first request failed and gave the key up
+    return record
+
+
+def idempotent(view):
+    """
+    Answer retried POSTs carrying the same idempotency key with the first
+    response. Goes under ``login_required``.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request_key(request) if request.method == 'POST' else None
+        if not key:
+            return view(request, *args, **kwargs)
+
+        record = claim(request, key)
+        if record is not None:
+            if record.path != request.path:
+                return JsonResponse({'error': "This idempotency key was used for another request."}, status=422)
+            form_post = HEADER not in request.headers
+            if record.status_code is None and form_post:
+                record = wait_for(record)
+                if record is None:
+                    # The first request failed and gave the key up; this one runs instead
+                    return wrapper(request, *args, **kwargs)
+            if record.status_code is None:
+                if form_post:
+                    response = render(request, 'core/all/request_in_progress.html', status=409)
+                else:
+                    response = JsonResponse({'error': "A request with this idempotency key is still running."},
+                                            status=409)
+                response['Retry-After'] = str(RETRY_AFTER)
+                return response
+            return replay(record)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            # Nothing to replay; let the retry run the view again
+            IdempotencyKey.objects.filter(user=request.user, key=key).delete()
+            raise
+        if response.status_code >= 500 or response.streaming:
+            IdempotencyKey.objects.filter(user=request.user, key=key).delete()
+        else:
+            IdempotencyKey.objects.filter(user=request.user, key=key).update(
+                status_code=response.status_code,
+                content_type=response.get('Content-Type', ''),
+                location=response.get('Location', ''),
+                body=response.content,
+            )
+        return response
+    return wrapper
@@ -0,0 +1,143 @@
+"""
+Shared plumbing for the query-counting and profiling middleware.
+
+``QueryRecorder`` hooks every database connection through
+``connection.execute_wrapper`` for the duration of a request and keeps the
+SQL and timing of each query it sees. ``InstrumentedDjangoTemplates`` is the
+stock template backend plus a timer that ``TemplateTimer`` reads back.
+"""
+import math
+import re
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_SPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    Normalise SQL so repeats of the same statement compare equal.
+
+    Parameters are already ``%s`` placeholders; this also folds ``IN`` lists of
+    any length and inline literals, so an N+1 loop yields one fingerprint.
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+# Set while the instrumentation runs queries of its own (e.g. the slow-query
+# log's EXPLAIN), so they are not counted against the request
+_untracked = ContextVar('untracked', default=False)
+
+
+@contextmanager
+def untracked():
+    token = _untracked.set(True)
+    try:
+        yield
+    finally:
+        _untracked.reset(token)
+
+
+def is_untracked():
+    return _untracked.get()
+
+
+class QueryRecorder:
+    """
+    Context manager recording ``(alias, sql, seconds)`` for every query run on
+    any connection while it is active.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for conn in connections.all():
+            self._stack.enter_context(conn.execute_wrapper(self._wrapper(conn.alias)))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def _wrapper(self, alias):
+        def record(execute, sql, params, many, context):
+            if _untracked.get():
+                return execute(sql, params, many, context)
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries.append((alias, sql, time.perf_counter() - started))
+        return record
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(q[2] for q in self.queries)
+
+    def duplicates(self):
+        """``{fingerprint: times}`` for statements that ran more than once."""
+        seen = {}
+        for _, sql, _ in self.queries:
+            key = fingerprint(sql)
+            seen[key] = seen.get(key, 0) + 1
+        return {sql: n for sql, n in seen.items() if n > 1}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+# Seconds spent rendering templates in the current request, or None outside
+# of a TemplateTimer
+_template_seconds = ContextVar('template_seconds', default=None)
+
+
+class TemplateTimer:
+    """Context manager summing the render time of top-level templates."""
+
+    def __enter__(self):
+        self._token = _template_seconds.set([0.0])
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = _template_seconds.get()[0]
+        _template_seconds.reset(self._token)
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        total = _template_seconds.get()
+        if total is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            total[0] += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """``DjangoTemplates`` whose renders are timed for ``TemplateTimer``."""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name).template, self)
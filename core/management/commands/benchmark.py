@@ -0,0 +1,85 @@
+import io
+import json
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from core.benchmarks import DATASET_SIZES, compare, run_benchmarks
+
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rmad-benchmark',
+    }
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the dashboards, list views and order/supply/inventory write paths '
+        'against generated datasets in a throwaway test database. Reports p50/p95 '
+        'latency and query counts, and fails on regressions against a baseline JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small',
+                            help=f"Comma-separated dataset sizes: {', '.join(DATASET_SIZES)}")
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', help='Comma-separated scenario or URL names to run')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--baseline', help='Baseline JSON to compare against')
+        parser.add_argument('--save-baseline', help='Write the results to this JSON file')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p95 growth before failing, as a fraction (default 0.25)')
+
+    def handle(self, *args, **options):
+        sizes = [s.strip() for s in options['sizes'].split(',') if s.strip()]
+        unknown = set(sizes) - set(DATASET_SIZES)
+        if unknown:
+            raise CommandError(f"Unknown dataset size(s): {', '.join(sorted(unknown))}")
+        only = set(options['only'].split(',')) if options['only'] else None
+
+        results = {}
+        for size in sizes:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\nDataset: {size}"))
+            # Never benchmark against the real database
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                # An in-memory SQLite test database outlives destroy_test_db(),
+                # so start every size from empty tables
+                call_command('flush', interactive=False, verbosity=0)
+                # Nor against the real cache: a private one, emptied per size,
+                # keeps users and sessions from the previous size out
+                with override_settings(CACHES=BENCHMARK_CACHES):
+                    cache.clear()
+                    call_command('generatedata', seed=options['seed'], stdout=io.StringIO(),
+                                 **DATASET_SIZES[size])
+                    results[size] = run_benchmarks(options['iterations'], options['warmup'], only)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+            self.stdout.write(f"{'scenario':<28}{'p50 ms':>10}{'p95 ms':>10}{'queries':>10}")
+            for name, metrics in results[size].items():
+                self.stdout.write(
+                    f"{name:<28}{metrics['p50_ms']:>10.2f}{metrics['p95_ms']:>10.2f}{metrics['queries']:>10}"
+                )
+
+        if options['save_baseline']:
+            Path(options['save_baseline']).write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"\nBaseline written to {options['save_baseline']}"))
+
+        if options['baseline']:
+            try:
+                baseline = json.loads(Path(options['baseline']).read_text())
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline: {e}")
+            regressions = compare(results, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS("\nNo regressions against the baseline."))
@@ -0,0 +1,127 @@
+import re
+import shutil
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.warmup import template_files
+
+SOURCE = Path(settings.BASE_DIR) / 'core/static/core/fontawsome'
+OUTPUT = Path(settings.BASE_DIR) / 'core/static/core/icons'
+
+CLASS_RE = re.compile(r'(?<![\w-])fa-([a-z0-9]+(?:-[a-z0-9]+)*)(?![\w-])')
+CLASS_ATTR_RE = re.compile(r'class\s*=\s*"([^"]*)"')
+ICON_BODY_RE = re.compile(r'^--fa:\s*"\\([0-9a-f]+)";?$')
+FONT_URL_RE = re.compile(r'url\("\.\./webfonts/([\w-]+)\.woff2"\)')
+
+# Webfont needed by each style class
+STYLE_FONTS = {
+    'fa': 'fa-solid-900', 'fas': 'fa-solid-900', 'fa-solid': 'fa-solid-900',
+    'far': 'fa-regular-400', 'fa-regular': 'fa-regular-400',
+    'fab': 'fa-brands-400', 'fa-brands': 'fa-brands-400',
+}
+
+
+def css_blocks(css):
+    """Split a stylesheet into its top-level ``prelude { body }`` blocks."""
+    blocks, depth, start = [], 0, 0
+    for i, char in enumerate(css):
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                block = css[start:i + 1].strip()
+                prelude, body = block.split('{', 1)
+                blocks.append((prelude.strip(), body[:-1].strip()))
+                start = i + 1
+    return blocks
+
+
+class Command(BaseCommand):
+    help = (
+        "Build core/static/core/icons/ from the bundled Font Awesome: a stylesheet "
+        "with only the icons the templates use and, if fontTools is installed, "
+        "webfonts cut down to those glyphs. Re-run after using a new icon."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Only fail if the committed stylesheet is out of date")
+
+    def handle(self, *args, **options):
+        used, styles = self.scan()
+        css, codepoints, fonts = self.subset_css(used, styles)
+
+        target = OUTPUT / 'icons.css'
+        if options['check']:
+            if not target.exists() or target.read_text() != css:
+                raise CommandError("core/static/core/icons/icons.css is out of date; run manage.py buildicons.")
+            self.stdout.write(self.style.SUCCESS("Icon stylesheet is up to date."))
+            return
+
+        (OUTPUT / 'webfonts').mkdir(parents=True, exist_ok=True)
+        target.write_text(css)
+        for font in fonts:
+            self.build_font(font, codepoints)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(codepoints)} icons, {len(css) / 1024:.1f} KB of CSS, fonts: {', '.join(sorted(fonts))}"
+        ))
+
+    def scan(self):
+        used, styles = set(), set()
+        for name, path in template_files().items():
+            text = Path(path).read_text(encoding='utf-8')
+            used.update(CLASS_RE.findall(text))
+            for classes in CLASS_ATTR_RE.findall(text):
+                styles.update(c for c in classes.split() if c in STYLE_FONTS)
+            if re.search(r'fa-\{\{', text):
+                self.stderr.write(f"{name}: icon class built from a variable; add the icons it can take by hand")
+        return used, styles
+
+    def subset_css(self, used, styles):
+        source = (SOURCE / 'css/all.css').read_text()
+        header = re.match(r'\s*(/\*!.*?\*/)', source, re.S).group(1)
+        source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+
+        fonts = {STYLE_FONTS[s] for s in styles}
+        codepoints = set()
+        rules = []
+        for prelude, body in css_blocks(source):
+            icon = ICON_BODY_RE.match(body)
+            if icon:
+                selectors = [s.strip() for s in prelude.split(',')]
+                kept = [s for s in selectors if s.startswith('.fa-') and s[4:] in used]
+                if not kept:
+                    continue
+                codepoints.add(int(icon.group(1), 16))
+                prelude = ','.join(kept)
+            elif prelude == '@font-face':
+                font = FONT_URL_RE.search(body)
+                if not font or font.group(1) not in fonts:
+                    continue
+                # woff2 only: every browser we care about reads it
+                body = re.sub(r'src:[^;]*', f'src: url("webfonts/{font.group(1)}.woff2") format("woff2")', body)
+            prelude, body = re.sub(r'\s+', ' ', prelude), re.sub(r'\s+', ' ', body)
+            rules.append(f'{prelude}{{{body}}}')
+        return header + '\n' + '\n'.join(rules) + '\n', codepoints, fonts
+
+    def build_font(self, font, codepoints):
+        source = SOURCE / f'webfonts/{font}.woff2'
+        target = OUTPUT / f'webfonts/{font}.woff2'
+        try:
+            from fontTools import subset
+        except ImportError:
+            self.stderr.write(f"fontTools is not installed; copying {font}.woff2 whole")
+            shutil.copyfile(source, target)
+            return
+
+        options = subset.Options()
+        options.flavor = 'woff2'
+        options.layout_features = []
+        font_file = subset.load_font(str(source), options)
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(unicodes=codepoints)
+        subsetter.subset(font_file)
+        subset.save_font(font_file, str(target), options)
@@ -0,0 +1,155 @@
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import Sum
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from core import tasks
+from core.models import (
+    CustomUser, Customer, DeadTask, Farmer, Order, OrderItem, PackageSize, PaddyInventory, PaddyPrice, PaddySupply,
+    ProcessedRice, ProcessedRiceInventory, SoldRiceInventory, Transaction,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammer the inventory write paths (supplies, milling runs and paid orders) '
+        'from many threads at once in a throwaway test database, then check that '
+        'the paddy, processed and sold rice inventories add up.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--rounds', type=int, default=25, help='Operations per thread')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        tmpdir = None
+        if connection.vendor == 'sqlite' and not connection.settings_dict['TEST']['NAME']:
+            # The in-memory test database can't be shared between threads the
+            # way a real file is
+            tmpdir = tempfile.TemporaryDirectory()
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tmpdir.name, 'concurrency.sqlite3')
+
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.setup()
+            # Tasks run in the writing threads right after each commit, so
+            # the task claims are raced as well
+            with override_settings(TASKS_EAGER=True):
+                counts = self.run(options['threads'], options['rounds'])
+            self.drain()
+            dead = DeadTask.objects.count()
+            problems = self.check_inventories()
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if tmpdir:
+                connection.settings_dict['TEST']['NAME'] = None
+                tmpdir.cleanup()
+
+        for name, (ok, rejected, errors) in counts.items():
+            self.stdout.write(f"{name:<12} {ok:>6} committed {rejected:>6} rejected {errors:>6} database errors")
+        self.stdout.write(f"{dead} task(s) failed for good")
+        if problems:
+            raise CommandError("Inventory is inconsistent:\n  " + "\n  ".join(problems))
+        self.stdout.write(self.style.SUCCESS(f"Inventories add up ({connection.vendor})."))
+
+    def setup(self):
+        PaddyPrice.objects.create(price_per_kg=Decimal('40.00'))
+        PaddyInventory.objects.create(id=1)
+        ProcessedRiceInventory.objects.create(id=1)
+        SoldRiceInventory.objects.create(id=1)
+        self.operator = CustomUser.objects.create_user(
+            'operator@concurrency.test', 'operator', role=CustomUser.Role.MILL_OPERATOR,
+        )
+        farmer_user = CustomUser.objects.create_user('farmer@concurrency.test', 'farmer', role=CustomUser.Role.FARMER)
+        self.farmer = Farmer.objects.create(user=farmer_user, bank_name='Test Bank', account_number='000')
+        customer_user = CustomUser.objects.create_user(
+            'customer@concurrency.test', 'customer', role=CustomUser.Role.CUSTOMER,
+        )
+        self.customer = Customer.objects.create(user=customer_user, delivery_address='Mill Road')
+        self.package = PackageSize.objects.create(weight_kg=Decimal('10.00'), label='10kg Bag',
+                                                  price_per_package=Decimal('900.00'))
+
+    def run(self, threads, rounds):
+        # Each thread cycles through the three write paths so they all contend
+        # for the same inventory rows
+        operations = [
+            ('supply', self.supply),
+            ('milling', self.mill),
+            ('sale', self.sell),
+        ]
+        counts = {name: [0, 0, 0] for name, _ in operations}
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads)
+
+        def worker(n):
+            barrier.wait()
+            try:
+                for i in range(rounds):
+                    name, operation = operations[(n + i) % len(operations)]
+                    try:
+                        with transaction.atomic():
+                            operation()
+                        outcome = 0
+                    except ValueError:
+                        outcome = 1
+                    except DatabaseError as e:
+                        self.stderr.write(f"{name}: {e}")
+                        outcome = 2
+                    with lock:
+                        counts[name][outcome] += 1
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(worker, range(threads)))
+        return counts
+
+    def supply(self):
+        PaddySupply.objects.create(farmer=self.farmer, mill_operator=self.operator, quantity=Decimal('30.00'),
+                                   quality_rating=4, moisture_content=Decimal('13.00'))
+
+    def mill(self):
+        ProcessedRice.objects.create(mill_operator=self.operator, quantity=Decimal('20.00'))
+
+    def sell(self):
+        order = Order.objects.create(customer=self.customer)
+        OrderItem.objects.create(order=order, package_size=self.package, quantity=1)
+        order.calculate_totals()
+        Transaction.objects.create(order=order, transaction_code_customer=f'CONC{order.id}')
+
+    def drain(self):
+        # Failed tasks wait for a retry; run them now, until they succeed or die
+        later = timezone.now() + timedelta(days=365)
+        while tasks.run_due(now=later) or tasks.due(later).exists():
+            pass
+
+    def check_inventories(self):
+        supplied = PaddySupply.objects.aggregate(total=Sum('quantity'))['total'] or 0
+        milled = ProcessedRice.objects.aggregate(total=Sum('quantity'))['total'] or 0
+        paid = Order.objects.filter(transaction__isnull=False)
+        sold = paid.aggregate(total=Sum('total_kg'))['total'] or 0
+        # Paid orders took their rice in the request; core.tasks.record_sale
+        # adds it to the sold inventory later, and dead ones never did
+        unrecorded = [task.kwargs['order_id'] for task in DeadTask.objects.filter(name=tasks.record_sale.task_name)]
+        recorded = paid.exclude(pk__in=unrecorded).aggregate(total=Sum('total_kg'))['total'] or 0
+        expected = {
+            PaddyInventory: supplied - milled,
+            ProcessedRiceInventory: milled - sold,
+            SoldRiceInventory: recorded,
+        }
+        problems = []
+        for model, quantity in expected.items():
+            actual = model.objects.get(id=1).quantity
+            if actual != quantity:
+                problems.append(f"{model.__name__}: {actual} kg, expected {quantity} kg")
+        return problems
@@ -0,0 +1,339 @@
+import io
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.fields import uuid7
+from core.models import (
+    Admin, Customer, Delivery, DeliveryPersonnel, Farmer, MillOperator, Order, OrderItem,
+    PackageSize, PaddyInventory, PaddyPrice, PaddySupply, ProcessedRice,
+    ProcessedRiceInventory, SoldRiceInventory, Transaction,
+)
+
+EMAIL_DOMAIN = 'loadtest.rmad'
+CENTS = Decimal('0.01')
+
+FIRST_NAMES = [
+    'James', 'John', 'Mary', 'Grace', 'Kamau', 'Wanjiru', 'Njoroge', 'Nyambura',
+    'Kipchoge', 'Auma', 'Omondi', 'Atieno', 'Maina', 'Wambui', 'Otieno', 'Akinyi',
+]
+LAST_NAMES = [
+    'Mwangi', 'Ochieng', 'Kamau', 'Omondi', 'Maina', 'Ndungu', 'Wambua', 'Kariuki',
+    'Njoroge', 'Akinyi', 'Atieno', 'Njeri', 'Muthoni', 'Wairimu', 'Kiprono', 'Chebet',
+]
+BANKS = ['Equity Bank', 'KCB Bank', 'Cooperative Bank', 'NCBA Bank', 'DTB Bank', 'Absa Bank']
+TOWNS = ['Mwea', 'Ahero', 'Kisumu', 'Nairobi', 'Nakuru', 'Eldoret', 'Nyeri', 'Thika', 'Embu']
+
+
+@contextmanager
+def manual_timestamps(*models):
+    """Let bulk inserts keep the timestamps we set on auto_now/auto_now_add fields."""
+    fields = [
+        f for model in models for f in model._meta.concrete_fields
+        if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)
+    ]
+    saved = [(f, f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in saved:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a deterministic load-testing dataset: users for every role plus '
+        'months of supplies, milling runs, orders, payments and deliveries. '
+        'Rows are bulk inserted (no per-row signals) and the inventory totals are '
+        'adjusted once at the end to match.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--farmers', type=int, default=500)
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--riders', type=int, default=30)
+        parser.add_argument('--operators', type=int, default=10)
+        parser.add_argument('--months', type=int, default=6)
+        parser.add_argument('--supplies-per-day', type=int, default=200)
+        parser.add_argument('--orders-per-day', type=int, default=150)
+        parser.add_argument('--end-date', type=date.fromisoformat, default=None,
+                            help='Last day of generated activity, YYYY-MM-DD (default: today)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError("The database must return primary keys from bulk inserts.")
+
+        self.rng = random.Random(options['seed'])
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        User = get_user_model()
+        if User.objects.filter(email__endswith=f'.s{self.seed}@{EMAIL_DOMAIN}').exists():
+            raise CommandError(f"Data for seed {self.seed} already exists; pick another --seed.")
+
+        end = options['end_date'] or timezone.localdate()
+        start = end - timedelta(days=30 * options['months'])
+        started = time.perf_counter()
+        self.counts = dict.fromkeys(
+            ['users', 'prices', 'supplies', 'milling runs', 'orders', 'items', 'transactions', 'deliveries'], 0
+        )
+
+        call_command('addpackage', stdout=io.StringIO())
+        self.packages = list(PackageSize.objects.order_by('weight_kg'))
+
+        with manual_timestamps(PaddyPrice, Order, Transaction):
+            self.create_users(start, options)
+            self.create_prices(start, end)
+            self.create_activity(start, end, options)
+
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f"{n} {name}" for name, n in self.counts.items())
+            + f" generated in {time.perf_counter() - started:.1f}s."
+        ))
+
+    # ------------------------------------------------------------------ helpers
+
+    def uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def moment(self, day, first_hour=6, last_hour=18):
+        seconds = self.rng.randint(first_hour * 3600, last_hour * 3600)
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(seconds=seconds))
+
+    def kg(self, low, high):
+        return (Decimal(self.rng.randint(low * 100, high * 100)) / 100).quantize(CENTS)
+
+    # -------------------------------------------------------------------- users
+
+    def create_users(self, start, options):
+        User = get_user_model()
+        rng = self.rng
+        password = make_password('pass123')  # One shared hash keeps this fast
+        joined = self.moment(start - timedelta(days=30))
+
+        def make_users(role, count):
+            users = []
+            for i in range(count):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                users.append(User(
+                    id=self.uuid(), password=password, role=role,
+                    email=f"{role.lower()}{i}.s{self.seed}@{EMAIL_DOMAIN}",
+                    username=f"{role.lower()}_{i}_s{self.seed}",
+                    first_name=first, last_name=last,
+                    phone_number=f"2547{rng.randint(10000000, 99999999)}",
+                    date_joined=joined,
+                ))
+            User.objects.bulk_create(users, batch_size=self.batch_size)
+            self.counts['users'] += len(users)
+            return users
+
+        with transaction.atomic():
+            farmer_users = make_users(User.Role.FARMER, options['farmers'])
+            self.farmers = Farmer.objects.bulk_create([
+                Farmer(id=self.uuid(), user=u, bank_name=rng.choice(BANKS),
+                       account_number=str(rng.randint(10 ** 9, 10 ** 10 - 1)))
+                for u in farmer_users
+            ], batch_size=self.batch_size)
+
+            customer_users = make_users(User.Role.CUSTOMER, options['customers'])
+            self.customers = Customer.objects.bulk_create([
+                Customer(id=self.uuid(), user=u,
+                         delivery_address=f"P.O. Box {rng.randint(100, 99999)} - {rng.choice(TOWNS)}",
+                         preferred_payment_method=rng.choice(['MPESA', 'CARD']))
+                for u in customer_users
+            ], batch_size=self.batch_size)
+
+            rider_users = make_users(User.Role.DELIVERY, options['riders'])
+            self.riders = DeliveryPersonnel.objects.bulk_create([
+                DeliveryPersonnel(id=self.uuid(), user=u,
+                                  vehicle_type=rng.choice(['Pickup Truck', 'Lorry', 'Motorcycle', 'Van']),
+                                  vehicle_number=f"K{rng.choice('ABCD')}{rng.choice('ABCD')} {rng.randint(100, 999)}{rng.choice('ABCD')}",
+                                  license_number=f"DL{rng.randint(10 ** 6, 10 ** 7 - 1)}")
+                for u in rider_users
+            ], batch_size=self.batch_size)
+
+            self.operators = make_users(User.Role.MILL_OPERATOR, max(1, options['operators']))
+            MillOperator.objects.bulk_create([
+                MillOperator(id=self.uuid(), user=u, shift=rng.choice(MillOperator.Shift.values))
+                for u in self.operators
+            ], batch_size=self.batch_size)
+
+            self.admins = make_users(User.Role.ADMIN, 2)
+            Admin.objects.bulk_create([
+                Admin(id=self.uuid(), user=u, admin_type=Admin.AdminType.STANDARD, department='Finance')
+                for u in self.admins
+            ])
+
+    def create_prices(self, start, end):
+        """A weekly random walk of the paddy price."""
+        price = Decimal('45.00')
+        prices = []
+        day = start
+        while day <= end:
+            prices.append(PaddyPrice(id=self.uuid(), price_per_kg=price, effective_date=self.moment(day, 0, 1)))
+            price = min(max(price + Decimal(self.rng.randint(-150, 150)) / 100, Decimal('35')), Decimal('60'))
+            day += timedelta(days=7)
+        PaddyPrice.objects.bulk_create(prices)
+        self.prices = prices
+        self.counts['prices'] += len(prices)
+
+    # ----------------------------------------------------------------- activity
+
+    def create_activity(self, start, end, options):
+        """
+        Walk day by day so stock never goes negative: supplies add paddy, milling
+        consumes part of the paddy stock, and only orders that the processed rice
+        stock can cover are paid for.
+        """
+        rng = self.rng
+        paddy_stock = processed_stock = sold_total = Decimal('0.00')
+        supplied_total = milled_total = Decimal('0.00')
+        buffers = {'supplies': [], 'milling': [], 'orders': []}
+        price_index = 0
+
+        day = start
+        while day <= end:
+            while price_index + 1 < len(self.prices) and self.prices[price_index + 1].effective_date.date() <= day:
+                price_index += 1
+            price = self.prices[price_index].price_per_kg
+            # Days before the end of the data, not before today, so the same
+            # --seed and --end-date give the same statuses on any day
+            age = (end - day).days
+
+            for _ in range(rng.randint(options['supplies_per_day'] // 2, options['supplies_per_day'] * 3 // 2)):
+                quantity = self.kg(20, 400)
+                timestamp = self.moment(day)
+                supply = PaddySupply(
+                    id=uuid7(timestamp, rng),
+                    farmer=rng.choice(self.farmers),
+                    mill_operator=rng.choice(self.operators),
+                    quantity=quantity,
+                    quality_rating=rng.randint(1, 5),
+                    moisture_content=self.kg(11, 20),
+                    status='received',
+                    total_amount=(quantity * price).quantize(CENTS),
+                    timestamp=timestamp,
+                )
+                if age > 14 and rng.random() < 0.9:
+                    supply.payment_status = 'paid'
+                    supply.payment_approved_by = rng.choice(self.admins)
+                    supply.payment_approved_at = supply.timestamp + timedelta(days=rng.randint(3, 14))
+                    supply.payment_reference_code = f"PAY{rng.randint(10 ** 8, 10 ** 9 - 1)}"
+                buffers['supplies'].append(supply)
+                paddy_stock += quantity
+                supplied_total += quantity
+
+            for _ in range(rng.randint(1, 3)):
+                quantity = (paddy_stock * Decimal(rng.uniform(0.2, 0.4))).quantize(CENTS)
+                if quantity <= 0:
+                    break
+                buffers['milling'].append(ProcessedRice(mill_operator=rng.choice(self.operators), quantity=quantity))
+                paddy_stock -= quantity
+                processed_stock += quantity
+                milled_total += quantity
+
+            for _ in range(rng.randint(options['orders_per_day'] // 2, options['orders_per_day'] * 3 // 2)):
+                entry = self.build_order(day, age, processed_stock)
+                if entry[2]:
+                    processed_stock -= entry[0].total_kg
+                    sold_total += entry[0].total_kg
+                buffers['orders'].append(entry)
+
+            if sum(len(b) for b in buffers.values()) >= self.batch_size:
+                self.flush(buffers)
+            day += timedelta(days=1)
+        self.flush(buffers)
+
+        with transaction.atomic():
+            for model, delta in (
+                (PaddyInventory, supplied_total - milled_total),
+                (ProcessedRiceInventory, milled_total - sold_total),
+                (SoldRiceInventory, sold_total),
+            ):
+                model.objects.get_or_create(id=1)
+                model.objects.filter(id=1).update(quantity=F('quantity') + delta)
+
+    def build_order(self, day, age, stock):
+        rng = self.rng
+        customer = rng.choice(self.customers)
+        created_at = self.moment(day, 7, 21)
+        order = Order(
+            customer=customer,
+            customer_name=f"{customer.user.first_name} {customer.user.last_name}",
+            delivery_address=customer.delivery_address,
+            phone_number=customer.user.phone_number,
+            created_at=created_at,
+            updated_at=created_at,
+        )
+        items = [
+            OrderItem(order=order, package_size=package, quantity=rng.randint(1, 4))
+            for package in rng.sample(self.packages, rng.randint(1, min(3, len(self.packages))))
+        ]
+        order.total_kg = sum(i.package_size.weight_kg * i.quantity for i in items)
+        order.total_amount = sum(i.package_size.price_per_package * i.quantity for i in items)
+
+        roll = rng.random()
+        if age > 7:
+            status = 'delivered' if roll < 0.75 else 'paid' if roll < 0.8 else 'cancelled' if roll < 0.88 else 'pending'
+        else:
+            status = 'delivered' if roll < 0.3 else 'paid' if roll < 0.6 else 'pending'
+        if status in ('paid', 'delivered') and order.total_kg > stock:
+            status = 'pending'  # Nothing to sell yet; the customer hasn't paid
+        order.status = status
+
+        payment = delivery = None
+        if status in ('paid', 'delivered'):
+            paid_at = created_at + timedelta(minutes=rng.randint(5, 600))
+            payment = Transaction(order=order, transaction_code_customer=f"MP{rng.randint(10 ** 8, 10 ** 9 - 1)}",
+                                  transaction_time=paid_at)
+            order.updated_at = paid_at
+            if status == 'delivered' or rng.random() < 0.5:
+                order.delivery_personnel = rng.choice(self.riders)
+            if status == 'delivered':
+                order.delivery_date = paid_at + timedelta(hours=rng.randint(2, 72))
+                order.updated_at = order.delivery_date
+                delivery = Delivery(order=order, delivery_personnel=order.delivery_personnel,
+                                    delivery_address=order.delivery_address,
+                                    delivery_date=order.delivery_date, is_delivered=True)
+        return [order, items, payment, delivery]
+
+    def flush(self, buffers):
+        orders = buffers['orders']
+        # Insert in time order, as a live system would, so the time-ordered
+        # supply ids and the orders' auto-increment ids both follow the clock
+        buffers['supplies'].sort(key=lambda supply: supply.pk)
+        orders.sort(key=lambda o: o[0].created_at)
+        with transaction.atomic():
+            PaddySupply.objects.bulk_create(buffers['supplies'], batch_size=self.batch_size)
+            ProcessedRice.objects.bulk_create(buffers['milling'], batch_size=self.batch_size)
+            Order.objects.bulk_create([o[0] for o in orders], batch_size=self.batch_size)
+            # The orders now have primary keys, so their children can reference them
+            items = [item for o in orders for item in o[1]]
+            payments = [o[2] for o in orders if o[2]]
+            deliveries = [o[3] for o in orders if o[3]]
+            OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+            Transaction.objects.bulk_create(payments, batch_size=self.batch_size)
+            Delivery.objects.bulk_create(deliveries, batch_size=self.batch_size)
+
+        self.counts['supplies'] += len(buffers['supplies'])
+        self.counts['milling runs'] += len(buffers['milling'])
+        self.counts['orders'] += len(orders)
+        self.counts['items'] += len(items)
+        self.counts['transactions'] += len(payments)
+        self.counts['deliveries'] += len(deliveries)
+        for buffer in buffers.values():
+            buffer.clear()
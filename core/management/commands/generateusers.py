@@ -1,7 +1,7 @@
 import random
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
-from core.models import Farmer, Customer, DeliveryPersonnel, MillOperator, Admin
+from core.provisioning import provision_users
 from faker import Faker
 
 fake = Faker()
@@ -35,6 +35,7 @@ class Command(BaseCommand):
             role_name = role[1]
             self.stdout.write(self.style.SUCCESS(f'\nCreating {users_per_role} {role_name}s...'))
             
+            rows = []
             for i in range(users_per_role):
                 first_name = random.choice(kenyan_first_names)
                 last_name = random.choice(kenyan_last_names)
@@ -42,41 +43,36 @@ class Command(BaseCommand):
                 username = f"{first_name.lower()}_{last_name.lower()}_{role_code.lower()}_{i}"
                 phone_number = f"2547{random.randint(10, 99)}{random.randint(100000, 999999)}"
                 
-                # Create user
-                user = User.objects.create_user(
-                    email=email,
-                    username=username,
-                    password='pass123',
-                    first_name=first_name,
-                    last_name=last_name,
-                    phone_number=phone_number,
-                    role=role_code
-                )
+                row = {
+                    'email': email,
+                    'username': username,
+                    'password': 'pass123',
+                    'first_name': first_name,
+                    'last_name': last_name,
+                    'phone_number': phone_number,
+                    'role': role_code,
+                }
                 
                 # Create role-specific profile
                 if role_code == User.Role.FARMER:
-                    Farmer.objects.create(
-                        user=user,
+                    row['profile'] = dict(
                         bank_name=random.choice(kenyan_banks),
                         account_number=f"{random.randint(1000000000, 9999999999)}",
                     )
                 elif role_code == User.Role.CUSTOMER:
-                    Customer.objects.create(
-                        user=user,
+                    row['profile'] = dict(
                         delivery_address=fake.address(),
                         preferred_payment_method=random.choice(['MPESA', 'CASH', 'CARD'])
                     )
                 elif role_code == User.Role.DELIVERY:
-                    DeliveryPersonnel.objects.create(
-                        user=user,
+                    row['profile'] = dict(
                         vehicle_type=random.choice(['Pickup Truck', 'Lorry', 'Motorcycle', 'Van']),
                         vehicle_number=f"K{random.choice(['A','B','C'])} {random.randint(100, 999)}{random.choice(['A','B','C'])}",
                         is_available=random.choice([True, False]),
                         license_number=f"DL{random.randint(1000000, 9999999)}"
                     )
                 elif role_code == User.Role.MILL_OPERATOR:
-                    MillOperator.objects.create(
-                        user=user,
+                    row['profile'] = dict(
                         shift=random.choice(['MORNING', 'EVENING', 'NIGHT']),
                         qualification=random.choice([
                             'Certificate in Milling',
@@ -85,8 +81,7 @@ class Command(BaseCommand):
                         ])
                     )
                 elif role_code == User.Role.ADMIN:
-                    Admin.objects.create(
-                        user=user,
+                    row['profile'] = dict(
                         admin_type=random.choice(['STANDARD', 'SUPER']),
                         department=random.choice([
                             'Operations',
@@ -95,7 +90,13 @@ class Command(BaseCommand):
                             'Human Resources'
                         ])
                     )
-                
-                self.stdout.write(f"Created {role_name}: {first_name} {last_name} ({email})")
+                rows.append(row)
+
+            # Hash and insert the whole role at once instead of one user at a time
+            created, skipped = provision_users(rows)
+            for user in created:
+                self.stdout.write(f"Created {role_name}: {user.first_name} {user.last_name} ({user.email})")
+            for row in skipped:
+                self.stdout.write(self.style.WARNING(f"Skipped (already exists): {row['email']}"))
         
         self.stdout.write(self.style.SUCCESS('\nSuccessfully created all users!'))
\ No newline at end of file
@@ -2,10 +2,8 @@ import random
 import uuid
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
-from core.models import (
-    PackageSize, Farmer, Customer, DeliveryPersonnel,
-    MillOperator, Admin, PaddyPrice
-)
+from core.models import PackageSize, PaddyPrice
+from core.provisioning import provision_users
 from faker import Faker
 
 fake = Faker()
@@ -79,6 +77,7 @@ class Command(BaseCommand):
             role_name = role[1]
             self.stdout.write(self.style.SUCCESS(f'\nCreating {users_per_role} {role_name}s...'))
 
+            rows = []
             for i in range(users_per_role):
                 first_name = random.choice(kenyan_first_names)
                 last_name = random.choice(kenyan_last_names)
@@ -86,41 +85,37 @@ class Command(BaseCommand):
                 username = f"{first_name.lower()}_{last_name.lower()}_{role_code.lower()}_{i}"
                 phone_number = f"2547{random.randint(10, 99)}{random.randint(100000, 999999)}"
 
-                user = User.objects.create_user(
-                    email=email,
-                    username=username,
-                    password='pass123',
-                    first_name=first_name,
-                    last_name=last_name,
-                    phone_number=phone_number,
-                    role=role_code
-                )
+                row = {
+                    'email': email,
+                    'username': username,
+                    'password': 'pass123',
+                    'first_name': first_name,
+                    'last_name': last_name,
+                    'phone_number': phone_number,
+                    'role': role_code,
+                }
 
                 if role_code == User.Role.FARMER:
-                    Farmer.objects.create(
-                        user=user,
+                    row['profile'] = dict(
                         bank_name=random.choice(kenyan_banks),
                         account_number=f"{random.randint(1000000000, 9999999999)}",
                     )
                 elif role_code == User.Role.CUSTOMER:
                     loc = random.choice(kenyan_locations)
                     delivery_address = f"{loc['location']}, {loc['constituency']} Constituency, {loc['county']} County, {loc['pobox']}"
-                    Customer.objects.create(
-                        user=user,
+                    row['profile'] = dict(
                         delivery_address=delivery_address,
                         preferred_payment_method=random.choice(['MPESA', 'CARD'])
                     )
                 elif role_code == User.Role.DELIVERY:
-                    DeliveryPersonnel.objects.create(
-                        user=user,
+                    row['profile'] = dict(
                         vehicle_type=random.choice(['Pickup Truck', 'Lorry', 'Motorcycle', 'Van']),
                         vehicle_number=f"K{random.choice(['A','B','C'])} {random.randint(100, 999)}{random.choice(['A','B','C'])}",
                         is_available=random.choice([True, False]),
                         license_number=f"DL{random.randint(1000000, 9999999)}"
                     )
                 elif role_code == User.Role.MILL_OPERATOR:
-                    MillOperator.objects.create(
-                        user=user,
+                    row['profile'] = dict(
                         shift=random.choice(['MORNING', 'EVENING', 'NIGHT']),
                         qualification=random.choice([
                             'Certificate in Milling',
@@ -129,8 +124,7 @@ class Command(BaseCommand):
                         ])
                     )
                 elif role_code == User.Role.ADMIN:
-                    Admin.objects.create(
-                        user=user,
+                    row['profile'] = dict(
                         admin_type=random.choice(['STANDARD']),
                         department=random.choice([
                             'Operations',
@@ -139,8 +133,13 @@ class Command(BaseCommand):
                             'Human Resources'
                         ])
                     )
+                rows.append(row)
 
-                self.stdout.write(f"Created {role_name}: {first_name} {last_name} ({email})")
+            created, skipped = provision_users(rows)
+            for user in created:
+                self.stdout.write(f"Created {role_name}: {user.first_name} {user.last_name} ({user.email})")
+            for row in skipped:
+                self.stdout.write(self.style.WARNING(f"Skipped (already exists): {row['email']}"))
 
     def create_paddy_price(self):
         self.stdout.write(self.style.MIGRATE_HEADING('\nAdding default paddy price...'))
@@ -0,0 +1,63 @@
+import csv
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.provisioning import get_profile_model, provision_users
+
+USER_COLUMNS = ('email', 'username', 'first_name', 'last_name', 'phone_number', 'role')
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-create users and their role profiles from a CSV file. '
+        'Columns: email, username, first_name, last_name, phone_number, role, password; '
+        'any other column is set on the role profile (e.g. bank_name, account_number).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='Path to the CSV file to import')
+        parser.add_argument('--role', help='Role for rows without a role column, e.g. FARMER')
+        parser.add_argument('--default-password', help='Password for rows without a password')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Password hashing processes (default: CPU count)')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        rows = []
+        try:
+            with open(options['csv_file'], newline='', encoding='utf-8-sig') as f:
+                for line, record in enumerate(csv.DictReader(f), start=2):
+                    role = (record.get('role') or options['role'] or '').upper()
+                    if role not in User.Role.values:
+                        raise CommandError(f"Line {line}: unknown role {role!r}")
+                    if not record.get('email') or not record.get('username'):
+                        raise CommandError(f"Line {line}: email and username are required")
+
+                    profile_model = get_profile_model(role)
+                    profile_fields = {f.name for f in profile_model._meta.concrete_fields}
+                    rows.append({
+                        **{c: record.get(c) or '' for c in USER_COLUMNS},
+                        'role': role,
+                        'password': record.get('password') or options['default_password'],
+                        'profile': {
+                            k: v for k, v in record.items()
+                            if k in profile_fields and k not in ('id', 'user') and v
+                        },
+                    })
+        except OSError as e:
+            raise CommandError(e)
+
+        started = time.perf_counter()
+        created, skipped = provision_users(
+            rows, batch_size=options['batch_size'], workers=options['workers']
+        )
+        elapsed = time.perf_counter() - started
+
+        for row in skipped:
+            self.stdout.write(self.style.WARNING(f"Skipped (already exists): {row['email']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(created)} users in {elapsed:.1f}s ({len(skipped)} skipped)."
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core.idempotency import expired_before
+from core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete idempotency keys (and their stored responses) older than "
+        "IDEMPOTENCY_KEY_TTL. Run it from cron, e.g. hourly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only count the expired keys")
+
+    def handle(self, *args, **options):
+        expired = IdempotencyKey.objects.filter(created_at__lt=expired_before())
+        if options['dry_run']:
+            self.stdout.write(f"{expired.count()} expired idempotency key(s).")
+            return
+        deleted, _ = expired.delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency key(s)."))
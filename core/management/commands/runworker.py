@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils.module_loading import autodiscover_modules
+
+from core import tasks
+from core.models import DeadTask, Task
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background tasks (core/tasks.py) until stopped. Start one "
+        "or more next to the web workers; they share the queue safely."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run what's due now, then exit")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when the queue is empty")
+        parser.add_argument('--batch', type=int, default=100, help="Tasks picked up per round")
+        parser.add_argument('--retry-dead', action='store_true',
+                            help="Queue the dead tasks again (fresh attempts) and exit")
+
+    def handle(self, *args, **options):
+        # Registers the @task functions of every app's tasks module
+        autodiscover_modules('tasks')
+
+        if options['retry_dead']:
+            self.stdout.write(self.style.SUCCESS(f"Queued {tasks.retry_dead()} dead task(s) again."))
+            return
+
+        self.stdout.write(f"{Task.objects.count()} queued, {DeadTask.objects.count()} dead.")
+        done = 0
+        try:
+            while True:
+                close_old_connections()
+                ran = tasks.run_due(options['batch'])
+                done += ran
+                if options['once'] and not tasks.due().exists():
+                    break
+                if not ran:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Ran {done} task(s)."))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import notifications
+
+
+class Command(BaseCommand):
+    help = (
+        "Send queued SMS and email notifications (core/notifications.py) in "
+        "batches until stopped. Several can run at once; each batch is claimed "
+        "by one of them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Send what's due now, then exit")
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help="Seconds to sleep when nothing was sent")
+        parser.add_argument('--batch', type=int, default=100, help="Notifications sent per round")
+
+    def handle(self, *args, **options):
+        providers = notifications.providers()
+        self.stdout.write(f"{notifications.pending().count()} notification(s) waiting.")
+        sent = failed = 0
+        try:
+            while True:
+                close_old_connections()
+                ok, errors = notifications.dispatch(options['batch'], channel_providers=providers)
+                sent += ok
+                failed += errors
+                if options['once'] and not ok:
+                    break
+                if not ok:
+                    # Nothing due, or the providers are failing: back off
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} notification(s), {failed} failed."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.warmup import warm_templates
+
+
+class Command(BaseCommand):
+    help = (
+        "Compile every project template, the way a worker does at start-up with "
+        "TEMPLATE_WARMUP on. Fails if any template doesn't compile."
+    )
+
+    def handle(self, *args, **options):
+        compiled, seconds, errors = warm_templates()
+        for name, error in errors.items():
+            self.stderr.write(f"{name}: {error}")
+        if errors:
+            raise CommandError(f"{len(errors)} template(s) failed to compile.")
+        self.stdout.write(self.style.SUCCESS(f"Compiled {compiled} templates in {seconds * 1000:.1f} ms."))
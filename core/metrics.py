@@ -0,0 +1,145 @@
+"""
+In-process request metrics.
+
+``MetricsMiddleware`` records one ``RequestSample`` per request. The registry
+keeps the most recent samples in a ring buffer (for percentiles and the
+"recent requests" table) and running per-view totals with a latency
+histogram (for the Prometheus endpoint). Everything lives in the worker's
+memory, so each worker reports only the requests it served.
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field, replace
+
+from django.conf import settings
+
+from core.instrumentation import percentile
+
+# Upper bounds of the latency histogram, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+
+@dataclass
+class RequestSample:
+    view: str
+    method: str
+    status: int
+    wall: float
+    db: float
+    queries: int
+    template: float
+    size: int
+    at: float = field(default_factory=time.time)
+
+
+@dataclass
+class ViewTotals:
+    requests: int = 0
+    errors: int = 0
+    wall: float = 0.0
+    db: float = 0.0
+    queries: int = 0
+    template: float = 0.0
+    size: int = 0
+    buckets: list = field(default_factory=lambda: [0] * len(BUCKETS))
+
+    def add(self, sample):
+        self.requests += 1
+        self.errors += sample.status >= 500
+        self.wall += sample.wall
+        self.db += sample.db
+        self.queries += sample.queries
+        self.template += sample.template
+        self.size += sample.size
+        for i, bound in enumerate(BUCKETS):
+            if sample.wall <= bound:
+                self.buckets[i] += 1
+                break
+
+
+class MetricsRegistry:
+    def __init__(self, buffer_size=1000):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.recent = deque(maxlen=buffer_size)
+        self.views = {}
+
+    def record(self, sample):
+        with self.lock:
+            self.recent.append(sample)
+            self.views.setdefault(sample.view, ViewTotals()).add(sample)
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.recent.clear()
+            self.views.clear()
+
+    def latest(self, n=50):
+        with self.lock:
+            return list(self.recent)[-n:][::-1]
+
+    def summary(self):
+        """Per-view rows for the metrics page, slowest p95 first."""
+        with self.lock:
+            recent = list(self.recent)
+            totals = {view: (t.requests, t.errors) for view, t in self.views.items()}
+
+        rows = []
+        for view, (requests, errors) in totals.items():
+            samples = [s for s in recent if s.view == view]
+            if not samples:
+                continue
+            n = len(samples)
+            rows.append({
+                'view': view,
+                'requests': requests,
+                'errors': errors,
+                'p50_ms': percentile([s.wall for s in samples], 50) * 1000,
+                'p95_ms': percentile([s.wall for s in samples], 95) * 1000,
+                'db_ms': sum(s.db for s in samples) / n * 1000,
+                'queries': sum(s.queries for s in samples) / n,
+                'template_ms': sum(s.template for s in samples) / n * 1000,
+                'size_kb': sum(s.size for s in samples) / n / 1024,
+            })
+        return sorted(rows, key=lambda r: r['p95_ms'], reverse=True)
+
+    def prometheus(self):
+        """Render the running totals in the Prometheus text exposition format."""
+        with self.lock:
+            views = {view: replace(t, buckets=list(t.buckets)) for view, t in self.views.items()}
+
+        pid = os.getpid()
+        lines = [
+            '# HELP rmad_request_duration_seconds Request wall time by view.',
+            '# TYPE rmad_request_duration_seconds histogram',
+        ]
+        for view, t in sorted(views.items()):
+            labels = f'view="{view}",pid="{pid}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS, t.buckets):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else repr(bound)
+                lines.append(f'rmad_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'rmad_request_duration_seconds_sum{{{labels}}} {t.wall:.6f}')
+            lines.append(f'rmad_request_duration_seconds_count{{{labels}}} {t.requests}')
+
+        for name, attr, help_text in (
+            ('rmad_request_errors_total', 'errors', 'Responses with a 5xx status.'),
+            ('rmad_request_db_seconds_total', 'db', 'Time spent in database queries.'),
+            ('rmad_request_queries_total', 'queries', 'Database queries run.'),
+            ('rmad_request_template_seconds_total', 'template', 'Time spent rendering templates.'),
+            ('rmad_response_bytes_total', 'size', 'Response body bytes sent.'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for view, t in sorted(views.items()):
+                value = getattr(t, attr)
+                value = f'{value:.6f}' if isinstance(value, float) else value
+                lines.append(f'{name}{{view="{view}",pid="{pid}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry(getattr(settings, 'METRICS_BUFFER_SIZE', 1000))
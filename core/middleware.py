@@ -1,8 +1,25 @@
 # core/middleware.py
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
 from django.http import HttpResponseForbidden
 from django.urls import resolve
+from django.utils.cache import patch_cache_control
+from django.utils.functional import SimpleLazyObject
 
+from core.httpcache import POLICIES
+from core.instrumentation import QueryRecorder, TemplateTimer
+from core.metrics import RequestSample, registry
 from core.models import CustomUser
+from core.profiling import profiler
+from core.routers import release_replica, replica_configured, track_writes, use_replica
+from core.slowqueries import slow_queries
+
+logger = logging.getLogger(__name__)
 
 class RoleAccessMiddleware:
     def __init__(self, get_response):
@@ -29,4 +46,216 @@ class RoleAccessMiddleware:
         if url_name in role_urls and request.user.role != role_urls[url_name]:
             return HttpResponseForbidden("You don't have permission to access this page.")
         
-        return None
\ No newline at end of file
+        return None
+
+class ProfileMiddleware:
+    """
+    Set ``request.profile`` to the logged-in user's role profile (``Farmer``,
+    ``Customer``, ...), or None. It is resolved on first use and kept for the
+    rest of the request. Must come after ``AuthenticationMiddleware``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(lambda: self.get_profile(request))
+        return self.get_response(request)
+
+    @staticmethod
+    def get_profile(request):
+        if not request.user.is_authenticated:
+            return None
+        return request.user.get_profile()
+
+
+class CachePolicyMiddleware:
+    """
+    Give GET/HEAD responses the ``Cache-Control`` policy of their view
+    (``core.decorators.cache_policy``, else ``CACHE_POLICY_DEFAULT``). A
+    header set by the view itself is left alone, and so are error responses.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.default = getattr(settings, 'CACHE_POLICY_DEFAULT', 'private')
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        policy = getattr(request, '_cache_policy', None)
+        if (policy and request.method in ('GET', 'HEAD') and response.status_code in (200, 304)
+                and not response.has_header('Cache-Control')):
+            patch_cache_control(response, **POLICIES[policy])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        request._cache_policy = (
+            getattr(view_func, 'cache_policy', None) or getattr(view_class, 'cache_policy', None) or self.default
+        )
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryBudgetMiddleware:
+    """
+    Enforce the budgets declared with ``core.decorators.query_budget``.
+
+    Counts every query a budgeted view runs and the repeats of each SQL
+    fingerprint, then raises ``QueryBudgetExceeded`` or logs a warning
+    (``QUERY_BUDGET_ACTION``). Only installed while ``QUERY_BUDGET_ENABLED``
+    is on, which defaults to ``DEBUG``.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        budget = getattr(request, '_query_budget', None)
+        if budget is not None:
+            self.check(request, budget, recorder)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        request._query_budget = getattr(view_func, 'query_budget', None) or getattr(view_class, 'query_budget', None)
+
+    def check(self, request, budget, recorder):
+        max_duplicates = budget.duplicates
+        if max_duplicates is None:
+            max_duplicates = getattr(settings, 'QUERY_BUDGET_MAX_DUPLICATES', 3)
+
+        problems = []
+        if recorder.count > budget.queries:
+            problems.append(f"{recorder.count} queries (budget {budget.queries})")
+        for sql, times in recorder.duplicates().items():
+            if times > max_duplicates:
+                problems.append(f"{times}x (max {max_duplicates}): {sql[:200]}")
+        if not problems:
+            return
+
+        message = f"Query budget exceeded for {request.method} {request.path}:\n  " + "\n  ".join(problems)
+        if getattr(settings, 'QUERY_BUDGET_ACTION', 'log') == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class MetricsMiddleware:
+    """
+    Record wall time, database time, query count, template render time and
+    response size of every request into ``core.metrics.registry``.
+    Disabled with ``METRICS_ENABLED = False``.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with QueryRecorder() as queries, TemplateTimer() as templates:
+            response = self.get_response(request)
+        wall = time.perf_counter() - started
+
+        match = request.resolver_match
+        registry.record(RequestSample(
+            view=(match.view_name if match else None) or 'unresolved',
+            method=request.method,
+            status=response.status_code,
+            wall=wall,
+            db=queries.duration,
+            queries=queries.count,
+            template=templates.seconds,
+            size=0 if response.streaming else len(response.content),
+        ))
+        return response
+
+
+class ProfilerMiddleware:
+    """
+    Hand requests to ``core.profiling.profiler`` while it is armed for a URL
+    name. Costs one attribute check per request otherwise.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            profile = getattr(request, '_profile', None)
+            if profile is not None:
+                profiler.leave(profile)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if profiler.watching:
+            request._profile = profiler.enter(request)
+
+
+class SlowQueryMiddleware:
+    """
+    Log queries slower than ``SLOW_QUERY_THRESHOLD_MS`` to
+    ``core.slowqueries``. A threshold of 0 removes the middleware.
+    """
+
+    def __init__(self, get_response):
+        threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 0)
+        if not threshold:
+            raise MiddlewareNotUsed
+        self.threshold = threshold / 1000
+        self.get_response = get_response
+
+    def __call__(self, request):
+        def view_name():
+            match = request.resolver_match
+            return (match.view_name if match else None) or request.path
+
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(
+                    slow_queries.wrapper(conn.alias, self.threshold, view_name)
+                ))
+            return self.get_response(request)
+
+
+class ReplicaMiddleware:
+    """
+    Route ``@read_only_view`` GET/HEAD requests to the replica database, unless
+    the client wrote something within ``REPLICA_STICKINESS_SECONDS`` (tracked
+    with a short-lived cookie). Removed when no replica is configured.
+    """
+    cookie_name = 'rmad_recent_write'
+
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.stickiness = getattr(settings, 'REPLICA_STICKINESS_SECONDS', 5)
+
+    def __call__(self, request):
+        with track_writes() as wrote:
+            try:
+                response = self.get_response(request)
+            finally:
+                token = getattr(request, '_replica_token', None)
+                if token is not None:
+                    release_replica(token)
+            if wrote():
+                response.set_cookie(self.cookie_name, '1', max_age=self.stickiness, httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD') or self.cookie_name in request.COOKIES:
+            return
+        view_class = getattr(view_func, 'view_class', None)
+        if getattr(view_func, 'read_only', False) or getattr(view_class, 'read_only', False):
+            request._replica_token = use_replica()
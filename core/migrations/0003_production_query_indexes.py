@@ -0,0 +1,50 @@
+# Generated by Django 5.1.7 on 2026-10-19 15:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0002_customuser_lower_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['role', 'is_active'], name='customuser_role_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'status', 'created_at'], name='order_cust_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['delivery_personnel', 'status'], name='order_rider_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'delivery_personnel'], name='order_status_rider_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paddyprice',
+            index=models.Index(fields=['effective_date'], name='paddyprice_effective_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paddysupply',
+            index=models.Index(fields=['farmer', 'timestamp'], name='supply_farmer_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paddysupply',
+            index=models.Index(fields=['payment_status', 'status'], name='supply_payment_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paddysupply',
+            index=models.Index(fields=['mill_operator', 'timestamp'], name='supply_operator_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['transaction_time'], name='transaction_time_idx'),
+        ),
+    ]
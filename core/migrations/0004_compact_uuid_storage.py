@@ -0,0 +1,98 @@
+# Generated by Django 5.1.7 on 2026-10-19 15:38
+
+import core.fields
+import uuid
+from django.db import migrations
+
+
+def uuid_columns(apps):
+    """
+    (table, column) for every column holding a CompactUUIDField value: the
+    primary keys themselves plus all foreign key and many-to-many columns
+    pointing at them, including those of other apps (e.g. the admin log).
+    """
+    for model in apps.get_models(include_auto_created=True):
+        if not model._meta.managed or model._meta.proxy:
+            continue
+        for field in model._meta.local_fields:
+            target = field.target_field if field.is_relation else field
+            if isinstance(target, core.fields.CompactUUIDField):
+                yield model._meta.db_table, field.column
+
+
+def hex_to_blob(apps, schema_editor):
+    # AlterField rebuilt the SQLite tables with blob columns, but the copied
+    # values are still 32-character hex text
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.connection.connection.create_function(
+        'rmad_uuid_bytes', 1, lambda value: uuid.UUID(value).bytes, deterministic=True,
+    )
+    quote = schema_editor.quote_name
+    for table, column in uuid_columns(apps):
+        schema_editor.execute(
+            f"UPDATE {quote(table)} SET {quote(column)} = rmad_uuid_bytes({quote(column)}) "
+            f"WHERE typeof({quote(column)}) = 'text'"
+        )
+
+
+def blob_to_hex(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    quote = schema_editor.quote_name
+    for table, column in uuid_columns(apps):
+        schema_editor.execute(
+            f"UPDATE {quote(table)} SET {quote(column)} = lower(hex({quote(column)})) "
+            f"WHERE typeof({quote(column)}) = 'blob'"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_production_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='admin',
+            name='id',
+            field=core.fields.CompactUUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='id',
+            field=core.fields.CompactUUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='id',
+            field=core.fields.CompactUUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='deliverypersonnel',
+            name='id',
+            field=core.fields.CompactUUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='farmer',
+            name='id',
+            field=core.fields.CompactUUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='milloperator',
+            name='id',
+            field=core.fields.CompactUUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='paddyprice',
+            name='id',
+            field=core.fields.CompactUUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='paddysupply',
+            name='id',
+            field=core.fields.CompactUUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.RunPython(hex_to_blob, blob_to_hex),
+    ]
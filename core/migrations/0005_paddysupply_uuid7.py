@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-19 15:40
+
+import core.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_compact_uuid_storage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paddysupply',
+            name='id',
+            field=core.fields.CompactUUIDField(default=core.fields.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-19 15:57
+
+import core.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_paddysupply_uuid7'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paddysupply',
+            name='idempotency_key',
+            field=core.fields.CompactUUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
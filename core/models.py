@@ -1,11 +1,51 @@
 import uuid
 from django.db import models, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from decimal import Decimal
 from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .fields import CompactUUIDField, uuid7
+
+
+class LoadedValuesMixin:
+    """
+    Remembers the values of ``loaded_fields`` an instance was loaded or last
+    saved with, so receivers can act only on what a save actually changed.
+    """
+    # Attnames to remember. Only these: an instance is cached and pickled
+    # with them (a cached user must not carry its password hash)
+    loaded_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if name in cls.loaded_fields
+        }
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # After the post_save receivers, which still see the previous values
+        self._loaded_values = {name: getattr(self, name) for name in self.loaded_fields if name in self.__dict__}
+
+    def changed_fields(self, *names):
+        """Which of ``names`` differ from the loaded values; all of them on a new instance."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return set(names)
+        return {name for name in names if name not in loaded or loaded[name] != getattr(self, name)}
+
+
+# Rider fields shown on the order pages
+RIDER_ORDER_PAGE_FIELDS = ('vehicle_number',)
+RIDER_USER_ORDER_PAGE_FIELDS = ('first_name', 'last_name', 'phone_number')
 
 
 class CustomUserManager(BaseUserManager):
@@ -33,8 +73,9 @@ class CustomUserManager(BaseUserManager):
             raise ValueError(_('Superuser must have is_superuser=True.'))
         return self.create_user(email, username, password, **extra_fields)
 
-class CustomUser(AbstractBaseUser, PermissionsMixin):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+class CustomUser(LoadedValuesMixin, AbstractBaseUser, PermissionsMixin):
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    loaded_fields = RIDER_USER_ORDER_PAGE_FIELDS
 
     class Role(models.TextChoices):
         FARMER = 'FARMER', 'Farmer'
@@ -57,28 +98,54 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    class Meta:
+        indexes = [
+            # Back the case-insensitive login lookups in core.backends
+            models.Index(Lower('email'), name='customuser_email_lower_idx'),
+            models.Index(Lower('username'), name='customuser_username_lower_idx'),
+            # Role counts on the admin dashboard and the user list filters
+            models.Index(fields=['role', 'is_active'], name='customuser_role_active_idx'),
+        ]
+
+    # The one-to-one relation holding each role's profile
+    PROFILE_RELATIONS = {
+        Role.FARMER: 'farmer',
+        Role.CUSTOMER: 'customer',
+        Role.DELIVERY: 'deliverypersonnel',
+        Role.MILL_OPERATOR: 'milloperator',
+        Role.ADMIN: 'admin',
+    }
+
     def get_profile(self):
-        if hasattr(self, 'farmer'):
-            return self.farmer
-        elif hasattr(self, 'customer'):
-            return self.customer
-        elif hasattr(self, 'deliverypersonnel'):
-            return self.deliverypersonnel
-        elif hasattr(self, 'milloperator'):
-            return self.milloperator
-        elif hasattr(self, 'admin'):
-            return self.admin
-        return None
+        """
+        The profile matching this user's role, or None if it hasn't been
+        created. Only that one relation is looked at, so this is at most one
+        query, and none if it was loaded with ``select_related``.
+        """
+        relation = self.PROFILE_RELATIONS.get(self.role)
+        if relation is None:
+            return None
+        try:
+            return getattr(self, relation)
+        except models.ObjectDoesNotExist:
+            return None
 
     objects = CustomUserManager()
 
     def __str__(self):
         return self.email
 
+    def get_session_auth_hash(self):
+        # Users cached by core.backends come without the password hash but
+        # with the session hash made from it
+        if 'password' not in self.__dict__ and getattr(self, '_session_auth_hash', None):
+            return self._session_auth_hash
+        return super().get_session_auth_hash()
+
 
     
 class Farmer(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
     bank_name = models.CharField(max_length=100)
     account_number = models.CharField(max_length=50)
@@ -88,7 +155,7 @@ class Farmer(models.Model):
         return f"{self.user.first_name} {self.user.last_name}"
 
 class Customer(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
     delivery_address = models.TextField()
     preferred_payment_method = models.CharField(max_length=50, blank=True)
@@ -96,8 +163,9 @@ class Customer(models.Model):
     def __str__(self):
         return f"{self.user.first_name} {self.user.last_name}"
 
-class DeliveryPersonnel(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+class DeliveryPersonnel(LoadedValuesMixin, models.Model):
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    loaded_fields = RIDER_ORDER_PAGE_FIELDS
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
     vehicle_type = models.CharField(max_length=100)
     vehicle_number = models.CharField(max_length=20)
@@ -108,7 +176,7 @@ class DeliveryPersonnel(models.Model):
         return f"{self.user.first_name} {self.user.last_name}"
 
 class MillOperator(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
     class Shift(models.TextChoices):
         MORNING = 'MORNING', 'Morning Shift'
@@ -123,7 +191,7 @@ class MillOperator(models.Model):
         return f"{self.user.first_name} {self.user.last_name}"
 
 class Admin(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
     class AdminType(models.TextChoices):
         STANDARD = 'STANDARD', 'Standard Admin'
@@ -139,10 +207,16 @@ class Admin(models.Model):
 
 # >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>paddy price
 class PaddyPrice(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = CompactUUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     price_per_kg = models.DecimalField(max_digits=10, decimal_places=2)
     effective_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Latest price lookup on every dashboard and supply
+            models.Index(fields=['effective_date'], name='paddyprice_effective_idx'),
+        ]
+
     def __str__(self):
         return f"Paddy Price: {self.price_per_kg} per kg (Effective from {self.effective_date})"
 
@@ -151,7 +225,50 @@ class PaddyPrice(models.Model):
 
 
 User = get_user_model()
-from django.db.models.signals import post_save
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+
+
+# A new or renamed account must be able to log in straight away, even if its
+# email/username was recently remembered as unknown by the login backend.
+@receiver(post_save, sender=CustomUser)
+def forget_failed_login_lookups(sender, instance, **kwargs):
+    from core.backends import forget_login_misses  # Avoid circular imports
+    forget_login_misses(instance.email, instance.username)
+
+
+# The login backend caches each user together with their profile, so any
+# change to either (profile edits, password changes, role changes, last_login)
+# has to drop the cached copy.
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def forget_cached_user_on_change(sender, instance, **kwargs):
+    from core.backends import forget_cached_user  # Avoid circular imports
+    forget_cached_user(instance.pk)
+
+
+# Logging out only ends the session; the cached user goes too, so a worker
+# can't keep serving it
+@receiver(user_logged_out)
+def forget_cached_user_on_logout(sender, request, user, **kwargs):
+    from core.backends import forget_cached_user  # Avoid circular imports
+    if user is not None:
+        forget_cached_user(user.pk)
+
+
+@receiver(post_save, sender=Farmer)
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=DeliveryPersonnel)
+@receiver(post_save, sender=MillOperator)
+@receiver(post_save, sender=Admin)
+@receiver(post_delete, sender=Farmer)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=DeliveryPersonnel)
+@receiver(post_delete, sender=MillOperator)
+@receiver(post_delete, sender=Admin)
+def forget_cached_user_on_profile_change(sender, instance, **kwargs):
+    from core.backends import forget_cached_user  # Avoid circular imports
+    forget_cached_user(instance.user_id)
 
 # Define the PaddySupply model (as per your earlier code)
 class PaddySupply(models.Model):
@@ -166,7 +283,8 @@ class PaddySupply(models.Model):
         ('paid', 'Paid'),
     ]
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Time-ordered, so new supplies are appended to the primary key index
+    id = CompactUUIDField(primary_key=True, default=uuid7, editable=False)
     farmer = models.ForeignKey('Farmer', on_delete=models.CASCADE, related_name='paddy_supplies')
     mill_operator = models.ForeignKey(get_user_model(), on_delete=models.SET_NULL, null=True, blank=True, related_name='recorded_supplies')
 
@@ -190,13 +308,28 @@ class PaddySupply(models.Model):
 
     timestamp = models.DateTimeField(default=timezone.now)
 
+    # Generated by the collection-centre tablet that captured the supply, so
+    # a batch uploaded twice (see core/sync.py) isn't recorded twice
+    idempotency_key = CompactUUIDField(null=True, blank=True, unique=True, editable=False)
+
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Farmer dashboard's recent supplies
+            models.Index(fields=['farmer', 'timestamp'], name='supply_farmer_time_idx'),
+            # Supplies awaiting payment approval
+            models.Index(fields=['payment_status', 'status'], name='supply_payment_status_idx'),
+            # Mill operator's supply list
+            models.Index(fields=['mill_operator', 'timestamp'], name='supply_operator_time_idx'),
+        ]
 
     def __str__(self):
         return f"Supply by {self.farmer.user.get_full_name()} - {self.quantity}kg"
 
+    @transaction.atomic
     def save(self, *args, **kwargs):
+        # Atomic so the queued inventory task (update_paddy_inventory_on_supply)
+        # commits with the supply
         if not self.mill_operator:
             user_id = kwargs.pop('user_id', None)
             if user_id:
@@ -221,6 +354,7 @@ class PaddySupply(models.Model):
 
 
 
+    @transaction.atomic
     def approve_payment(self, admin_user):
         """Approve the payment for the paddy supply."""
         if admin_user.role != get_user_model().Role.ADMIN:
@@ -231,6 +365,9 @@ class PaddySupply(models.Model):
         self.payment_approved_at = timezone.now()  # Set the approval timestamp
         self.save()  # Save the updated record
 
+        from core import notifications  # Avoid circular imports
+        notifications.supply_payment_approved(self)
+
     def display_bank_details(self):
         return f"{self.farmer.bank_name} - {self.farmer.account_number}"
 
@@ -246,8 +383,20 @@ class ProcessedRiceInventory(models.Model):
 
     def update_inventory(self, quantity):
         """Increase inventory when paddy is processed into rice."""
-        self.quantity += Decimal(str(quantity))
-        self.save()
+        # Add in the database so concurrent writers can't overwrite each other
+        ProcessedRiceInventory.objects.filter(pk=self.pk).update(quantity=F('quantity') + Decimal(str(quantity)))
+        self.refresh_from_db(fields=['quantity'])
+
+    def reduce_inventory(self, quantity):
+        """Reduce inventory when an order is paid for."""
+        quantity_decimal = Decimal(str(quantity))
+        # Check and subtract in one statement, like PaddyInventory.reduce_inventory
+        reduced = ProcessedRiceInventory.objects.filter(pk=self.pk, quantity__gte=quantity_decimal).update(
+            quantity=F('quantity') - quantity_decimal
+        )
+        if not reduced:
+            raise ValueError("Insufficient processed rice inventory")
+        self.refresh_from_db(fields=['quantity'])
 
 
 class PaddyInventory(models.Model):
@@ -261,17 +410,21 @@ class PaddyInventory(models.Model):
 
     def update_inventory(self, quantity):
         """Increase inventory when new paddy is supplied."""
-        self.quantity += Decimal(str(quantity))
-        self.save()
+        # Add in the database so concurrent supplies can't overwrite each other
+        PaddyInventory.objects.filter(pk=self.pk).update(quantity=F('quantity') + Decimal(str(quantity)))
+        self.refresh_from_db(fields=['quantity'])
 
     def reduce_inventory(self, quantity):
         """Reduce inventory when paddy is processed into rice."""
         quantity_decimal = Decimal(str(quantity))
-        if self.quantity >= quantity_decimal:
-            self.quantity -= quantity_decimal
-            self.save()
-        else:
+        # Check and subtract in one statement, so the stock can't go negative
+        # even without a row lock
+        reduced = PaddyInventory.objects.filter(pk=self.pk, quantity__gte=quantity_decimal).update(
+            quantity=F('quantity') - quantity_decimal
+        )
+        if not reduced:
             raise ValueError("Insufficient paddy inventory to reduce.")
+        self.refresh_from_db(fields=['quantity'])
 
 
 class ProcessedRice(models.Model):
@@ -291,8 +444,9 @@ class ProcessedRice(models.Model):
 @receiver(post_save, sender='core.PaddySupply')
 def update_paddy_inventory_on_supply(sender, instance, created, **kwargs):
     if created:
-        paddy_inventory, _ = PaddyInventory.objects.get_or_create(id=1)
-        paddy_inventory.update_inventory(Decimal(str(instance.quantity)))
+        # Done in the background by core.tasks.add_paddy
+        from core.tasks import add_paddy, enqueue  # Avoid circular imports
+        enqueue(add_paddy, quantity=instance.quantity)
 
 
 # Signal to reduce paddy inventory and increase processed rice inventory
@@ -333,7 +487,10 @@ class PackageSize(models.Model):
 
 
 
-class Order(models.Model):
+class Order(LoadedValuesMixin, models.Model):
+    # The rider it was assigned to, for bump_order_fragments
+    loaded_fields = ('delivery_personnel_id',)
+
     ORDER_STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('paid', 'Paid'),
@@ -356,18 +513,27 @@ class Order(models.Model):
     total_kg = models.DecimalField(max_digits=12, decimal_places=2, editable=False, default=0.00)
     total_amount = models.DecimalField(max_digits=12, decimal_places=2, editable=False, default=0.00)
 
+    class Meta:
+        indexes = [
+            # Customer dashboard and order list
+            models.Index(fields=['customer', 'status', 'created_at'], name='order_cust_status_created_idx'),
+            # Delivery dashboard's active orders
+            models.Index(fields=['delivery_personnel', 'status'], name='order_rider_status_idx'),
+            # Paid orders still waiting for a rider (assign_delivery)
+            models.Index(fields=['status', 'delivery_personnel'], name='order_status_rider_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} for {self.customer.user.username}"
 
     def calculate_totals(self):
-        total_kg = 0
-        total_amount = 0
-        for item in self.items.all():
-            total_kg += item.get_total_kg()
-            total_amount += item.get_total_amount()
-
-        self.total_kg = total_kg
-        self.total_amount = total_amount
+        # One aggregate query instead of loading every item and its package
+        totals = self.items.aggregate(
+            total_kg=Sum(F('package_size__weight_kg') * F('quantity')),
+            total_amount=Sum(F('package_size__price_per_package') * F('quantity')),
+        )
+        self.total_kg = totals['total_kg'] or 0
+        self.total_amount = totals['total_amount'] or 0
         self.save()
 
 
@@ -389,20 +555,28 @@ class Order(models.Model):
 
     
     # models.py (Order)
+    @transaction.atomic
     def assign_delivery(self, delivery_personnel):
         """Assign the delivery personnel to the order."""
         if self.status == 'paid':  # Only assign delivery when the order is paid
             self.delivery_personnel = delivery_personnel
             self.save()
+
+            from core import notifications  # Avoid circular imports
+            notifications.delivery_assigned(self)
             return True
         else:
             raise ValueError("The order must be paid before assigning delivery personnel.")
 
+    @transaction.atomic
     def mark_as_delivered(self):
         """Mark the order as delivered."""
         if self.status == 'paid':
             self.status = 'delivered'
             self.save()
+
+            from core import notifications  # Avoid circular imports
+            notifications.order_delivered(self)
         else:
             raise ValueError("Only paid orders can be marked as delivered.")
     
@@ -438,16 +612,44 @@ class Transaction(models.Model):
     transaction_code_customer = models.CharField(max_length=100, help_text="MPESA or similar transaction code entered by customer")
     transaction_time = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # All-transactions page, newest first
+            models.Index(fields=['transaction_time'], name='transaction_time_idx'),
+        ]
+
     def __str__(self):
         return f"Transaction for Order #{self.order.id}"
 
+    @transaction.atomic
     def save(self, *args, **kwargs):
+        # Atomic so the stock taken here, the order status and the queued
+        # inventory task (see update_inventory_on_transaction) commit with
+        # the transaction, or not at all
+        if self._state.adding:
+            self.reserve_stock()
         super().save(*args, **kwargs)
 
         # Automatically confirm transaction and update order status
         self.order.status = 'paid'
         self.order.save()
 
+    def reserve_stock(self):
+        """
+        Take the order's rice out of the processed inventory. Raises
+        ValueError when there isn't enough, so the order is never marked
+        paid for rice that isn't there.
+        """
+        order = self.order
+        # Ensure the order has updated totals
+        if order.total_kg == 0:
+            order.calculate_totals()
+
+        processed_inventory = ProcessedRiceInventory.objects.first()
+        if not processed_inventory:
+            raise ValueError("Processed rice inventory not found")
+        processed_inventory.reduce_inventory(order.total_kg)
+
 
 
 
@@ -481,31 +683,12 @@ class SoldRiceInventory(models.Model):
 
 
 @receiver(post_save, sender=Transaction)
-@transaction.atomic
 def update_inventory_on_transaction(sender, instance, created, **kwargs):
     if created:
-        order = instance.order
-
-        # Ensure the order has updated totals
-        if order.total_kg == 0:
-            order.calculate_totals()
-
-        total_kg_sold = Decimal(str(order.total_kg))  # <--- FIXED TYPE
-
-        with transaction.atomic():
-            processed_inventory = ProcessedRiceInventory.objects.select_for_update().first()
-            if not processed_inventory:
-                raise ValueError("Processed rice inventory not found")
-
-            if processed_inventory.quantity < total_kg_sold:
-                raise ValueError("Insufficient processed rice inventory")
-
-            processed_inventory.quantity -= total_kg_sold
-            processed_inventory.save()
-
-            sold_inventory, _ = SoldRiceInventory.objects.select_for_update().get_or_create(id=1)
-            sold_inventory.quantity += total_kg_sold
-            sold_inventory.save()
+        # The stock was taken in Transaction.save; only adding it to the sold
+        # inventory, which can't fail for lack of rice, runs in the background
+        from core.tasks import enqueue, record_sale  # Avoid circular imports
+        enqueue(record_sale, order_id=instance.order_id)
 
 
 
@@ -528,4 +711,168 @@ class Delivery(models.Model):
         # Automatically fetch address from customer if not set
         if not self.delivery_address and self.order.customer:
             self.delivery_address = self.order.customer.address
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class IdempotencyKey(models.Model):
+    """
+    A form post or API call made with an idempotency key, and the response it
+    got, so a retry with the same key gets that response again instead of
+    running twice (see core/idempotency.py). Purged after
+    ``IDEMPOTENCY_KEY_TTL`` by ``manage.py purgeidempotencykeys``.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=64)
+    path = models.CharField(max_length=255)
+    # Null while the first request is still running
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    location = models.CharField(max_length=255, blank=True)
+    body = models.BinaryField(blank=True, default=b'')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_uniq'),
+        ]
+        indexes = [
+            # TTL purge
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.path})"
+
+
+class Task(models.Model):
+    """
+    A queued background job (see core/tasks.py), run by ``manage.py runworker``.
+    Due once ``run_at`` has passed and no worker holds it (``locked_until``).
+    """
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    # Set by the worker running it; a worker that dies leaves the task to
+    # be picked up again once this passes
+    locked_until = models.DateTimeField(null=True, blank=True)
+    lock_token = models.UUIDField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # The worker's "what's due" query
+            models.Index(fields=['run_at'], name='task_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name}({self.kwargs})"
+
+
+class DeadTask(models.Model):
+    """A task that failed ``max_attempts`` times, kept for a look and a retry."""
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    attempts = models.PositiveSmallIntegerField()
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    failed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name}({self.kwargs}) failed {self.attempts} times"
+
+
+class Notification(models.Model):
+    """
+    Outbox of SMS and email notifications. Rows are written in the same
+    transaction as the change they announce (see core/notifications.py) and
+    sent in batches by ``manage.py sendnotifications``.
+    """
+    class Channel(models.TextChoices):
+        SMS = 'sms', 'SMS'
+        EMAIL = 'email', 'Email'
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='notifications')
+    event = models.CharField(max_length=50)
+    channel = models.CharField(max_length=10, choices=Channel.choices)
+    # Phone number or email address at the time of the event
+    address = models.CharField(max_length=254)
+    subject = models.CharField(max_length=200, blank=True)
+    body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Set while a dispatcher is sending it
+    lock_token = models.UUIDField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # The dispatcher's "what's unsent" query
+            models.Index(fields=['sent_at', 'next_attempt_at'], name='notification_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} to {self.address}"
+
+
+# Fragment cache versions (see core/fragments.py). Bumping is cheap and
+# happens after commit, so every write that shows up in a cached fragment
+# bumps the version of whoever sees it.
+@receiver(post_save, sender=PaddyPrice)
+@receiver(post_delete, sender=PaddyPrice)
+def bump_price_fragments(sender, instance, **kwargs):
+    from core.fragments import PRICE, bump  # Avoid circular imports
+    bump(PRICE)
+
+
+@receiver(post_save, sender=PackageSize)
+@receiver(post_delete, sender=PackageSize)
+def bump_catalog_fragments(sender, instance, **kwargs):
+    from core.fragments import CATALOG, bump  # Avoid circular imports
+    bump(CATALOG)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def bump_order_fragments(sender, instance, **kwargs):
+    from core.fragments import bump, profile_scope  # Avoid circular imports
+    profiles = {instance.customer_id, instance.delivery_personnel_id}
+    # A reassigned order also leaves the dashboard of the rider it had
+    profiles.add(getattr(instance, '_loaded_values', {}).get('delivery_personnel_id'))
+    bump(*(profile_scope(pk) for pk in profiles if pk))
+
+
+@receiver(post_save, sender=PaddySupply)
+@receiver(post_delete, sender=PaddySupply)
+def bump_supply_fragments(sender, instance, **kwargs):
+    from core.fragments import bump, profile_scope  # Avoid circular imports
+    bump(profile_scope(instance.farmer_id))
+
+
+# The ETags of the order pages (see core/httpcache.py) follow Order.updated_at,
+# so writes that change those pages without saving the order touch it instead
+@receiver(post_save, sender=Delivery)
+@receiver(post_delete, sender=Delivery)
+def touch_order_on_delivery_change(sender, instance, **kwargs):
+    Order.objects.filter(pk=instance.order_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=DeliveryPersonnel)
+@receiver(post_save, sender=CustomUser)
+def touch_orders_on_rider_change(sender, instance, created, **kwargs):
+    # The rider's name, phone and vehicle number show on their customers'
+    # order pages; delivered and cancelled orders are left as they were
+    if created:
+        return
+    if sender is DeliveryPersonnel:
+        if not instance.changed_fields(*RIDER_ORDER_PAGE_FIELDS):
+            return
+        orders = Order.objects.filter(delivery_personnel=instance)
+    elif instance.role == CustomUser.Role.DELIVERY and instance.changed_fields(*RIDER_USER_ORDER_PAGE_FIELDS):
+        orders = Order.objects.filter(delivery_personnel__user=instance)
+    else:
+        return
+    orders.filter(status__in=['pending', 'paid']).update(updated_at=timezone.now())
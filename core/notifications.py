@@ -0,0 +1,208 @@
+"""
+SMS and email notifications through a transactional outbox.
+
+State changes that people should hear about call one of the event functions
+below (``supply_payment_approved``, ``delivery_assigned``,
+``order_delivered``) inside the transaction that makes the change. They only
+write ``Notification`` rows, so a notification exists exactly when its
+change commits, and the request doesn't wait on an SMS gateway.
+
+``manage.py sendnotifications`` sends the unsent rows in batches, one
+provider call per channel per batch. Providers are set per channel in
+``NOTIFICATION_PROVIDERS`` (dotted paths); ``ConsoleProvider`` and
+``FileProvider`` stand in for a real gateway in development. A message that
+fails is retried with exponential backoff, up to
+``NOTIFICATION_MAX_ATTEMPTS`` times.
+"""
+import json
+import logging
+import sys
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import Notification
+
+logger = logging.getLogger(__name__)
+
+Channel = Notification.Channel
+
+# How long a dispatcher may hold a batch before others assume it died
+LEASE = timedelta(minutes=5)
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+
+def notify(user, event, body, subject=''):
+    """
+    Queue a message to ``user``, by SMS if they have a phone number and by
+    email otherwise. Call it inside the transaction of the change it is about.
+    """
+    if user.phone_number:
+        channel, address = Channel.SMS, user.phone_number
+    elif user.email:
+        channel, address = Channel.EMAIL, user.email
+    else:
+        logger.info("Not notifying %s of %s: no phone number or email", user, event)
+        return None
+    return Notification.objects.create(
+        user=user, event=event, channel=channel, address=address, subject=subject, body=body,
+    )
+
+
+# Events
+
+def supply_payment_approved(supply):
+    notify(
+        supply.farmer.user, 'supply_payment_approved',
+        f"Your payment of KES {supply.total_amount} for {supply.quantity} kg of paddy "
+        f"delivered on {timezone.localdate(supply.timestamp):%d %b %Y} has been approved. "
+        f"Reference: {supply.payment_reference_code or '-'}.",
+        subject="Paddy payment approved",
+    )
+
+
+def delivery_assigned(order):
+    rider = order.delivery_personnel
+    notify(
+        order.customer.user, 'delivery_assigned',
+        f"Order #{order.id} will be delivered by {rider} ({rider.user.phone_number or 'no phone'}), "
+        f"{rider.vehicle_type} {rider.vehicle_number}.",
+        subject=f"Order #{order.id} is out for delivery",
+    )
+    notify(
+        rider.user, 'delivery_assigned',
+        f"New delivery: order #{order.id} for {order.customer_name}, {order.delivery_address or 'no address'}, "
+        f"{order.phone_number or 'no phone'}.",
+        subject=f"New delivery: order #{order.id}",
+    )
+
+
+def order_delivered(order):
+    notify(
+        order.customer.user, 'order_delivered',
+        f"Order #{order.id} has been delivered. Thank you for buying from us!",
+        subject=f"Order #{order.id} delivered",
+    )
+
+
+# Providers
+#
+# send_messages(notifications) gets a batch for one channel and returns
+# {pk: error} for the messages it couldn't send; raising means none were sent.
+
+class ConsoleProvider:
+    """Writes messages to stdout."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send_messages(self, notifications):
+        for n in notifications:
+            self.stream.write(f"[{n.channel}] to {n.address}: {n.body}\n")
+        self.stream.flush()
+        return {}
+
+
+class FileProvider:
+    """Appends messages to ``NOTIFICATION_FILE``, one JSON object per line."""
+
+    def __init__(self, path=None):
+        self.path = path or settings.NOTIFICATION_FILE
+
+    def send_messages(self, notifications):
+        lines = [
+            json.dumps({
+                'id': n.pk, 'channel': n.channel, 'to': n.address, 'event': n.event,
+                'subject': n.subject, 'body': n.body, 'sent_at': timezone.now().isoformat(),
+            }) + '\n'
+            for n in notifications
+        ]
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(lines)
+        return {}
+
+
+class EmailProvider:
+    """Sends email through Django's ``EMAIL_BACKEND``, one connection per batch."""
+
+    def send_messages(self, notifications):
+        failed = {}
+        with get_connection() as connection:
+            for n in notifications:
+                try:
+                    EmailMessage(n.subject, n.body, to=[n.address], connection=connection).send()
+                except Exception as e:
+                    failed[n.pk] = repr(e)
+        return failed
+
+
+def providers():
+    return {channel: import_string(path)() for channel, path in settings.NOTIFICATION_PROVIDERS.items()}
+
+
+# Dispatching
+
+def retry_delay(attempts):
+    base = timedelta(seconds=getattr(settings, 'NOTIFICATION_RETRY_DELAY', 30))
+    return min(base * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def pending(now=None):
+    now = now or timezone.now()
+    # A claimed row's next_attempt_at is the end of its lease, so rows whose
+    # dispatcher died come back by themselves
+    return Notification.objects.filter(
+        sent_at__isnull=True,
+        next_attempt_at__lte=now,
+        attempts__lt=getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 10),
+    )
+
+
+def claim(limit, now=None):
+    """Take up to ``limit`` pending notifications, oldest first, for this dispatcher."""
+    now = now or timezone.now()
+    token = uuid.uuid4()
+    # The outer filter is checked again against rows another dispatcher
+    # claimed meanwhile, so no row is taken twice
+    pending(now).filter(pk__in=pending(now).order_by('pk').values('pk')[:limit]).update(
+        lock_token=token, next_attempt_at=now + LEASE, attempts=F('attempts') + 1,
+    )
+    return list(Notification.objects.filter(lock_token=token).order_by('pk'))
+
+
+def dispatch(limit=100, now=None, channel_providers=None):
+    """Send one batch. Returns (sent, failed) counts."""
+    batch = claim(limit, now)
+    if not batch:
+        return 0, 0
+    token = batch[0].lock_token
+    channel_providers = channel_providers or providers()
+
+    errors = {}
+    for channel in {n.channel for n in batch}:
+        messages = [n for n in batch if n.channel == channel]
+        try:
+            provider = channel_providers[channel]
+            errors.update(provider.send_messages(messages))
+        except Exception as e:
+            logger.warning("Sending %d %s notification(s) failed", len(messages), channel, exc_info=True)
+            errors.update(dict.fromkeys((n.pk for n in messages), repr(e)))
+
+    sent = [n.pk for n in batch if n.pk not in errors]
+    # Only rows still ours: if the lease ran out while sending, another
+    # dispatcher may have claimed them since, and their state is its to set
+    Notification.objects.filter(pk__in=sent, lock_token=token).update(
+        sent_at=timezone.now(), lock_token=None, last_error='',
+    )
+    for n in batch:
+        if n.pk in errors:
+            Notification.objects.filter(pk=n.pk, lock_token=token).update(
+                lock_token=None, last_error=errors[n.pk],
+                next_attempt_at=timezone.now() + retry_delay(n.attempts),
+            )
+    return len(sent), len(errors)
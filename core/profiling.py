@@ -0,0 +1,255 @@
+"""
+On-demand profiler for a live worker.
+
+An admin arms the profiler from /c-admin/profiler/ in one of two modes:
+
+* ``duration``: a background thread snapshots the stack of every thread in
+  this process (``sys._current_frames()``) at a fixed interval for N seconds.
+  Samples are folded into collapsed stacks (``frame;frame;frame count``), the
+  input format of flamegraph.pl, speedscope and similar tools.
+* ``requests``: the next K requests whose URL name matches run under their
+  own ``cProfile.Profile``, enabled and disabled by ``ProfilerMiddleware``
+  in the thread serving the request, and their stats are merged. They can
+  be downloaded as collapsed stacks too, weighted in microseconds and
+  rebuilt from cProfile's caller/callee times (``collapse_stats``), or as
+  the ``.prof`` file itself for ``python -m pstats`` or snakeviz. On Python
+  3.12+ only one cProfile can be active at a time, so a matching request
+  that overlaps another one is not profiled and doesn't count.
+
+State lives in the worker's memory, so with several workers only the one
+that served the admin's request is profiled. When nothing is armed the
+middleware does a single attribute check per request.
+"""
+import cProfile
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+MAX_SECONDS = 120
+MAX_REQUESTS = 500
+# Share of the total time below which a cProfile call path is not drawn
+MIN_SHARE = 0.0001
+
+
+def _label(filename, lineno, name):
+    if filename == '~':
+        # Built-ins, as cProfile names them
+        return name.replace(';', ':')
+    base = str(settings.BASE_DIR)
+    if filename.startswith(base):
+        filename = os.path.relpath(filename, base)
+    else:
+        for path in sorted(sys.path, key=len, reverse=True):
+            if path and filename.startswith(path + os.sep):
+                filename = filename[len(path) + 1:]
+                break
+    # ';' separates frames in the collapsed format
+    return f'{name} ({filename}:{lineno})'.replace(';', ':')
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return _label(code.co_filename, code.co_firstlineno, code.co_name)
+
+
+def collapse(frame):
+    """The stack ending at ``frame`` as ``root;...;leaf``."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+def collapse_stats(stats, root):
+    """
+    Collapsed stacks from cProfile ``stats`` (``pstats.Stats.stats``), each
+    under ``root``, counted in microseconds.
+
+    cProfile keeps caller -> callee edges rather than whole stacks, so the
+    time of a function called from several places is split between the
+    paths into it in proportion to the time each caller spent in it: exact
+    for a call tree, an estimate for shared helpers. Paths taking less than
+    ``MIN_SHARE`` of the total are folded into their caller.
+    """
+    callees = defaultdict(dict)
+    roots = []
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge[3]
+        if not callers:
+            roots.append(func)
+    smallest = sum(stats[func][3] for func in roots) * MIN_SHARE
+    stacks = Counter()
+
+    def walk(func, seconds, path):
+        _, _, own, total, _ = stats[func]
+        if total <= 0:
+            return
+        scale = seconds / total
+        own *= scale
+        path = path + (func,)
+        calls = {callee: callee_seconds * scale for callee, callee_seconds in callees[func].items()}
+        # Under recursion cProfile's edge times include the nested calls
+        # while the function's total doesn't, so they can add up to more
+        # than ``seconds``; keep the paths within it
+        spent = sum(calls.values())
+        if spent > seconds - own:
+            calls = {callee: t * max(seconds - own, 0) / spent for callee, t in calls.items()}
+        for callee, callee_seconds in calls.items():
+            if callee in path or callee_seconds < smallest:
+                # Recursion, or too small to show: stays with the caller
+                own += callee_seconds
+            else:
+                walk(callee, callee_seconds, path)
+        stacks[';'.join([root, *(_label(*f) for f in path)])] += own
+
+    for func in roots:
+        walk(func, stats[func][3], ())
+    return ''.join(
+        f'{stack} {round(seconds * 1e6)}\n' for stack, seconds in
+        sorted(stacks.items(), key=lambda item: -item[1]) if round(seconds * 1e6)
+    )
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Checked by ProfilerMiddleware on every request; True only while a
+        # ``requests`` run still has requests left to catch
+        self.watching = False
+        self.mode = None
+        self.url_name = None
+        self.remaining = 0
+        # Profiles of the requests being profiled right now
+        self.active = set()
+        self.stats = None
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None
+        self.finished = None
+        # Collapsed stacks, both modes
+        self.result = None
+        # Marshalled pstats, request mode only
+        self.pstats_result = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, mode, seconds=10, url_name=None, requests=10, interval=0.005):
+        with self.lock:
+            if self.running:
+                raise RuntimeError("The profiler is already running.")
+            self.mode = mode
+            self.url_name = url_name
+            self.remaining = min(requests, MAX_REQUESTS) if mode == 'requests' else 0
+            self.active = set()
+            self.stats = None
+            self.stacks = Counter()
+            self.samples = 0
+            self.started = time.time()
+            self.finished = None
+            self.result = None
+            self.pstats_result = None
+            self._stop.clear()
+            deadline = time.monotonic() + min(seconds, MAX_SECONDS)
+            self._thread = threading.Thread(
+                target=self._run, args=(deadline, interval), name='rmad-profiler', daemon=True,
+            )
+            self._thread.start()
+            self.watching = mode == 'requests'
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def enter(self, request):
+        """
+        Start profiling the current thread if ``request`` is one to profile.
+        Returns its ``cProfile.Profile``, to be handed back to ``leave()``.
+        """
+        match = request.resolver_match
+        with self.lock:
+            if not self.watching or match is None or match.url_name != self.url_name:
+                return None
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+: another request is being profiled
+                return None
+            self.remaining -= 1
+            self.watching = self.remaining > 0
+            self.active.add(profile)
+            return profile
+
+    def leave(self, profile):
+        profile.disable()
+        with self.lock:
+            if profile not in self.active:
+                return  # The run ended (or was stopped) meanwhile
+            self.active.discard(profile)
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+            self.samples += 1
+            if not self.watching and not self.active:
+                self._stop.set()
+
+    def _run(self, deadline, interval):
+        if self.mode == 'requests':
+            # The request threads do the profiling; this only ends the run
+            self._stop.wait(max(0, deadline - time.monotonic()))
+        else:
+            self._sample(deadline, interval)
+
+        with self.lock:
+            self.watching = False
+            self.active = set()
+            self.finished = time.time()
+            if self.mode == 'requests':
+                self.result = collapse_stats(self.stats.stats, self.url_name) if self.stats else None
+                # What pstats.Stats.dump_stats() writes
+                self.pstats_result = marshal.dumps(self.stats.stats) if self.stats else None
+            else:
+                self.result = ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def _sample(self, deadline, interval):
+        me = threading.get_ident()
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            frames = sys._current_frames()
+            for thread in threading.enumerate():
+                frame = frames.get(thread.ident)
+                if thread.ident != me and frame is not None:
+                    self.stacks[f'{thread.name};{collapse(frame)}'] += 1
+                    self.samples += 1
+            del frames
+            self._stop.wait(interval)
+
+    def status(self):
+        return {
+            'running': self.running,
+            'mode': self.mode,
+            'url_name': self.url_name,
+            'remaining': self.remaining,
+            'samples': self.samples,
+            'started': self.started,
+            'finished': self.finished,
+            'has_result': bool(self.result),
+            'has_pstats': bool(self.pstats_result),
+            'pid': os.getpid(),
+        }
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,107 @@
+"""
+Bulk user provisioning.
+
+Creating users one by one through ``create_user`` pays a full password hash,
+one INSERT for the user and another for the role profile per account. The
+helpers here hash passwords in a process pool and ``bulk_create`` users and
+their profiles in batches instead. Signals are not sent for bulk inserts.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models.functions import Lower
+
+# Below this many passwords the pool start-up costs more than it saves
+POOL_THRESHOLD = 32
+
+
+def hash_passwords(passwords, workers=None):
+    """Return ``make_password`` hashes for ``passwords``, in order."""
+    passwords = list(passwords)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < POOL_THRESHOLD:
+        return [make_password(p) for p in passwords]
+
+    chunksize = max(1, len(passwords) // (workers * 4))
+    # django.setup() makes the workers usable with the "spawn" start method too
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def get_profile_model(role):
+    from core.models import Admin, Customer, CustomUser, DeliveryPersonnel, Farmer, MillOperator
+
+    return {
+        CustomUser.Role.FARMER: Farmer,
+        CustomUser.Role.CUSTOMER: Customer,
+        CustomUser.Role.DELIVERY: DeliveryPersonnel,
+        CustomUser.Role.MILL_OPERATOR: MillOperator,
+        CustomUser.Role.ADMIN: Admin,
+    }.get(role)
+
+
+def provision_users(rows, batch_size=500, workers=None):
+    """
+    Create users and their role profiles in bulk.
+
+    ``rows`` is an iterable of dicts holding ``CustomUser`` fields plus a
+    ``password`` and an optional ``profile`` dict of fields for the role's
+    profile model. Rows whose email or username already exists (ignoring
+    case), including earlier rows of the same input, are skipped.
+
+    Returns a ``(created_users, skipped_rows)`` tuple.
+    """
+    from core.backends import forget_login_misses
+    from core.models import CustomUser
+
+    rows = list(rows)
+    for row in rows:
+        row['email'] = CustomUser.objects.normalize_email(row['email'])
+
+    # Drop rows clashing with existing accounts before paying for any hashing
+    existing = CustomUser.objects.annotate(email_lower=Lower('email'), username_lower=Lower('username'))
+    seen_emails, seen_usernames = set(), set()
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        seen_emails.update(existing.filter(
+            email_lower__in={row['email'].lower() for row in batch}
+        ).values_list('email_lower', flat=True))
+        seen_usernames.update(existing.filter(
+            username_lower__in={row['username'].lower() for row in batch}
+        ).values_list('username_lower', flat=True))
+
+    new_rows, skipped = [], []
+    for row in rows:
+        email, username = row['email'].lower(), row['username'].lower()
+        if email in seen_emails or username in seen_usernames:
+            skipped.append(row)
+            continue
+        seen_emails.add(email)
+        seen_usernames.add(username)
+        new_rows.append(row)
+
+    hashes = hash_passwords([row.get('password') for row in new_rows], workers=workers)
+
+    created = []
+    for start in range(0, len(new_rows), batch_size):
+        users, profiles = [], []
+        for row, password_hash in zip(new_rows[start:start + batch_size], hashes[start:start + batch_size]):
+            fields = {k: v for k, v in row.items() if k not in ('password', 'profile')}
+            user = CustomUser(password=password_hash, **fields)
+            users.append(user)
+            profile_model = get_profile_model(user.role)
+            if profile_model:
+                profiles.append(profile_model(user=user, **row.get('profile', {})))
+
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(users)
+            for profile_model in {type(p) for p in profiles}:
+                profile_model.objects.bulk_create([p for p in profiles if type(p) is profile_model])
+
+        forget_login_misses(*[u.email for u in users], *[u.username for u in users])
+        created.extend(users)
+
+    return created, skipped
@@ -0,0 +1,63 @@
+"""
+Read-replica routing.
+
+Views marked with ``@read_only_view`` (dashboards, lists, reports) read from
+the ``replica`` database alias when one is configured; everything else, and
+every write, uses ``default``. ``ReplicaMiddleware`` decides per request and
+keeps a user on the primary for ``REPLICA_STICKINESS_SECONDS`` after they
+write anything, so they see their own changes before the replica catches up.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+
+REPLICA = 'replica'
+
+# True while the current request may read from the replica
+_use_replica = ContextVar('use_replica', default=False)
+# Set once the current request has written to the database
+_wrote = ContextVar('wrote', default=False)
+
+
+def replica_configured():
+    return REPLICA in connections
+
+
+def use_replica():
+    """Send this context's reads to the replica; returns a token for ``release_replica``."""
+    return _use_replica.set(True)
+
+
+def release_replica(token):
+    _use_replica.reset(token)
+
+
+@contextmanager
+def track_writes():
+    """Yields a callable telling whether anything was written inside the block."""
+    token = _wrote.set(False)
+    try:
+        yield _wrote.get
+    finally:
+        _wrote.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # Sessions stay on the primary: a lagging replica would log people out
+        if _use_replica.get() and model._meta.app_label != 'sessions':
+            return REPLICA
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary
+        return db == 'default'
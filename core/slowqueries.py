@@ -0,0 +1,123 @@
+"""
+Slow-query log.
+
+``SlowQueryMiddleware`` wraps every database connection during a request and
+hands queries slower than ``SLOW_QUERY_THRESHOLD_MS`` to ``slow_queries``,
+which aggregates them by SQL fingerprint. The first time a fingerprint shows
+up its plan is captured (``EXPLAIN QUERY PLAN`` on SQLite, ``EXPLAIN``
+elsewhere) and logged to the ``core.slowqueries`` logger; later hits only
+bump the counters. The aggregate is shown on the admin metrics page.
+"""
+import logging
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+
+from django.db import DatabaseError, connections, transaction
+
+from core.instrumentation import fingerprint, is_untracked, untracked
+
+logger = logging.getLogger(__name__)
+
+
+def explain(alias, sql, params):
+    """The query plan of ``sql`` as a list of lines, or None if it can't be explained."""
+    conn = connections[alias]
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.vendor == 'sqlite' else 'EXPLAIN '
+    # A failing EXPLAIN would break an outer transaction on PostgreSQL, so it
+    # gets a savepoint there. Not on SQLite: errors don't abort its
+    # transactions, and outside one atomic() would BEGIN IMMEDIATE under the
+    # sqlite-production database profile, taking the write lock for a read
+    savepoint = nullcontext() if conn.vendor == 'sqlite' else transaction.atomic(using=alias)
+    try:
+        # untracked() lets the EXPLAIN through our own wrapper and keeps it out
+        # of the request's query count
+        with untracked(), savepoint, conn.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+    except DatabaseError:
+        return None
+    if conn.vendor in ('sqlite', 'postgresql'):
+        return [str(row[-1]) for row in rows]
+    return [' | '.join(str(col) for col in row) for row in rows]
+
+
+@dataclass
+class SlowQuery:
+    fingerprint: str
+    alias: str
+    sql: str
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    views: set = field(default_factory=set)
+    plan: list = None
+
+
+class SlowQueryLog:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries = {}
+
+    def wrapper(self, alias, threshold, view_name):
+        """
+        An ``execute_wrapper`` for connection ``alias`` recording queries
+        slower than ``threshold`` seconds. ``view_name`` is called to name the
+        view that ran them (it isn't known until the URL has been resolved).
+        """
+        def record(execute, sql, params, many, context):
+            if is_untracked():
+                return execute(sql, params, many, context)
+            started = time.perf_counter()
+            result = execute(sql, params, many, context)
+            elapsed = time.perf_counter() - started
+            if elapsed >= threshold:
+                self.add(alias, sql, None if many else params, elapsed, view_name())
+            return result
+        return record
+
+    def add(self, alias, sql, params, elapsed, view):
+        key = fingerprint(sql)
+        with self.lock:
+            entry = self.queries.get(key)
+            first = entry is None
+            if first:
+                entry = self.queries[key] = SlowQuery(key, alias, sql)
+            entry.count += 1
+            entry.total += elapsed
+            entry.max = max(entry.max, elapsed)
+            entry.views.add(view)
+
+        if first:
+            # Only reads are explained; EXPLAIN of a write is not always side-effect free
+            if params is not None and sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+                entry.plan = explain(alias, sql, params)
+            logger.warning(
+                "Slow query (%.1f ms) in %s: %s\n%s", elapsed * 1000, view, key,
+                '\n'.join(entry.plan or ['(no plan)']),
+            )
+        else:
+            logger.info("Slow query (%.1f ms, seen %d times) in %s: %s", elapsed * 1000, entry.count, view, key)
+
+    def reset(self):
+        with self.lock:
+            self.queries.clear()
+
+    def summary(self):
+        """Aggregated slow queries, most total time first."""
+        with self.lock:
+            rows = [{
+                'fingerprint': q.fingerprint,
+                'alias': q.alias,
+                'count': q.count,
+                'total_ms': q.total * 1000,
+                'avg_ms': q.total / q.count * 1000,
+                'max_ms': q.max * 1000,
+                'views': sorted(q.views),
+                'plan': q.plan,
+            } for q in self.queries.values()]
+        return sorted(rows, key=lambda r: r['total_ms'], reverse=True)
+
+
+slow_queries = SlowQueryLog()
@@ -0,0 +1,130 @@
+"""
+Batch upload of supplies captured offline, ``POST /api/v1/supplies/sync/``.
+
+Collection-centre tablets keep recording supplies while offline and upload
+them in one request once they're back online::
+
+    {"supplies": [{"key": "<uuid made on the tablet>", "farmer": "<farmer id>",
+                   "quantity": "120.50", "quality_rating": 4,
+                   "moisture_content": "13.20", "timestamp": "2026-10-19T08:15:00Z"}, ...]}
+
+Each record gets a result in the same order: ``created`` or ``duplicate``
+(its key was uploaded before; ``id`` is the supply recorded then), both
+with the supply ``id``, or ``invalid`` with the field ``errors``. Uploading
+the same batch again is safe, so a tablet can simply retry until it gets
+an answer.
+
+The valid records are written in one transaction with one price lookup,
+one bulk insert and one queued paddy inventory update, instead of a
+``PaddySupply.save()`` and its signals per record. Uses the login session;
+send the CSRF token in the ``X-CSRFToken`` header.
+"""
+import json
+from decimal import Decimal
+
+from django.db import transaction
+from django.http import JsonResponse
+from django.utils import timezone
+
+from core.api import BadRequest, Role, api_view, error
+from core.decorators import cache_policy, query_budget
+from core.forms import SupplySyncForm
+from core.fragments import bump, profile_scope
+from core.models import Farmer, PaddyPrice, PaddySupply
+from core.tasks import add_paddy, enqueue
+
+MAX_BATCH = 500
+CENTS = Decimal('0.01')
+UNKNOWN_FARMER = {'farmer': [{'message': "No such farmer.", 'code': 'invalid_choice'}]}
+
+
+def parse_batch(request):
+    try:
+        body = json.loads(request.body)
+    except ValueError:
+        raise BadRequest("The body must be JSON.")
+    records = body.get('supplies') if isinstance(body, dict) else None
+    if not isinstance(records, list):
+        raise BadRequest('Expected {"supplies": [...]}.')
+    if len(records) > MAX_BATCH:
+        raise BadRequest(f"At most {MAX_BATCH} supplies per request; split the batch.")
+    return records
+
+
+@cache_policy('no-store')
+# SQLite takes the bulk insert in chunks of ~70 rows (its 999-parameter
+# limit); a full batch plus the eager paddy inventory update (TASKS_EAGER,
+# development) comes to 21
+@query_budget(21, duplicates=8)
+@api_view('POST')
+def sync_supplies(request):
+    if request.user.role != Role.MILL_OPERATOR:
+        return error("Only mill operators can record supplies.", status=403)
+    records = parse_batch(request)
+
+    results = [None] * len(records)
+    pending = {}  # key -> (index, cleaned data) of the first valid record with that key
+    repeats = {}  # index -> key, for a key sent twice in one batch (a retry the tablet queued)
+    for index, record in enumerate(records):
+        form = SupplySyncForm(record if isinstance(record, dict) else {})
+        if not form.is_valid():
+            key = record.get('key') if isinstance(record, dict) else None
+            results[index] = {'key': key, 'status': 'invalid', 'errors': form.errors.get_json_data()}
+        elif form.cleaned_data['key'] in pending:
+            repeats[index] = form.cleaned_data['key']
+        else:
+            pending[form.cleaned_data['key']] = (index, form.cleaned_data)
+
+    with transaction.atomic():
+        price = PaddyPrice.objects.order_by('-effective_date').values_list('price_per_kg', flat=True).first()
+        if price is None:
+            return error("No paddy price available. Please reach out to the administrator", status=409)
+
+        farmers = set(Farmer.objects.filter(pk__in={data['farmer'] for _, data in pending.values()})
+                      .values_list('pk', flat=True))
+        for key, (index, data) in list(pending.items()):
+            if data['farmer'] not in farmers:
+                results[index] = {'key': str(key), 'status': 'invalid', 'errors': UNKNOWN_FARMER}
+                del pending[key]
+
+        now = timezone.now()
+        supplies = [
+            PaddySupply(
+                idempotency_key=key,
+                farmer_id=data['farmer'],
+                mill_operator=request.user,
+                quantity=data['quantity'],
+                quality_rating=data['quality_rating'],
+                moisture_content=data['moisture_content'],
+                status='received',
+                total_amount=(data['quantity'] * price).quantize(CENTS),
+                timestamp=data['timestamp'] or now,
+            )
+            for key, (_, data) in pending.items()
+        ]
+        # Keys uploaded before (or by a concurrent retry) are skipped by the
+        # unique index; reading the keys back tells which rows are ours
+        PaddySupply.objects.bulk_create(supplies, ignore_conflicts=True)
+        stored = dict(PaddySupply.objects.filter(idempotency_key__in=list(pending)).values_list('idempotency_key', 'pk'))
+        created = [supply for supply in supplies if stored[supply.idempotency_key] == supply.pk]
+
+        # What update_paddy_inventory_on_supply and bump_supply_fragments do
+        # per saved supply, once for the batch
+        delta = sum((supply.quantity for supply in created), Decimal('0'))
+        if delta:
+            enqueue(add_paddy, quantity=delta)
+        bump(*{profile_scope(supply.farmer_id) for supply in created})
+
+    for supply in supplies:
+        key = supply.idempotency_key
+        status = 'created' if stored[key] == supply.pk else 'duplicate'
+        results[pending[key][0]] = {'key': str(key), 'status': status, 'id': str(stored[key])}
+    for index, key in repeats.items():
+        first = results[pending[key][0]] if key in pending else None
+        if first is None:
+            # The first copy had an unknown farmer; so does this one
+            results[index] = {'key': str(key), 'status': 'invalid', 'errors': UNKNOWN_FARMER}
+        else:
+            results[index] = {**first, 'status': 'duplicate'}
+
+    return JsonResponse({'created': len(created), 'results': results})
@@ -0,0 +1,170 @@
+"""
+A small database-backed task queue, for side effects that don't have to
+happen inside the request.
+
+``enqueue(func, **kwargs)`` writes a ``Task`` row in the current transaction,
+so the task exists exactly when the change that asked for it commits.
+``manage.py runworker`` picks due tasks up and runs each one in a
+transaction together with deleting its row: its writes commit once or not
+at all. A failing task is retried with exponential backoff and moved to
+``DeadTask`` after ``max_attempts`` (``runworker --retry-dead`` queues them
+again).
+
+With ``TASKS_EAGER`` on (the default while ``DEBUG`` is), tasks run in the
+same process right after the commit instead, so development doesn't need a
+worker running. Their queries then count towards the request's query
+budget and metrics, since the request does wait for them. A task failing
+there is retried like with a worker, on the same backoff, but only when a
+later commit queues another task; dead tasks still need
+``runworker --retry-dead``.
+
+Task functions are registered with ``@task``, take JSON-able keyword
+arguments, and must raise to signal failure.
+"""
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.models import DeadTask, Order, PaddyInventory, SoldRiceInventory, Task
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+
+# How long a worker may hold a task before others assume it died
+LEASE = timedelta(minutes=5)
+MAX_RETRY_DELAY = timedelta(hours=1)
+# Due retries run after each eager task
+EAGER_RETRY_BATCH = 10
+
+
+def task(func=None, *, max_attempts=5):
+    """Register a task function under ``module.name``."""
+    def decorator(func):
+        func.task_name = f'{func.__module__}.{func.__name__}'
+        func.max_attempts = max_attempts
+        REGISTRY[func.task_name] = func
+        return func
+    return decorator(func) if func else decorator
+
+
+def enqueue(func, **kwargs):
+    record = Task.objects.create(name=func.task_name, kwargs=kwargs, max_attempts=func.max_attempts)
+    if getattr(settings, 'TASKS_EAGER', settings.DEBUG):
+        transaction.on_commit(lambda: run_eagerly(record.pk))
+    return record
+
+
+def run_eagerly(pk):
+    run(pk)
+    # Failed tasks come back on the same backoff as with a worker: the next
+    # commit that queues a task also runs the retries due by then
+    run_due(limit=EAGER_RETRY_BATCH)
+
+
+def retry_delay(attempts):
+    base = timedelta(seconds=getattr(settings, 'TASK_RETRY_DELAY', 10))
+    return min(base * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def due(now=None):
+    now = now or timezone.now()
+    return Task.objects.filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now), run_at__lte=now)
+
+
+def claim(pk, now=None):
+    """Take task ``pk`` for this worker; returns the lock token, or None if another worker has it."""
+    now = now or timezone.now()
+    token = uuid.uuid4()
+    claimed = due(now).filter(pk=pk).update(
+        locked_until=now + LEASE, lock_token=token, attempts=F('attempts') + 1,
+    )
+    return token if claimed else None
+
+
+def run(pk, now=None):
+    """
+    Claim and run task ``pk``. Returns True if it ran and succeeded, False
+    if it failed (and was rescheduled or moved to ``DeadTask``) or another
+    worker had it.
+    """
+    token = claim(pk, now)
+    if token is None:
+        return False
+    record = Task.objects.get(pk=pk)
+    func = REGISTRY.get(record.name)
+    try:
+        if func is None:
+            raise LookupError(f"No task is registered as {record.name!r}")
+        with transaction.atomic():
+            # Deleting first holds the row until the task's writes commit;
+            # nothing is deleted if the lease ran out and someone else has it
+            if not Task.objects.filter(pk=pk, lock_token=token).delete()[0]:
+                return False
+            func(**record.kwargs)
+        return True
+    except Exception:
+        record.last_error = traceback.format_exc()
+        logger.warning("Task %s failed (attempt %d of %d)", record, record.attempts, record.max_attempts,
+                       exc_info=True)
+        fail(record, token)
+        return False
+
+
+def fail(record, token):
+    if record.attempts >= record.max_attempts:
+        with transaction.atomic():
+            if Task.objects.filter(pk=record.pk, lock_token=token).delete()[0]:
+                DeadTask.objects.create(name=record.name, kwargs=record.kwargs, attempts=record.attempts,
+                                        last_error=record.last_error, created_at=record.created_at)
+        return
+    Task.objects.filter(pk=record.pk, lock_token=token).update(
+        locked_until=None, lock_token=None, last_error=record.last_error,
+        run_at=timezone.now() + retry_delay(record.attempts),
+    )
+
+
+def run_due(limit=100, now=None):
+    """Run up to ``limit`` due tasks, oldest first. Returns how many succeeded."""
+    pks = list(due(now).order_by('run_at', 'pk').values_list('pk', flat=True)[:limit])
+    return sum(run(pk, now) for pk in pks)
+
+
+def retry_dead():
+    """Queue every dead task again with a fresh set of attempts."""
+    with transaction.atomic():
+        dead = list(DeadTask.objects.all())
+        Task.objects.bulk_create([
+            Task(name=d.name, kwargs=d.kwargs, max_attempts=getattr(REGISTRY.get(d.name), 'max_attempts', 5))
+            for d in dead
+        ])
+        DeadTask.objects.filter(pk__in=[d.pk for d in dead]).delete()
+    return len(dead)
+
+
+# Tasks
+
+@task
+def add_paddy(quantity):
+    """New supplies: add their kilograms to the paddy inventory."""
+    # get_or_create() copes with two first-ever supplies racing to create
+    # row 1; update_inventory() then adds in the database, not in Python
+    paddy_inventory, _ = PaddyInventory.objects.get_or_create(id=1)
+    paddy_inventory.update_inventory(Decimal(quantity))
+
+
+@task
+def record_sale(order_id):
+    """A paid order: add its rice to the sold inventory."""
+    # Transaction.reserve_stock already took it out of the processed
+    # inventory, in the request, so a shortage is the customer's error there
+    total_kg_sold = Order.objects.values_list('total_kg', flat=True).get(pk=order_id)
+    sold_inventory, _ = SoldRiceInventory.objects.get_or_create(id=1)
+    SoldRiceInventory.objects.filter(pk=sold_inventory.pk).update(quantity=F('quantity') + total_kg_sold)
@@ -0,0 +1,15 @@
+import uuid
+
+from django import template
+from django.utils.html import format_html
+
+from core.idempotency import FIELD
+
+register = template.Library()
+
+
+# Hidden idempotency key for a form posting to an @idempotent view, like
+# {% csrf_token %}. A new key per render, so keep it out of {% cache %} blocks.
+@register.simple_tag
+def idempotency_field():
+    return format_html('<input type="hidden" name="{}" value="{}">', FIELD, uuid.uuid4())
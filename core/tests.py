@@ -1,3 +1,1200 @@
-from django.test import TestCase
+import json
+import marshal
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, router, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core import notifications, tasks
+from core.api import encode_cursor
+from core.backends import EmailOrUsernameModelBackend, _user_cache_key
+from core.context_processors import fragment_cache
+from core.fragments import PRICE, get_versions, profile_scope
+from core.middleware import ProfileMiddleware, ReplicaMiddleware
+from core.profiling import profiler
+from core.models import (
+    Admin, CustomUser, Customer, DeadTask, Delivery, DeliveryPersonnel, Farmer, IdempotencyKey, MillOperator, Notification,
+    Order, OrderItem, PackageSize, PaddyInventory, PaddyPrice, PaddySupply, ProcessedRiceInventory, Task, Transaction,
+)
+from core.routers import REPLICA
+
+# PBKDF2 would make every create_user() take a tenth of a second
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+def create_customer(email='customer@example.com', username='customer', password='secret-pass-1', **extra):
+    user = CustomUser.objects.create_user(email, username, password, role=CustomUser.Role.CUSTOMER, **extra)
+    return Customer.objects.create(user=user, delivery_address='Mill Road')
+
+
+def create_profile(role, name):
+    """A user with ``role`` and the matching profile."""
+    user = CustomUser.objects.create_user(f'{name}@example.com', name, 'secret-pass-1', role=role)
+    model, fields = {
+        CustomUser.Role.FARMER: (Farmer, {'bank_name': 'Equity', 'account_number': '001'}),
+        CustomUser.Role.CUSTOMER: (Customer, {'delivery_address': 'Mill Road'}),
+        CustomUser.Role.DELIVERY: (DeliveryPersonnel, {'vehicle_type': 'Motorbike', 'vehicle_number': 'KMEA 001A'}),
+        CustomUser.Role.MILL_OPERATOR: (MillOperator, {'shift': MillOperator.Shift.MORNING}),
+        CustomUser.Role.ADMIN: (Admin, {'admin_type': Admin.AdminType.STANDARD}),
+    }[role]
+    return model.objects.create(user=user, **fields)
+
+
+def create_order(customer, bags=1):
+    package = PackageSize.objects.get_or_create(
+        label='10kg Bag', defaults={'weight_kg': Decimal('10.00'), 'price_per_package': Decimal('900.00')},
+    )[0]
+    order = Order.objects.create(customer=customer)
+    OrderItem.objects.create(order=order, package_size=package, quantity=bags)
+    order.calculate_totals()
+    return order
+
+
+def in_threads(count, func):
+    """Run ``func()`` in ``count`` threads started together; returns what each returned or raised."""
+    barrier = threading.Barrier(count)
+
+    def run(_):
+        barrier.wait()
+        try:
+            with transaction.atomic():
+                return func()
+        except Exception as e:
+            return e
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(count) as pool:
+        return list(pool.map(run, range(count)))
+
+
+@tasks.task(max_attempts=2)
+def failing_task(message):
+    raise RuntimeError(message)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class LoginTests(TestCase):
+    """core.backends.EmailOrUsernameModelBackend"""
+
+    def setUp(self):
+        cache.clear()
+        self.customer = create_customer(email='Wanjiru@Example.com', username='Wanjiru')
+
+    def test_email_and_username_ignore_case(self):
+        for identifier in ('wanjiru@example.com', 'WANJIRU@EXAMPLE.COM', 'wanjiru', ' Wanjiru '):
+            with self.subTest(identifier=identifier):
+                self.assertEqual(authenticate(None, username=identifier, password='secret-pass-1'), self.customer.user)
+
+    def test_non_ascii_identifiers_log_in_as_stored(self):
+        user = create_customer(email='Élodie@example.com', username='Zoë').user
+        for identifier in ('Élodie@example.com', 'Élodie@EXAMPLE.com', 'Zoë', 'ZOë'):
+            with self.subTest(identifier=identifier):
+                self.assertEqual(authenticate(None, username=identifier, password='secret-pass-1'), user)
+
+    def test_usernames_with_an_at_sign_can_log_in(self):
+        user = create_customer(email='kamau@example.com', username='kamau@mill').user
+        self.assertEqual(authenticate(None, username='Kamau@Mill', password='secret-pass-1'), user)
+        # The email still wins when both could match
+        self.assertEqual(authenticate(None, username='kamau@example.com', password='secret-pass-1'), user)
+
+    def test_wrong_password_and_inactive_user_are_refused(self):
+        self.assertIsNone(authenticate(None, username='wanjiru', password='wrong'))
+        self.customer.user.is_active = False
+        self.customer.user.save()
+        self.assertIsNone(authenticate(None, username='wanjiru', password='secret-pass-1'))
+
+    def test_login_page_redirects_to_the_role_dashboard(self):
+        response = self.client.post(reverse('login'), {'username': 'WANJIRU@example.com', 'password': 'secret-pass-1'})
+        self.assertRedirects(response, reverse('customer_dashboard'), fetch_redirect_response=False)
+
+    def test_unknown_accounts_are_remembered_but_still_hashed(self):
+        self.assertIsNone(authenticate(None, username='nobody@example.com', password='x'))
+
+        with mock.patch.object(CustomUser, 'set_password') as set_password, self.assertNumQueries(0):
+            self.assertIsNone(authenticate(None, username='NOBODY@example.com', password='x'))
+        set_password.assert_called_once_with('x')
+
+    def test_new_account_can_log_in_after_a_remembered_miss(self):
+        self.assertIsNone(authenticate(None, username='late@example.com', password='secret-pass-1'))
+        user = create_customer(email='late@example.com', username='late').user
+        self.assertEqual(authenticate(None, username='late@example.com', password='secret-pass-1'), user)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ProfileTests(TestCase):
+    """CustomUser.get_profile and ProfileMiddleware's request.profile"""
+
+    def setUp(self):
+        cache.clear()
+
+    def profile_of(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        ProfileMiddleware(lambda request: None)(request)
+        return request.profile
+
+    def test_each_role_gets_its_own_profile(self):
+        for role in CustomUser.Role:
+            with self.subTest(role=role):
+                profile = create_profile(role, role.lower())
+                user = CustomUser.objects.get(pk=profile.user_id)
+                self.assertEqual(user.get_profile(), profile)
+                self.assertEqual(self.profile_of(user), profile)
+
+    def test_missing_profile_is_none(self):
+        user = CustomUser.objects.create_user('new@example.com', 'new', role=CustomUser.Role.FARMER)
+        self.assertIsNone(user.get_profile())
+        self.assertFalse(self.profile_of(user))
+        self.assertFalse(self.profile_of(AnonymousUser()))
+
+    def test_logged_in_user_comes_with_its_profile(self):
+        profile = create_profile(CustomUser.Role.DELIVERY, 'rider')
+        # As AuthenticationMiddleware loads it: the profile costs no query,
+        # once from the database and once from the user cache
+        for _ in range(2):
+            user = EmailOrUsernameModelBackend().get_user(str(profile.user_id))
+            with self.assertNumQueries(0):
+                self.assertEqual(self.profile_of(user).vehicle_number, 'KMEA 001A')
+
+    def test_profile_is_resolved_once_per_request(self):
+        profile = create_profile(CustomUser.Role.FARMER, 'farmer')
+        user = CustomUser.objects.get(pk=profile.user_id)
+        request_profile = self.profile_of(user)
+        with self.assertNumQueries(1):
+            self.assertEqual(request_profile.bank_name, 'Equity')
+            self.assertEqual(request_profile.account_number, '001')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class CachedUserTests(TestCase):
+    """The user cache of EmailOrUsernameModelBackend.get_user"""
+
+    def setUp(self):
+        cache.clear()
+        self.profile = create_profile(CustomUser.Role.DELIVERY, 'rider')
+        self.user = self.profile.user
+
+    def get_user(self):
+        return EmailOrUsernameModelBackend().get_user(str(self.user.pk))
+
+    def test_cached_user_carries_no_password_hash(self):
+        self.get_user()
+        cached = cache.get(_user_cache_key(self.user.pk))
+        self.assertIsNotNone(cached)
+        hash_ = self.user.password.split('$')[-1]
+        self.assertNotIn(hash_.encode(), pickle.dumps(cached))
+        # The session hash still checks out, and the password loads on demand
+        self.assertEqual(cached.get_session_auth_hash(), self.user.get_session_auth_hash())
+        self.assertTrue(cached.check_password('secret-pass-1'))
+
+    def is_cached(self):
+        return cache.get(_user_cache_key(self.user.pk)) is not None
+
+    def test_saving_the_user_evicts_it(self):
+        self.get_user()
+        self.user.first_name = 'Otieno'
+        self.user.save()
+
+        self.assertFalse(self.is_cached())
+        self.assertEqual(self.get_user().first_name, 'Otieno')
+
+    def test_saving_or_deleting_the_profile_evicts_the_user(self):
+        self.get_user()
+        self.profile.vehicle_number = 'KMEB 002B'
+        self.profile.save()
+
+        self.assertFalse(self.is_cached())
+        self.assertEqual(self.get_user().get_profile().vehicle_number, 'KMEB 002B')
+
+        self.profile.delete()
+        self.assertFalse(self.is_cached())
+        self.assertIsNone(self.get_user().get_profile())
+
+    def test_a_copy_cached_before_the_commit_is_evicted_after_it(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Otieno'
+            self.user.save()
+            # Another worker reading the row before this commits
+            cache.set(_user_cache_key(self.user.pk), CustomUser.objects.get(pk=self.user.pk))
+            self.assertTrue(self.is_cached())
+
+        self.assertFalse(self.is_cached())
+
+    def test_logging_out_evicts_the_user(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('delivery_dashboard'))
+        self.assertTrue(self.is_cached())
+
+        self.client.logout()
+
+        self.assertFalse(self.is_cached())
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ApiTests(TestCase):
+    """The read-only JSON API in core.api"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = create_customer()
+        cls.other_customer = create_customer(email='other@example.com', username='other')
+        cls.rider = create_profile(CustomUser.Role.DELIVERY, 'rider')
+        cls.orders = [create_order(cls.customer, bags=n) for n in range(1, 6)]
+        cls.other_order = create_order(cls.other_customer)
+        Order.objects.filter(pk__in=[cls.orders[0].pk, cls.other_order.pk]).update(delivery_personnel=cls.rider)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, user, name='api-orders', **params):
+        self.client.force_login(user)
+        return self.client.get(reverse(name), params)
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_each_role_only_sees_its_own_rows(self):
+        newest_first = [order.pk for order in reversed(self.orders)]
+        self.assertEqual(self.ids(self.get(self.customer.user)), newest_first)
+        self.assertEqual(self.ids(self.get(self.rider.user)), [self.other_order.pk, self.orders[0].pk])
+
+        farmer = create_profile(CustomUser.Role.FARMER, 'farmer')
+        self.assertEqual(self.get(farmer.user).status_code, 403)
+
+    def test_login_and_method_are_checked(self):
+        self.assertEqual(self.client.get(reverse('api-orders')).status_code, 401)
+        self.client.force_login(self.customer.user)
+        self.assertEqual(self.client.post(reverse('api-orders')).status_code, 405)
+
+    def test_cursor_pages_through_every_row_once(self):
+        # Same created_at for all of them: the id breaks the tie
+        Order.objects.filter(customer=self.customer).update(created_at=self.orders[0].created_at)
+        expected = sorted((order.pk for order in self.orders), reverse=True)
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            params = {'limit': 2, 'fields': 'id'}
+            if cursor:
+                params['cursor'] = cursor
+            page = self.get(self.customer.user, **params).json()
+            seen += [row['id'] for row in page['results']]
+            pages += 1
+            cursor = page['next']
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 3)
+
+    def test_new_rows_dont_shift_later_pages(self):
+        first = self.get(self.customer.user, limit=2).json()
+        create_order(self.customer)
+        second = self.get(self.customer.user, limit=2, cursor=first['next']).json()
+        self.assertEqual([row['id'] for row in second['results']], [self.orders[2].pk, self.orders[1].pk])
+
+    def test_fields_limit_the_columns(self):
+        response = self.get(self.customer.user, fields='id,status,items', limit=1)
+        row, = response.json()['results']
+        self.assertEqual(set(row), {'id', 'status', 'items'})
+        self.assertEqual(row['items'][0]['quantity'], 5)
+
+    def test_bad_parameters_are_400s(self):
+        # Well-formed cursors holding values the ordering columns can't take
+        cursors = [encode_cursor(values) for values in (['garbage', 1], ['2024-01-01', 'x'], [None, None], [{}, 2])]
+        for params in (
+            {'fields': 'id,password'}, {'cursor': 'not-a-cursor'}, {'limit': 'ten'},
+            *({'cursor': cursor} for cursor in cursors),
+        ):
+            with self.subTest(params=params):
+                response = self.get(self.customer.user, **params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, TASKS_EAGER=True)
+class SyncTests(TestCase):
+    """The tablets' batch upload in core.sync"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = create_profile(CustomUser.Role.MILL_OPERATOR, 'operator')
+        cls.farmer = create_profile(CustomUser.Role.FARMER, 'farmer')
+        PaddyPrice.objects.create(price_per_kg=Decimal('40.00'))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.operator.user)
+
+    def record(self, **fields):
+        return {
+            'key': str(uuid.uuid4()), 'farmer': str(self.farmer.pk), 'quantity': '120.50',
+            'quality_rating': 4, 'moisture_content': '13.20', **fields,
+        }
+
+    def sync(self, *records):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('api-supplies-sync'), json.dumps({'supplies': list(records)}),
+                content_type='application/json',
+            )
+
+    def statuses(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [result['status'] for result in response.json()['results']]
+
+    def test_uploading_a_batch_again_creates_nothing(self):
+        batch = [self.record(), self.record(quantity='80')]
+        first = self.sync(*batch)
+        self.assertEqual(self.statuses(first), ['created', 'created'])
+        self.assertEqual(first.json()['created'], 2)
+        supply = PaddySupply.objects.get(idempotency_key=batch[0]['key'])
+        self.assertEqual(supply.total_amount, Decimal('4820.00'))
+        self.assertEqual(supply.mill_operator, self.operator.user)
+
+        again = self.sync(*batch, self.record())
+        self.assertEqual(self.statuses(again), ['duplicate', 'duplicate', 'created'])
+        self.assertEqual(again.json()['created'], 1)
+        # A duplicate points at the supply recorded the first time
+        self.assertEqual([r['id'] for r in again.json()['results'][:2]], [r['id'] for r in first.json()['results']])
+        self.assertEqual(PaddySupply.objects.count(), 3)
+
+    def test_a_key_sent_twice_in_one_batch_is_recorded_once(self):
+        record = self.record()
+        response = self.sync(record, record)
+        self.assertEqual(self.statuses(response), ['created', 'duplicate'])
+        first, second = response.json()['results']
+        self.assertEqual(first['id'], second['id'])
+        self.assertEqual(PaddySupply.objects.count(), 1)
+
+    def test_only_created_supplies_are_added_to_the_inventory(self):
+        record = self.record(quantity='100')
+        self.sync(record)
+        self.sync(record, self.record(quantity='50'))
+        self.assertEqual(PaddyInventory.objects.get().quantity, Decimal('150.00'))
+
+    def test_invalid_records_dont_stop_the_batch(self):
+        response = self.sync(
+            self.record(quantity='-1'), self.record(farmer=str(uuid.uuid4())), 'not a record', self.record(),
+        )
+        self.assertEqual(self.statuses(response), ['invalid', 'invalid', 'invalid', 'created'])
+        results = response.json()['results']
+        self.assertIn('quantity', results[0]['errors'])
+        self.assertEqual(results[1]['errors']['farmer'][0]['code'], 'invalid_choice')
+        self.assertEqual(PaddySupply.objects.count(), 1)
+
+    def test_only_mill_operators_can_sync(self):
+        self.client.force_login(self.farmer.user)
+        self.assertEqual(self.sync(self.record()).status_code, 403)
+        self.assertFalse(PaddySupply.objects.exists())
+
+    def test_no_price_is_a_conflict(self):
+        PaddyPrice.objects.all().delete()
+        response = self.sync(self.record())
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(PaddySupply.objects.exists())
+
+    def test_bad_bodies_are_400s(self):
+        url = reverse('api-supplies-sync')
+        for body in ('not json', json.dumps({'supply': []}), json.dumps({'supplies': [{}] * 501})):
+            with self.subTest(body=body[:20]):
+                response = self.client.post(url, body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class IdempotencyTests(TestCase):
+    """@idempotent on the views that create orders and transactions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = create_customer()
+        cls.package = PackageSize.objects.create(
+            label='10kg Bag', weight_kg=Decimal('10.00'), price_per_package=Decimal('900.00'),
+        )
+        ProcessedRiceInventory.objects.create(quantity=Decimal('100.00'))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.customer.user)
+
+    def place_order(self, key=None):
+        data = {f'package_{self.package.pk}': 2}
+        if key:
+            data['idempotency_key'] = key
+        return self.client.post(reverse('place_order'), data)
+
+    def test_a_retried_order_is_placed_once(self):
+        first = self.place_order('order-key')
+        second = self.place_order('order-key')
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', first)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_a_retried_payment_redirects_again(self):
+        order = create_order(self.customer)
+        url = reverse('enter_transaction_code', args=[order.pk])
+        data = {'transaction_code_customer': 'QK12AB34CD'}
+        first = self.client.post(url, data, headers={'Idempotency-Key': 'pay-key'})
+        second = self.client.post(url, data, headers={'Idempotency-Key': 'pay-key'})
+        self.assertRedirects(first, reverse('order_details', args=[order.pk]), fetch_redirect_response=False)
+        self.assertEqual(second.status_code, 302)
+        self.assertEqual(second['Location'], first['Location'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Transaction.objects.filter(order=order).count(), 1)
+        self.assertEqual(ProcessedRiceInventory.objects.get().quantity, Decimal('90.00'))
+
+    def test_an_api_call_with_a_key_still_running_is_a_conflict_straight_away(self):
+        IdempotencyKey.objects.create(user=self.customer.user, key='running', path=reverse('place_order'))
+        with mock.patch('core.idempotency.time.sleep') as sleep:
+            response = self.client.post(
+                reverse('place_order'), {f'package_{self.package.pk}': 2}, headers={'Idempotency-Key': 'running'},
+            )
+        sleep.assert_not_called()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertIn('error', response.json())
+        self.assertFalse(Order.objects.exists())
+
+    def test_a_double_tapped_form_gets_the_first_response_once_it_is_ready(self):
+        record = IdempotencyKey.objects.create(user=self.customer.user, key='tap', path=reverse('place_order'))
+
+        def first_request_finishes(seconds):
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status_code=200, content_type='text/html; charset=utf-8', body=b'<p>Order placed</p>',
+            )
+
+        with mock.patch('core.idempotency.time.sleep', side_effect=first_request_finishes):
+            response = self.place_order('tap')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(response.content, b'<p>Order placed</p>')
+        self.assertFalse(Order.objects.exists())
+
+    @mock.patch('core.idempotency.FORM_WAIT_SECONDS', 0)
+    def test_a_double_tapped_form_still_running_gets_a_page(self):
+        IdempotencyKey.objects.create(user=self.customer.user, key='slow', path=reverse('place_order'))
+        response = self.place_order('slow')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertTemplateUsed(response, 'core/all/request_in_progress.html')
+        self.assertFalse(Order.objects.exists())
+
+    def test_a_double_tap_runs_the_view_if_the_first_request_failed(self):
+        record = IdempotencyKey.objects.create(user=self.customer.user, key='failed', path=reverse('place_order'))
+        with mock.patch('core.idempotency.time.sleep', side_effect=lambda seconds: record.delete()):
+            response = self.place_order('failed')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_a_key_reused_for_another_path_is_rejected(self):
+        self.place_order('reused')
+        order = create_order(self.customer)
+        response = self.client.post(
+            reverse('enter_transaction_code', args=[order.pk]), {'transaction_code_customer': 'QK12AB34CD'},
+            headers={'Idempotency-Key': 'reused'},
+        )
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_keys_are_per_user(self):
+        self.place_order('shared')
+        self.client.force_login(create_customer(email='other@example.com', username='other').user)
+        response = self.place_order('shared')
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_posts_without_a_key_run_every_time(self):
+        self.place_order()
+        self.place_order()
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ProfilerTests(TestCase):
+    """The request mode of core.profiling"""
+
+    def tearDown(self):
+        profiler.stop()
+
+    def test_the_next_requests_are_profiled_with_cprofile(self):
+        customer = create_customer()
+        self.client.force_login(customer.user)
+        profiler.start('requests', seconds=10, url_name='order_list', requests=2)
+        self.client.get(reverse('customer_dashboard'))
+        for _ in range(3):
+            self.client.get(reverse('order_list'))
+        profiler._thread.join(timeout=5)
+
+        status = profiler.status()
+        self.assertFalse(status['running'])
+        self.assertEqual(status['samples'], 2)
+        stats = marshal.loads(profiler.pstats_result)
+        functions = {name for _, _, name in stats}
+        self.assertIn('order_list', functions)
+        self.assertNotIn('customer_dashboard', functions)
+
+        # The collapsed stacks are rebuilt from the same stats: every line is
+        # rooted at the URL name, and the view is on the way to its callees
+        lines = profiler.result.splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(all(line.startswith('order_list;') for line in lines))
+        self.assertTrue(any(';order_list (core/views.py:' in line and ';render (' in line for line in lines))
+        # ...and share out the profiled time, no more (template rendering recurses)
+        profiled = sum(total for _, _, _, total, callers in stats.values() if not callers) * 1e6
+        self.assertAlmostEqual(sum(int(line.rsplit(' ', 1)[1]) for line in lines), profiled, delta=len(lines))
+
+        self.client.force_login(create_profile(CustomUser.Role.ADMIN, 'admin').user)
+        response = self.client.get(reverse('profiler_download'))
+        self.assertTrue(response['Content-Disposition'].endswith('.collapsed"'))
+        self.assertEqual(response.content.decode(), profiler.result)
+        response = self.client.get(reverse('profiler_download'), {'format': 'pstats'})
+        self.assertTrue(response['Content-Disposition'].endswith('.prof"'))
+        self.assertEqual(response.content, profiler.pstats_result)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, DATABASE_ROUTERS=['core.routers.ReplicaRouter'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    core.routers with two SQLite databases: the primary is the test
+    database, the replica a file that "replicates" only when the test copies
+    the primary into it, so which one a page was read from shows in its data.
+    """
+    @classmethod
+    def setUpClass(cls):
+        # The alias only exists while these tests run (the test runner would
+        # otherwise try to create and check it), so it's added here
+        cls.tmpdir = tempfile.mkdtemp()
+        connections.settings[REPLICA] = {
+            **connections['default'].settings_dict, 'NAME': os.path.join(cls.tmpdir, 'replica.sqlite3'),
+        }
+        cls.databases = {'default', REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        shutil.rmtree(cls.tmpdir)
+
+    def setUp(self):
+        # Every test starts with an empty replica
+        connections[REPLICA].close()
+        if os.path.exists(connections[REPLICA].settings_dict['NAME']):
+            os.remove(connections[REPLICA].settings_dict['NAME'])
+
+        ProcessedRiceInventory.objects.create(quantity=Decimal('100.00'))
+        self.customer = create_customer()
+        self.order = create_order(self.customer)
+        self.client.force_login(self.customer.user)
+
+    def replicate(self):
+        for alias in ('default', REPLICA):
+            connections[alias].ensure_connection()
+        connections['default'].connection.backup(connections[REPLICA].connection)
+
+    def listed_status(self):
+        response = self.client.get(reverse('order_list'))
+        self.assertEqual(response.status_code, 200)
+        return [order.status for order in response.context['orders']]
+
+    def test_read_only_views_read_from_the_replica(self):
+        self.replicate()
+        Order.objects.filter(pk=self.order.pk).update(status='cancelled')  # not replicated yet
+
+        with CaptureQueriesContext(connections[REPLICA]) as replica_queries:
+            self.assertEqual(self.listed_status(), ['pending'])
+        self.assertTrue(replica_queries.captured_queries)
+
+    def test_writes_go_to_the_primary_and_stick_to_it(self):
+        self.replicate()
+        response = self.client.post(
+            reverse('enter_transaction_code', args=[self.order.pk]), {'transaction_code_customer': 'QX1'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Order.objects.using('default').get(pk=self.order.pk).status, 'paid')
+        self.assertEqual(Order.objects.using(REPLICA).get(pk=self.order.pk).status, 'pending')
+
+        # Within REPLICA_STICKINESS_SECONDS the writer reads its own change
+        self.assertIn(ReplicaMiddleware.cookie_name, response.cookies)
+        with CaptureQueriesContext(connections[REPLICA]) as replica_queries:
+            self.assertEqual(self.listed_status(), ['paid'])
+        self.assertEqual(replica_queries.captured_queries, [])
+
+        # Once the cookie has expired it is back on the lagging replica
+        del self.client.cookies[ReplicaMiddleware.cookie_name]
+        self.assertEqual(self.listed_status(), ['pending'])
+
+    def test_migrations_skip_the_replica(self):
+        self.assertFalse(router.allow_migrate_model(REPLICA, Order))
+        self.assertTrue(router.allow_migrate_model('default', Order))
+
+        call_command('migrate', database=REPLICA, verbosity=0)
+        self.assertNotIn(Order._meta.db_table, connections[REPLICA].introspection.table_names())
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class InventoryConcurrencyTests(TransactionTestCase):
+    """
+    The inventories add and subtract in the database (F() expressions and
+    conditional UPDATEs), so writers working from stale copies neither lose
+    each other's updates nor take the stock below zero. Transaction test
+    cases, so the threaded ones really commit; those need a test database
+    more than one connection can use (PostgreSQL, not in-memory SQLite).
+    """
+
+    def test_stale_copies_dont_lose_additions(self):
+        PaddyInventory.objects.create(id=1, quantity=Decimal('100.00'))
+        first, second = PaddyInventory.objects.get(id=1), PaddyInventory.objects.get(id=1)
+
+        first.update_inventory(Decimal('30.00'))
+        second.update_inventory(Decimal('20.00'))
+
+        self.assertEqual(PaddyInventory.objects.get(id=1).quantity, Decimal('150.00'))
+        self.assertEqual(second.quantity, Decimal('150.00'))
+
+    def test_stale_copies_cant_take_stock_below_zero(self):
+        for model in (PaddyInventory, ProcessedRiceInventory):
+            with self.subTest(model=model.__name__):
+                model.objects.create(id=1, quantity=Decimal('30.00'))
+                first, second = model.objects.get(id=1), model.objects.get(id=1)
+
+                first.reduce_inventory(Decimal('20.00'))
+                with self.assertRaises(ValueError):
+                    second.reduce_inventory(Decimal('20.00'))
+
+                self.assertEqual(model.objects.get(id=1).quantity, Decimal('10.00'))
+
+    def test_sale_without_stock_leaves_the_order_unpaid(self):
+        ProcessedRiceInventory.objects.create(id=1, quantity=Decimal('5.00'))
+        order = create_order(create_customer())
+
+        with self.assertRaises(ValueError):
+            Transaction.objects.create(order=order, transaction_code_customer='QX1')
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'pending')
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(ProcessedRiceInventory.objects.get(id=1).quantity, Decimal('5.00'))
+
+    @skipUnlessDBFeature('test_db_allows_multiple_connections')
+    def test_concurrent_additions_all_count(self):
+        PaddyInventory.objects.create(id=1)
+
+        results = in_threads(8, lambda: PaddyInventory.objects.get(id=1).update_inventory(Decimal('12.50')))
+
+        self.assertEqual([r for r in results if isinstance(r, Exception)], [])
+        self.assertEqual(PaddyInventory.objects.get(id=1).quantity, Decimal('100.00'))
+
+    @skipUnlessDBFeature('test_db_allows_multiple_connections')
+    def test_concurrent_reductions_never_oversell(self):
+        ProcessedRiceInventory.objects.create(id=1, quantity=Decimal('100.00'))
+
+        results = in_threads(8, lambda: ProcessedRiceInventory.objects.get(id=1).reduce_inventory(Decimal('30.00')))
+
+        refused = [r for r in results if isinstance(r, Exception)]
+        self.assertEqual(len(refused), 5)
+        self.assertTrue(all(isinstance(r, ValueError) for r in refused))
+        self.assertEqual(ProcessedRiceInventory.objects.get(id=1).quantity, Decimal('10.00'))
+
+
+@override_settings(
+    PASSWORD_HASHERS=FAST_HASHERS, TASKS_EAGER=True, QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_ACTION='raise',
+)
+class QueryBudgetTests(TransactionTestCase):
+    """
+    The hot views within their @query_budget, with the on_commit tasks running
+    as they do in development (TestCase never fires them) and on an empty
+    database, where the first write also creates the inventory rows.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.customer = create_customer()
+        self.rider = create_profile(CustomUser.Role.DELIVERY, 'rider')
+        self.operator = create_profile(CustomUser.Role.MILL_OPERATOR, 'operator')
+        self.farmers = [create_profile(CustomUser.Role.FARMER, f'farmer{n}') for n in range(8)]
+        PaddyPrice.objects.create(price_per_kg=Decimal('40.00'))
+
+    def assertStatus(self, response, status):
+        # QueryBudgetExceeded propagates out of the test client
+        self.assertEqual(response.status_code, status)
+
+    def test_order_pages(self):
+        order = create_order(self.customer)
+        for label, weight in (('25kg Bag', '25.00'), ('50kg Bag', '50.00')):
+            package = PackageSize.objects.create(label=label, weight_kg=Decimal(weight), price_per_package=Decimal('2000'))
+            OrderItem.objects.create(order=order, package_size=package, quantity=1)
+        Order.objects.filter(pk=order.pk).update(delivery_personnel=self.rider)
+        ProcessedRiceInventory.objects.create(quantity=Decimal('500.00'))
+        Transaction.objects.create(order=order, transaction_code_customer='QX1')
+        Delivery.objects.create(order=order, delivery_personnel=self.rider, delivery_address='Mill Road')
+
+        self.client.force_login(self.customer.user)
+        self.assertStatus(self.client.get(reverse('order_details', args=[order.pk])), 200)
+        self.assertStatus(self.client.get(reverse('order_list')), 200)
+        self.assertStatus(self.client.get(reverse('track_delivery', args=[order.pk])), 200)
+        self.client.force_login(create_profile(CustomUser.Role.ADMIN, 'admin').user)
+        self.assertStatus(self.client.get(reverse('admin_order_detail_ajax', args=[order.pk])), 200)
+
+    def test_ordering_and_paying(self):
+        ProcessedRiceInventory.objects.create(quantity=Decimal('500.00'))
+        self.client.force_login(self.customer.user)
+        for n in range(2):
+            order = create_order(self.customer)
+            self.assertStatus(self.client.post(
+                reverse('enter_transaction_code', args=[order.pk]), {'transaction_code_customer': f'QX{n}'},
+            ), 302)
+            package = order.items.get().package_size
+            self.assertStatus(self.client.post(reverse('place_order'), {f'package_{package.pk}': 1}), 200)
+
+    def test_recording_and_milling(self):
+        self.client.force_login(self.operator.user)
+        self.assertStatus(self.client.get(reverse('record_supply')), 200)
+        for _ in range(2):
+            self.assertStatus(self.client.post(reverse('record_supply'), {
+                'farmer': self.farmers[0].pk, 'quantity': '100.00', 'quality_rating': 4, 'moisture_content': '13.00',
+            }), 302)
+            self.assertStatus(self.client.post(reverse('process_rice'), {'quantity': '10.00'}), 200)
+
+
+class CompactUUIDMigrationTests(TransactionTestCase):
+    """0004_compact_uuid_storage rewrites every UUID key and foreign key in place"""
+
+    before = ('core', '0003_production_query_indexes')
+    after = ('core', '0004_compact_uuid_storage')
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.latest = self.executor.loader.graph.leaf_nodes()
+
+    def tearDown(self):
+        self.migrate(*self.latest)
+
+    def migrate(self, *targets):
+        self.executor.loader.build_graph()
+        self.executor.migrate(list(targets))
+        # The state of every app, with core at the target
+        others = [node for node in self.executor.loader.graph.leaf_nodes() if node[0] != 'core']
+        core = [node for node in targets if node[0] == 'core']
+        return self.executor.loader.project_state(others + core).apps
+
+    def storage(self, table, column='id'):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT DISTINCT typeof("{column}") FROM "{table}"')
+            return {row[0] for row in cursor.fetchall()}
+
+    def test_rows_and_their_references_survive_the_round_trip(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model('core', 'CustomUser')
+        farmer_user = User.objects.create(email='farmer@example.com', username='farmer', role='FARMER')
+        operator = User.objects.create(email='operator@example.com', username='operator', role='MILL_OPERATOR')
+        customer_user = User.objects.create(email='customer@example.com', username='customer', role='CUSTOMER')
+        farmer = apps.get_model('core', 'Farmer').objects.create(user=farmer_user, bank_name='Equity', account_number='1')
+        supply = apps.get_model('core', 'PaddySupply').objects.create(
+            farmer=farmer, mill_operator=operator, payment_approved_by=operator,
+            quantity=Decimal('120.00'), quality_rating=4, moisture_content=Decimal('13.00'),
+        )
+        customer = apps.get_model('core', 'Customer').objects.create(user=customer_user, delivery_address='Mill Road')
+        order = apps.get_model('core', 'Order').objects.create(customer=customer)
+        log = apps.get_model('admin', 'LogEntry').objects.create(user=operator, action_flag=1, object_repr='supply')
+        ids = {'farmer_user': farmer_user.pk, 'operator': operator.pk, 'farmer': farmer.pk, 'supply': supply.pk,
+               'customer': customer.pk}
+
+        def check(apps):
+            supply = apps.get_model('core', 'PaddySupply').objects.select_related(
+                'farmer__user', 'mill_operator', 'payment_approved_by',
+            ).get(pk=ids['supply'])
+            self.assertEqual(supply.farmer.pk, ids['farmer'])
+            self.assertEqual(supply.farmer.user.email, 'farmer@example.com')
+            self.assertEqual(supply.mill_operator.pk, ids['operator'])
+            self.assertEqual(supply.payment_approved_by.username, 'operator')
+            order_ = apps.get_model('core', 'Order').objects.select_related('customer__user').get(pk=order.pk)
+            self.assertEqual((order_.customer.pk, order_.customer.user.username), (ids['customer'], 'customer'))
+            self.assertEqual(apps.get_model('admin', 'LogEntry').objects.get(pk=log.pk).user.pk, ids['operator'])
+            if connection.vendor == 'sqlite':
+                # Nothing left pointing nowhere
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA foreign_key_check')
+                    self.assertEqual(cursor.fetchall(), [])
+
+        apps = self.migrate(self.after)
+        check(apps)
+        if connection.vendor == 'sqlite':
+            for table, column in (('core_customuser', 'id'), ('core_paddysupply', 'farmer_id'),
+                                  ('core_paddysupply', 'mill_operator_id'), ('django_admin_log', 'user_id')):
+                self.assertEqual(self.storage(table, column), {'blob'}, (table, column))
+
+        apps = self.migrate(self.before)
+        check(apps)
+        if connection.vendor == 'sqlite':
+            self.assertEqual(self.storage('core_customuser'), {'text'})
+            self.assertEqual(self.storage('core_paddysupply', 'farmer_id'), {'text'})
+
+
+@override_settings(TASKS_EAGER=False, TASK_RETRY_DELAY=10)
+class TaskQueueTests(TestCase):
+    """Tasks run once, back off when they fail and end up in DeadTask"""
+
+    def later(self, **delta):
+        return timezone.now() + timedelta(**delta)
+
+    def test_a_task_that_succeeds_is_deleted(self):
+        record = tasks.enqueue(tasks.add_paddy, quantity='100.00')
+
+        self.assertTrue(tasks.run(record.pk))
+
+        self.assertFalse(Task.objects.exists())
+        self.assertEqual(PaddyInventory.objects.get(id=1).quantity, Decimal('100.00'))
+
+    def test_a_failing_task_is_retried_with_backoff(self):
+        record = tasks.enqueue(failing_task, message='no network')
+
+        with self.assertLogs('core.tasks', 'WARNING'):
+            self.assertFalse(tasks.run(record.pk))
+
+        record.refresh_from_db()
+        self.assertEqual(record.attempts, 1)
+        self.assertIsNone(record.locked_until)
+        self.assertIn('RuntimeError: no network', record.last_error)
+        self.assertAlmostEqual(record.run_at, self.later(seconds=10), delta=timedelta(seconds=2))
+        # Not due again before then
+        self.assertEqual(tasks.run_due(), 0)
+        self.assertEqual(Task.objects.get().attempts, 1)
+
+    def test_the_delay_doubles_up_to_an_hour(self):
+        self.assertEqual([tasks.retry_delay(n).total_seconds() for n in (1, 2, 3)], [10, 20, 40])
+        self.assertEqual(tasks.retry_delay(20), tasks.MAX_RETRY_DELAY)
+
+    def test_a_task_whose_lease_ran_out_is_taken_by_another_worker(self):
+        record = tasks.enqueue(tasks.add_paddy, quantity='100.00')
+        stale_token = tasks.claim(record.pk)
+
+        # Held while the first worker's lease lasts
+        self.assertFalse(tasks.run(record.pk))
+        self.assertTrue(tasks.run(record.pk, now=self.later(minutes=6)))
+
+        self.assertEqual(PaddyInventory.objects.get(id=1).quantity, Decimal('100.00'))
+        # The first worker reporting back late changes nothing
+        tasks.fail(record, stale_token)
+        self.assertFalse(Task.objects.exists())
+        self.assertFalse(DeadTask.objects.exists())
+
+    def test_a_task_failing_max_attempts_times_is_dead(self):
+        record = tasks.enqueue(failing_task, message='no network')
+
+        with self.assertLogs('core.tasks', 'WARNING') as logs:
+            tasks.run(record.pk)
+            self.assertFalse(tasks.run(record.pk, now=self.later(seconds=11)))
+
+        self.assertIn('attempt 2 of 2', logs.output[-1])
+
+        self.assertFalse(Task.objects.exists())
+        dead = DeadTask.objects.get()
+        self.assertEqual((dead.name, dead.kwargs, dead.attempts), (failing_task.task_name, {'message': 'no network'}, 2))
+        self.assertIn('RuntimeError: no network', dead.last_error)
+
+    def test_retry_dead_queues_dead_tasks_with_fresh_attempts(self):
+        DeadTask.objects.create(name=tasks.add_paddy.task_name, kwargs={'quantity': '100.00'}, attempts=5,
+                                last_error='Traceback', created_at=timezone.now())
+        out = StringIO()
+
+        call_command('runworker', '--retry-dead', stdout=out)
+
+        self.assertIn('Queued 1 dead task(s) again.', out.getvalue())
+        self.assertFalse(DeadTask.objects.exists())
+        record = Task.objects.get()
+        self.assertEqual((record.name, record.kwargs, record.attempts), (tasks.add_paddy.task_name, {'quantity': '100.00'}, 0))
+
+        call_command('runworker', '--once', stdout=out)
+
+        self.assertIn('Ran 1 task(s).', out.getvalue())
+        self.assertFalse(Task.objects.exists())
+        self.assertEqual(PaddyInventory.objects.get(id=1).quantity, Decimal('100.00'))
+
+
+class FakeProvider:
+    """Records what it was asked to send and fails the messages to ``failing`` addresses."""
+
+    def __init__(self, failing=(), before_returning=None):
+        self.failing = failing
+        self.before_returning = before_returning
+        self.sent = []
+
+    def send_messages(self, batch):
+        self.sent += [n.pk for n in batch]
+        if self.before_returning:
+            self.before_returning()
+        return {n.pk: 'bounced' for n in batch if n.address in self.failing}
+
+
+@override_settings(
+    PASSWORD_HASHERS=FAST_HASHERS, TASKS_EAGER=False, NOTIFICATION_RETRY_DELAY=30, NOTIFICATION_MAX_ATTEMPTS=3,
+)
+class NotificationTests(TestCase):
+    """State changes write outbox rows in their own transaction; the dispatcher sends, retries and gives up"""
+
+    def setUp(self):
+        self.customer = create_customer(phone_number='0712000001')
+        self.rider = create_profile(CustomUser.Role.DELIVERY, 'rider')
+        self.order = create_order(self.customer)
+        Order.objects.filter(pk=self.order.pk).update(status='paid')
+        self.order.refresh_from_db()
+
+    def later(self, **delta):
+        return timezone.now() + timedelta(**delta)
+
+    def outbox(self):
+        return list(Notification.objects.order_by('pk').values_list('event', 'channel', 'address'))
+
+    def queue(self, *addresses):
+        return [Notification.objects.create(user=self.customer.user, event='test', channel='email', address=address,
+                                            body='Hello') for address in addresses]
+
+    def test_approving_a_payment_notifies_the_farmer(self):
+        farmer = create_profile(CustomUser.Role.FARMER, 'farmer')
+        operator = create_profile(CustomUser.Role.MILL_OPERATOR, 'operator')
+        PaddyPrice.objects.create(price_per_kg=Decimal('40.00'))
+        supply = PaddySupply.objects.create(farmer=farmer, mill_operator=operator.user, quantity=Decimal('100.00'),
+                                            quality_rating=4, moisture_content=Decimal('13.00'))
+        self.client.force_login(create_profile(CustomUser.Role.ADMIN, 'admin').user)
+
+        self.client.post(reverse('approve_payment', args=[supply.pk]), {'payment_reference_code': 'REF1'})
+
+        self.assertEqual(self.outbox(), [('supply_payment_approved', 'email', 'farmer@example.com')])
+        self.assertIn('REF1', Notification.objects.get().body)
+
+    def test_assigning_and_delivering_notify_the_customer_and_rider(self):
+        self.client.force_login(create_profile(CustomUser.Role.ADMIN, 'admin').user)
+        self.client.post(reverse('assign_delivery'), {'order': self.order.pk, 'delivery_personnel': self.rider.pk})
+
+        self.assertEqual(self.outbox(), [
+            ('delivery_assigned', 'sms', '0712000001'), ('delivery_assigned', 'email', 'rider@example.com'),
+        ])
+
+        self.client.force_login(self.rider.user)
+        self.client.post(reverse('update_delivery_status', args=[self.order.pk]))
+
+        self.assertEqual(self.outbox()[-1], ('order_delivered', 'sms', '0712000001'))
+
+    def test_notifications_commit_or_roll_back_with_their_change(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.order.mark_as_delivered()
+            raise RuntimeError("The request failed after the change")
+        self.assertEqual(self.outbox(), [])
+
+        # And the change doesn't happen without its notification
+        with mock.patch('core.notifications.notify', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            Order.objects.get(pk=self.order.pk).mark_as_delivered()
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'paid')
+
+    def test_failed_messages_are_retried_with_backoff(self):
+        ok, bounced = self.queue('ok@example.com', 'bounced@example.com')
+        provider = FakeProvider(failing={'bounced@example.com'})
+
+        self.assertEqual(notifications.dispatch(channel_providers={'email': provider}), (1, 1))
+
+        ok.refresh_from_db()
+        bounced.refresh_from_db()
+        self.assertIsNotNone(ok.sent_at)
+        self.assertIsNone(bounced.sent_at)
+        self.assertEqual((bounced.attempts, bounced.last_error, bounced.lock_token), (1, 'bounced', None))
+        self.assertAlmostEqual(bounced.next_attempt_at, self.later(seconds=30), delta=timedelta(seconds=2))
+        # Not due again before then, and then sent again
+        self.assertEqual(notifications.dispatch(channel_providers={'email': provider}), (0, 0))
+        self.assertEqual(notifications.dispatch(now=self.later(seconds=31), channel_providers={'email': provider}),
+                         (0, 1))
+        self.assertEqual(provider.sent, [ok.pk, bounced.pk, bounced.pk])
+        self.assertEqual(notifications.retry_delay(2), timedelta(seconds=60))
+
+    def test_a_provider_that_raises_fails_its_whole_batch(self):
+        self.queue('a@example.com', 'b@example.com')
+        provider = mock.Mock(**{'send_messages.side_effect': ConnectionError("gateway down")})
+
+        with self.assertLogs('core.notifications', 'WARNING'):
+            self.assertEqual(notifications.dispatch(channel_providers={'email': provider}), (0, 2))
+
+        self.assertFalse(Notification.objects.filter(sent_at__isnull=False).exists())
+        self.assertEqual(set(Notification.objects.values_list('last_error', flat=True)),
+                         {"ConnectionError('gateway down')"})
+
+    def test_messages_are_given_up_after_max_attempts(self):
+        self.queue('bounced@example.com')
+        provider = FakeProvider(failing={'bounced@example.com'})
+
+        for hours in range(5):
+            notifications.dispatch(now=self.later(hours=hours), channel_providers={'email': provider})
+
+        self.assertEqual(len(provider.sent), 3)
+        self.assertEqual(Notification.objects.get().attempts, 3)
+        self.assertFalse(notifications.pending(self.later(hours=6)).exists())
+
+    def test_a_dispatcher_whose_lease_ran_out_leaves_the_rows_alone(self):
+        message, = self.queue('slow@example.com')
+        taken = []
+        # Another dispatcher claims the row while this one is still sending it
+        provider = FakeProvider(before_returning=lambda: taken.extend(notifications.claim(10, self.later(minutes=6))))
+
+        self.assertEqual(notifications.dispatch(channel_providers={'email': provider}), (1, 0))
+
+        message.refresh_from_db()
+        self.assertEqual([n.pk for n in taken], [message.pk])
+        self.assertIsNone(message.sent_at)
+        self.assertEqual(message.lock_token, taken[0].lock_token)
+
+    def test_sendnotifications_sends_what_is_due(self):
+        self.queue('a@example.com', 'b@example.com')
+        path = os.path.join(tempfile.mkdtemp(), 'notifications.jsonl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        out = StringIO()
+
+        with self.settings(NOTIFICATION_FILE=path, NOTIFICATION_PROVIDERS={
+            'sms': 'core.notifications.FileProvider', 'email': 'core.notifications.FileProvider',
+        }):
+            call_command('sendnotifications', '--once', stdout=out)
+
+        self.assertIn('Sent 2 notification(s), 0 failed.', out.getvalue())
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual([json.loads(line)['to'] for line in f], ['a@example.com', 'b@example.com'])
+        self.assertFalse(notifications.pending().exists())
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, TASKS_EAGER=False)
+class ConditionalPageTests(TestCase):
+    """Order pages answer a revalidation with a 304 until the order or what shows with it changes"""
+
+    def setUp(self):
+        cache.clear()
+        self.customer = create_customer()
+        self.order = create_order(self.customer)
+        self.url = reverse('order_details', args=[self.order.pk])
+        self.client.force_login(self.customer.user)
+
+    def revalidate(self, etag, url=None):
+        return self.client.get(url or self.url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_an_unchanged_order_is_not_modified(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('no-cache', first['Cache-Control'])
+
+        response = self.revalidate(first['ETag'])
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.revalidate(self.client.get(reverse('order_list'))['ETag'],
+                                         reverse('order_list')).status_code, 304)
+
+    def test_a_delivery_change_gives_the_page_a_new_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        rider = create_profile(CustomUser.Role.DELIVERY, 'rider')
+
+        Delivery.objects.create(order=self.order, delivery_personnel=rider, delivery_address='Mill Road')
+
+        response = self.revalidate(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.revalidate(response['ETag']).status_code, 304)
+
+    def test_no_304_while_messages_are_queued(self):
+        etag = self.client.get(self.url)['ETag']
+        # Customers aren't riders: queues an error message and redirects
+        self.client.get(reverse('update_delivery_status', args=[self.order.pk]))
+
+        response = self.revalidate(etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.get('ETag'), etag)
+
+    def test_each_user_gets_their_own_etag(self):
+        url = reverse('admin_order_detail_ajax', args=[self.order.pk])
+        self.client.force_login(create_profile(CustomUser.Role.ADMIN, 'admin').user)
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(create_profile(CustomUser.Role.ADMIN, 'other-admin').user)
+
+        response = self.revalidate(etag, url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, TASKS_EAGER=False)
+class FragmentVersionTests(TestCase):
+    """Saving what a cached fragment shows moves its version on, once the change commits"""
+
+    def setUp(self):
+        cache.clear()
+        self.customer = create_customer()
+        self.riders = [create_profile(CustomUser.Role.DELIVERY, f'rider{n}') for n in range(2)]
+        self.farmer = create_profile(CustomUser.Role.FARMER, 'farmer')
+        self.order = create_order(self.customer)
+
+    def versions(self):
+        profiles = [self.customer, self.farmer, *self.riders]
+        return get_versions(PRICE, *(profile_scope(p.pk) for p in profiles))
+
+    def assertBumped(self, write, *scopes):
+        """``write()`` bumps exactly ``scopes``, and only after it commits."""
+        before = self.versions()
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+            self.assertEqual(self.versions(), before)
+        after = self.versions()
+        self.assertEqual({scope for scope in before if before[scope] != after[scope]}, set(scopes))
+
+    def test_a_new_price_bumps_the_price(self):
+        self.assertBumped(lambda: PaddyPrice.objects.create(price_per_kg=Decimal('42.00')), PRICE)
+
+    def test_an_order_bumps_its_customer_and_riders(self):
+        customer, rider, other_rider = (profile_scope(p.pk) for p in (self.customer, *self.riders))
+
+        self.order.delivery_personnel = self.riders[0]
+        self.assertBumped(self.order.save, customer, rider)
+
+        order = Order.objects.get(pk=self.order.pk)
+        order.delivery_personnel = self.riders[1]
+        # Off the first rider's dashboard, onto the other's
+        self.assertBumped(order.save, customer, rider, other_rider)
+
+    def test_a_supply_bumps_its_farmer(self):
+        PaddyPrice.objects.create(price_per_kg=Decimal('40.00'))
+        operator = create_profile(CustomUser.Role.MILL_OPERATOR, 'operator')
+
+        self.assertBumped(lambda: PaddySupply.objects.create(
+            farmer=self.farmer, mill_operator=operator.user, quantity=Decimal('100.00'), quality_rating=4,
+            moisture_content=Decimal('13.00'),
+        ), profile_scope(self.farmer.pk))
+
+    def test_templates_see_the_new_version(self):
+        request = RequestFactory().get('/')
+        request.profile = self.customer
+        before = fragment_cache(request)['fragment_versions']['user']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.save()
+
+        self.assertGreater(fragment_cache(request)['fragment_versions']['user'], before)
@@ -6,7 +6,7 @@ from .views import (
     delivery_dashboard, mill_operator_dashboard,
     UserListView, UserCreateView, UserUpdateView, UserDeleteView,
 )
-from . import views
+from . import api, sync, views
 
 urlpatterns = [
     # Landing Page
@@ -94,6 +94,24 @@ urlpatterns = [
 
     path('c-admin/orders/<int:pk>/ajax/', views.admin_order_detail_ajax, name='admin_order_detail_ajax'),
 
+    # Request metrics
+    path('c-admin/metrics/', views.metrics_dashboard, name='metrics_dashboard'),
+    path('c-admin/metrics/reset/', views.metrics_reset, name='metrics_reset'),
+    path('metrics/', views.metrics_prometheus, name='metrics_prometheus'),
+
+    # Sampling profiler
+    path('c-admin/profiler/', views.profiler_view, name='profiler'),
+    path('c-admin/profiler/stop/', views.profiler_stop, name='profiler_stop'),
+    path('c-admin/profiler/download/', views.profiler_download, name='profiler_download'),
+
+    # JSON API for the mobile apps (see core/api.py)
+    path('api/v1/orders/', api.orders, name='api-orders'),
+    path('api/v1/supplies/', api.supplies, name='api-supplies'),
+    path('api/v1/supplies/sync/', sync.sync_supplies, name='api-supplies-sync'),
+    path('api/v1/deliveries/', api.deliveries, name='api-deliveries'),
+    path('api/v1/prices/', api.prices, name='api-prices'),
+    path('api/v1/inventory/', api.inventory, name='api-inventory'),
+
     # # order>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
     # path('place_order/', views.place_order, name='place_order'),  # View for placing an order
     # path('order_list/', views.order_list, name='order_list'),  # View for listing all customer orders
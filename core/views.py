@@ -14,11 +14,15 @@ from .models import CustomUser, Customer, Delivery, DeliveryPersonnel, Farmer, O
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy
+from django.utils.functional import SimpleLazyObject
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 
-from django.db.models import Count
+from django.db.models import Count, Q
 from dal import autocomplete
 from django.contrib.auth import get_user_model
+from .decorators import cache_policy, query_budget, read_only_view
+from .httpcache import conditional_page
+from .idempotency import idempotent
 
 
 def landing_page(request):
@@ -26,6 +30,7 @@ def landing_page(request):
 
 
 # User Login View
+@cache_policy('no-store')
 def user_login(request):
     if request.method == 'POST':
         form = UserLoginForm(data=request.POST)
@@ -59,15 +64,18 @@ def user_logout(request):
     return redirect('login')
 
 # Registration Views (Only Admin, Farmers, and Customers can self-register)
+@cache_policy('no-store')
 def register_admin(request):
     if not request.user.is_superuser:
         messages.error(request, "Only superusers can register new admins.")
         return redirect('dashboard')
     return handle_registration(request, CustomUser.Role.ADMIN, 'core/auth/register_admin.html')
 
+@cache_policy('no-store')
 def register_farmer(request):
     return handle_registration(request, CustomUser.Role.FARMER, 'core/auth/register_farmer.html')
 
+@cache_policy('no-store')
 def register_customer(request):
     return handle_registration(request, CustomUser.Role.CUSTOMER, 'core/auth/register_customer.html')
 
@@ -90,6 +98,7 @@ def handle_registration(request, role, template):
 # Password Change View
 from django.contrib.auth.forms import PasswordChangeForm
 
+@cache_policy('no-store')
 @login_required
 def change_password(request):
     if request.method == 'POST':
@@ -136,6 +145,8 @@ def get_latest_paddy_price():
         return None
     
 
+@read_only_view
+@query_budget(9)
 @login_required
 def admin_dashboard(request):
     # Check if the user is an admin
@@ -149,8 +160,9 @@ def admin_dashboard(request):
     pending_approvals = CustomUser.objects.filter(is_active=False).count()  # Assuming inactive users are pending approval
     todays_orders = Order.objects.filter(created_at__date=datetime.today().date()).count()
     
-    # Get the latest Paddy price
-    paddy_price = get_latest_paddy_price()
+    # Get the latest Paddy price (only queried when the cached price
+    # fragment has expired)
+    paddy_price = SimpleLazyObject(get_latest_paddy_price)
     
     # Render the admin dashboard template
     return render(request, 'core/dashboards/admin_dashboard.html', {
@@ -164,6 +176,8 @@ def admin_dashboard(request):
 
 
 # >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Farmer Dashboard View
+@read_only_view
+@query_budget(7)
 @login_required
 def farmer_dashboard(request):
     if request.user.role != CustomUser.Role.FARMER:
@@ -178,7 +192,7 @@ def farmer_dashboard(request):
         return redirect('home')  # Or any other fallback page if no price is available
     
     # Fetch the current farmer's paddy supplies, ordered by most recent first
-    paddy_supplies = PaddySupply.objects.filter(farmer=request.user.farmer).order_by('-timestamp')[:5]  # Get the 5 most recent
+    paddy_supplies = PaddySupply.objects.filter(farmer=request.profile).select_related('farmer__user').order_by('-timestamp')[:5]  # Get the 5 most recent
 
     # Calculate total supplied paddy
     total_supplied = sum([supply.quantity for supply in paddy_supplies])
@@ -201,11 +215,12 @@ def farmer_dashboard(request):
 
 from django.db.models import Case, When, Value, IntegerField
 
+@read_only_view
+@query_budget(8)
 @login_required
 def customer_dashboard(request):
-    try:
-        customer = request.user.customer
-    except Customer.DoesNotExist:
+    customer = request.profile
+    if not customer:
         return render(request, 'core/dashboards/customer_dashboard.html', {
             'error': 'Customer profile not found.',
         })
@@ -217,19 +232,20 @@ def customer_dashboard(request):
             default=Value(0),
             output_field=IntegerField()
         )
-    ).order_by('-paid_priority', '-created_at')
+    ).order_by('-paid_priority', '-created_at').prefetch_related('items__package_size')
 
-    total_orders = orders.count()
-    pending_orders = orders.filter(status='pending').count()
-    paid_orders = orders.filter(status='paid').count()
-    delivered_orders = orders.filter(status='delivered').count()
+    # All four counters in one query, run only if the cached fragment
+    # holding them has expired
+    counts = SimpleLazyObject(lambda: Order.objects.filter(customer=customer).aggregate(
+        total_orders=Count('id'),
+        pending_orders=Count('id', filter=Q(status='pending')),
+        paid_orders=Count('id', filter=Q(status='paid')),
+        delivered_orders=Count('id', filter=Q(status='delivered')),
+    ))
 
     context = {
         'orders': orders[:5],  # Limit to 5 after ordering
-        'total_orders': total_orders,
-        'pending_orders': pending_orders,
-        'paid_orders': paid_orders,
-        'delivered_orders': delivered_orders,
+        'counts': counts,
     }
 
     return render(request, 'core/dashboards/customer_dashboard.html', context)
@@ -237,6 +253,8 @@ def customer_dashboard(request):
 
 
 # Delivery Dashboard View
+@read_only_view
+@query_budget(7)
 @login_required
 def delivery_dashboard(request):
     if request.user.role != CustomUser.Role.DELIVERY:
@@ -244,10 +262,10 @@ def delivery_dashboard(request):
         return redirect('login')
 
     # Fetch the latest paddy price
-    paddy_price = get_latest_paddy_price()
+    paddy_price = SimpleLazyObject(get_latest_paddy_price)
 
     # Get the logged-in user's delivery personnel instance
-    delivery_personnel = DeliveryPersonnel.objects.get(user=request.user)
+    delivery_personnel = request.profile
 
     # Get assigned orders that are not yet delivered or cancelled
     assigned_orders = Order.objects.filter(
@@ -263,13 +281,15 @@ def delivery_dashboard(request):
 
 
 # Mill Operator Dashboard View
+@read_only_view
+@query_budget(4)
 @login_required
 def mill_operator_dashboard(request):
     if request.user.role != CustomUser.Role.MILL_OPERATOR:
         messages.error(request, "You don't have permission to access this page.")
         return redirect('login')
     
-    paddy_price = get_latest_paddy_price()  # Get the latest paddy price
+    paddy_price = SimpleLazyObject(get_latest_paddy_price)  # Get the latest paddy price
     return render(request, 'core/dashboards/mill_operator_dashboard.html', {'paddy_price': paddy_price})
 
 
@@ -320,6 +340,7 @@ def get_profile_form(user):
     return None
 
 
+@cache_policy('no-store')
 @login_required
 def update_profile(request):
     user = request.user
@@ -363,6 +384,8 @@ def is_admin(user):
 # 🔹 View: List all usersfrom django.views.generic import ListView
 from .models import CustomUser  # Adjust import path as needed
 
+@read_only_view
+@query_budget(4)
 class UserListView(ListView):
     model = CustomUser
     template_name = 'core/dashboards/admin/users/user_list.html'
@@ -451,6 +474,9 @@ def success_view(request):
 
 
 # View to add paddy supply
+# Includes the paddy inventory update, which runs in the request while
+# TASKS_EAGER is on (development), creating the inventory row the first time
+@query_budget(18)
 def record_supply_view(request):
     if request.method == 'POST':
         form = MillOperatorPaddySupplyForm(request.POST)
@@ -495,6 +521,8 @@ def approve_payment_view(request, supply_id):
 
 
 login_required
+@read_only_view
+@query_budget(4)
 def paddy_supply_list_view(request):
     user = request.user
 
@@ -514,6 +542,8 @@ def paddy_supply_list_view(request):
 
 
 #<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<< 
+@read_only_view
+@query_budget(5)
 @login_required
 def inventory_view(request):
     # Get the inventories (assuming there's only one record of each)
@@ -528,6 +558,7 @@ def inventory_view(request):
     })
 
 
+@query_budget(14)
 @login_required
 def process_rice_view(request):
     processed_quantity = None  # This will hold the decimal quantity for the view
@@ -611,22 +642,27 @@ from django.utils import timezone
 
 
 
+@cache_policy('no-store')
+@query_budget(14)
 @login_required
+@idempotent
 def place_order_view(request):
     packages = PackageSize.objects.all()
 
     if request.method == 'POST':
-        customer = Customer.objects.get(user=request.user)
+        customer = request.profile
         order = Order.objects.create(customer=customer)
 
+        items = []
         for package in packages:
             quantity = int(request.POST.get(f'package_{package.id}', 0))
             if quantity > 0:
-                OrderItem.objects.create(
+                items.append(OrderItem(
                     order=order,
                     package_size=package,
                     quantity=quantity
-                )
+                ))
+        OrderItem.objects.bulk_create(items)
 
         order.calculate_totals()
         return render(request, 'core/orders/order_success.html')
@@ -634,16 +670,26 @@ def place_order_view(request):
     return render(request, 'core/orders/place_order.html', {'packages': packages})
 
 
+@read_only_view
+@query_budget(6)
 @login_required
+@conditional_page(lambda request: Order.objects.filter(customer=request.profile))
 def order_list(request):
-    customer = request.user.customer
-    orders = Order.objects.filter(customer=customer).order_by('-created_at')
+    customer = request.profile
+    orders = Order.objects.filter(customer=customer).prefetch_related('items__package_size').order_by('-created_at')
     return render(request, 'core/orders/order_list.html', {'orders': orders})
 
 
+@read_only_view
+@query_budget(6)
 @login_required
+@conditional_page(lambda request, order_id: Order.objects.filter(id=order_id, customer=request.profile))
 def order_details(request, order_id):
-    order = get_object_or_404(Order, id=order_id, customer=request.user.customer)
+    order = get_object_or_404(
+        Order.objects.select_related('transaction', 'delivery', 'delivery_personnel__user')
+        .prefetch_related('items__package_size'),
+        id=order_id, customer=request.profile,
+    )
     transaction = getattr(order, 'transaction', None)
     delivery = getattr(order, 'delivery', None)
     return render(request, 'core/orders/order_details.html', {
@@ -653,9 +699,14 @@ def order_details(request, order_id):
     })
 
 
+@cache_policy('no-store')
+# Includes record_sale, which runs in the request while TASKS_EAGER is on
+# and creates the sold inventory row the first time
+@query_budget(23)
 @login_required
+@idempotent
 def enter_transaction_code(request, order_id):
-    order = get_object_or_404(Order, id=order_id, customer=request.user.customer)
+    order = get_object_or_404(Order, id=order_id, customer=request.profile)
 
     if hasattr(order, 'transaction'):
         messages.warning(request, "You have already submitted a transaction code for this order.")
@@ -665,16 +716,25 @@ def enter_transaction_code(request, order_id):
         code = request.POST.get('transaction_code_customer')
 
         if code:
-            Transaction.objects.create(order=order, transaction_code_customer=code)
-            messages.success(request, "Transaction code submitted successfully!")
-            return redirect('order_details', order_id=order.id)
+            try:
+                Transaction.objects.create(order=order, transaction_code_customer=code)
+            except ValueError:
+                # Not enough processed rice; nothing was saved
+                messages.error(request, "Sorry, we don't have enough rice in stock for this order right now. "
+                                        "Please try again later or contact us.")
+            else:
+                messages.success(request, "Transaction code submitted successfully!")
+                return redirect('order_details', order_id=order.id)
         else:
             messages.error(request, "Please enter a valid transaction code.")
 
     return render(request, 'core/orders/enter_transaction_code.html', {'order': order})
 
 
+@read_only_view
+@query_budget(6)
 @login_required
+@conditional_page(lambda request, order_id: Order.objects.filter(id=order_id))
 def track_delivery(request, order_id):
     order = get_object_or_404(Order, id=order_id)
 
@@ -708,6 +768,8 @@ def is_admin(user):
 # @login_required(login_url='login')  # Ensure user is logged in
 # @user_passes_test(is_admin, login_url='login')  # Ensure user is admin
 
+@read_only_view
+@query_budget(4)
 def all_transactions(request):
     transactions = Transaction.objects.select_related('order', 'order__customer').order_by('-transaction_time')
 
@@ -741,6 +803,7 @@ from django.db import transaction
 def is_admin(user):
     return user.role == 'ADMIN'
 
+@query_budget(8)
 def assign_delivery(request):
     if request.method == 'POST':
         form = AssignDeliveryForm(request.POST)
@@ -749,8 +812,8 @@ def assign_delivery(request):
             order = form.cleaned_data['order']
             delivery_personnel = form.cleaned_data['delivery_personnel']
 
-            order.delivery_personnel = delivery_personnel
-            order.save()
+            # The form only offers paid orders
+            order.assign_delivery(delivery_personnel)
 
             messages.success(request, "Delivery personnel assigned successfully!")
             return redirect('assign_delivery')
@@ -774,22 +837,28 @@ def assign_delivery(request):
 
 
 
-from django.http import JsonResponse
-from django.template.loader import render_to_string
+@read_only_view
+@query_budget(4)
 @login_required
 def admin_order_list(request):
     all_orders = Order.objects.all().order_by('-created_at')
     return render(request, 'core/orders/admin_order_list.html', {'orders': all_orders})
 
+@read_only_view
+@query_budget(6)
 @login_required
+@conditional_page(lambda request, pk: Order.objects.filter(pk=pk))
 def admin_order_detail_ajax(request, pk):
-    order = get_object_or_404(Order, pk=pk)
-    html = render_to_string('core/orders/partials/order_detail_modal_content.html', {'order': order})
-    return JsonResponse({'html': html})
+    # Plain HTML: the modal drops it straight in, no JSON escaping to undo
+    order = get_object_or_404(
+        Order.objects.select_related('delivery_personnel__user').prefetch_related('items__package_size'), pk=pk,
+    )
+    return render(request, 'core/orders/partials/order_detail_modal_content.html', {'order': order})
 
 
 
 
+@query_budget(8)
 @login_required
 def update_delivery_status(request, order_id):
     # Ensure the logged-in user is a delivery personnel
@@ -798,14 +867,14 @@ def update_delivery_status(request, order_id):
         return redirect('login')
 
     # Get the logged-in delivery personnel
-    try:
-        delivery_personnel = DeliveryPersonnel.objects.get(user=request.user)
-    except DeliveryPersonnel.DoesNotExist:
+    delivery_personnel = request.profile
+    if not delivery_personnel:
         messages.error(request, "Delivery personnel not found.")
         return redirect('login')
 
-    # Get the order based on the passed order_id
-    order = get_object_or_404(Order, id=order_id)
+    # Get the order based on the passed order_id, with the customer that
+    # order_delivered() notifies
+    order = get_object_or_404(Order.objects.select_related('customer__user'), id=order_id)
 
     # Check if the order is assigned to the logged-in delivery personnel
     if order.delivery_personnel != delivery_personnel:
@@ -825,3 +894,120 @@ def update_delivery_status(request, order_id):
 
     return render(request, 'core/orders/update_delivery_status.html', {'order': order})
 
+
+
+
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> metrics
+import hmac
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_POST
+from .metrics import registry as metrics_registry
+from .slowqueries import slow_queries
+
+
+@login_required
+def metrics_dashboard(request):
+    if request.user.role != CustomUser.Role.ADMIN:
+        messages.error(request, "You don't have permission to access this page.")
+        return redirect('login')
+
+    return render(request, 'core/dashboards/admin/metrics.html', {
+        'views': metrics_registry.summary(),
+        'recent': metrics_registry.latest(50),
+        'slow_queries': slow_queries.summary(),
+        'slow_query_threshold': settings.SLOW_QUERY_THRESHOLD_MS,
+        'since': datetime.fromtimestamp(metrics_registry.started, tz=timezone.get_current_timezone()),
+    })
+
+
+@login_required
+@require_POST
+def metrics_reset(request):
+    if request.user.role != CustomUser.Role.ADMIN:
+        return HttpResponseForbidden("You don't have permission to reset metrics.")
+    metrics_registry.reset()
+    slow_queries.reset()
+    messages.success(request, "Metrics have been reset.")
+    return redirect('metrics_dashboard')
+
+
+@cache_policy('no-store')
+def metrics_prometheus(request):
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    token_ok = token and hmac.compare_digest(authorization, f'Bearer {token}')
+    admin_ok = request.user.is_authenticated and request.user.role == CustomUser.Role.ADMIN
+    if not (token_ok or admin_ok):
+        return HttpResponseForbidden("Metrics are only available to admins.")
+    return HttpResponse(metrics_registry.prometheus(), content_type='text/plain; version=0.0.4')
+
+
+
+
+# >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> profiler
+from .forms import ProfilerForm
+from .profiling import profiler
+
+
+@login_required
+def profiler_view(request):
+    if request.user.role != CustomUser.Role.ADMIN:
+        messages.error(request, "You don't have permission to access this page.")
+        return redirect('login')
+
+    if request.method == 'POST':
+        form = ProfilerForm(request.POST)
+        if form.is_valid():
+            data = form.cleaned_data
+            try:
+                profiler.start(
+                    data['mode'],
+                    seconds=data['seconds'],
+                    url_name=data['url_name'] or None,
+                    requests=data['requests'],
+                    interval=data['interval_ms'] / 1000,
+                )
+            except RuntimeError as e:
+                messages.error(request, str(e))
+            else:
+                messages.success(request, "Profiler started.")
+            return redirect('profiler')
+    else:
+        form = ProfilerForm()
+
+    status = profiler.status()
+    for key in ('started', 'finished'):
+        if status[key]:
+            status[key] = datetime.fromtimestamp(status[key], tz=timezone.get_current_timezone())
+    return render(request, 'core/dashboards/admin/profiler.html', {'form': form, 'status': status})
+
+
+@login_required
+@require_POST
+def profiler_stop(request):
+    if request.user.role != CustomUser.Role.ADMIN:
+        return HttpResponseForbidden("You don't have permission to stop the profiler.")
+    profiler.stop()
+    messages.success(request, "Profiler stopped.")
+    return redirect('profiler')
+
+
+@cache_policy('no-store')
+@login_required
+def profiler_download(request):
+    if request.user.role != CustomUser.Role.ADMIN:
+        return HttpResponseForbidden("You don't have permission to download profiles.")
+    # Collapsed stacks from either mode, or request mode's cProfile file
+    if request.GET.get('format') == 'pstats':
+        result, content_type, extension = profiler.pstats_result, 'application/octet-stream', 'prof'
+    else:
+        result, content_type, extension = profiler.result, 'text/plain; charset=utf-8', 'collapsed'
+    if not result:
+        messages.error(request, "There is no finished profile to download.")
+        return redirect('profiler')
+    response = HttpResponse(result, content_type=content_type)
+    filename = f"profile-{profiler.status()['pid']}-{int(profiler.finished)}.{extension}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
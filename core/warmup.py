@@ -0,0 +1,106 @@
+"""
+Template warm-up and ``{% load %}`` checks.
+
+With the cached loader a template is compiled the first time it's used and
+kept for the life of the worker. ``warm_templates()`` compiles all of the
+project's templates up front, so the first requests after a deploy don't pay
+for it. It runs from ``rmad_system/wsgi.py`` when ``TEMPLATE_WARMUP`` is on,
+and from ``manage.py warmtemplates``.
+"""
+import os
+import re
+import time
+
+from django.conf import settings
+from django.template import Engine, TemplateSyntaxError
+from django.template.base import Lexer, TokenType
+
+FILTER_RE = re.compile(r'\|\s*(\w+)')
+
+
+def _loader_dirs(loaders):
+    for loader in loaders:
+        if hasattr(loader, 'loaders'):  # the cached loader wraps the others
+            yield from _loader_dirs(loader.loaders)
+        elif hasattr(loader, 'get_dirs'):
+            yield from loader.get_dirs()
+
+
+def project_template_dirs(engine=None):
+    """Template directories inside the project (leaves Django's own admin etc. out)."""
+    engine = engine or Engine.get_default()
+    base = str(settings.BASE_DIR) + os.sep
+    dirs = dict.fromkeys(str(d) for d in _loader_dirs(engine.template_loaders))
+    return [d for d in dirs if d.startswith(base) and 'site-packages' not in d]
+
+
+def template_files(engine=None):
+    """
+    ``{name: path}`` of every template in the project, ``name`` being what
+    get_template() takes. Earlier directories win, as they do for the loaders.
+    """
+    files = {}
+    for directory in project_template_dirs(engine):
+        for root, _, filenames in os.walk(directory):
+            for filename in filenames:
+                if filename.endswith(('.html', '.txt')):
+                    path = os.path.join(root, filename)
+                    files.setdefault(os.path.relpath(path, directory).replace(os.sep, '/'), path)
+    return dict(sorted(files.items()))
+
+
+def warm_templates(engine=None):
+    """
+    Compile every project template into the loader cache. Returns the number
+    compiled, the seconds it took and a ``{name: error}`` dict of the ones
+    that don't compile.
+    """
+    engine = engine or Engine.get_default()
+    started = time.perf_counter()
+    compiled, errors = 0, {}
+    for name in template_files(engine):
+        try:
+            engine.get_template(name)
+        except TemplateSyntaxError as e:
+            errors[name] = e
+        else:
+            compiled += 1
+    return compiled, time.perf_counter() - started, errors
+
+
+def template_loads(source, engine):
+    """
+    The libraries named by the ``{% load %}`` tags of a template source, as
+    ``(library, status)`` pairs. ``status`` is ``'ok'``, ``'unresolved'`` (no
+    such library) or ``'unused'`` (none of its tags or filters appear in the
+    template).
+    """
+    loaded = []
+    used = set()
+    for token in Lexer(source).tokenize():
+        if token.token_type == TokenType.BLOCK:
+            bits = token.split_contents()
+            if not bits:
+                continue
+            if bits[0] == 'load':
+                if len(bits) > 3 and bits[-2] == 'from':
+                    # {% load tag other_tag from library %}
+                    loaded.append(bits[-1])
+                else:
+                    loaded.extend(bits[1:])
+            else:
+                used.add(bits[0])
+            used.update(FILTER_RE.findall(token.contents))
+        elif token.token_type == TokenType.VAR:
+            used.update(FILTER_RE.findall(token.contents))
+
+    result = []
+    for name in loaded:
+        library = engine.template_libraries.get(name)
+        if library is None:
+            result.append((name, 'unresolved'))
+        elif not used & (set(library.tags) | set(library.filters)):
+            result.append((name, 'unused'))
+        else:
+            result.append((name, 'ok'))
+    return result
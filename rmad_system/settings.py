@@ -10,6 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import copy
+import os
+import time
 from pathlib import Path
 from pyexpat.errors import messages
 
@@ -23,8 +26,12 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = 'django-insecure-1vs))nm12h+sp&7zs-@)1(59gwd8t3+)yawma@0%)z_&_&2a4h'
 
+# RMAD_PROFILE=production turns DEBUG off and compiles every template once
+# per worker (see TEMPLATES below). Anything else is the development setup.
+DEPLOYMENT_PROFILE = os.environ.get('RMAD_PROFILE', 'development')
+
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = DEPLOYMENT_PROFILE != 'production'
 
 ALLOWED_HOSTS = ['https://32d8-129-222-187-20.ngrok-free.app' , '*']
 CSRF_TRUSTED_ORIGINS = [
@@ -41,7 +48,7 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
+    'core.apps.StaticFilesConfig',  # django.contrib.staticfiles, see core/apps.py
 
     'core.apps.CoreConfig',
     'widget_tweaks',
@@ -53,21 +60,54 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Answers static file requests before anything else runs, so they don't
+    # show up in the request metrics either
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.MetricsMiddleware',
+    # Compresses HTML/JSON responses; the metrics above see the compressed size
+    'django.middleware.gzip.GZipMiddleware',
+    # After GZip so ETags are worked out on the uncompressed body
+    'django.middleware.http.ConditionalGetMiddleware',
+    'core.middleware.CachePolicyMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
+    'core.middleware.SlowQueryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaMiddleware',
 
     'core.middleware.RoleAccessMiddleware',
+    'core.middleware.ProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'rmad_system.urls'
 
+# Per-view query budgets declared with core.decorators.query_budget. Checked
+# only while enabled (development by default); 'raise' turns an exceeded budget
+# into an error instead of a logged warning.
+QUERY_BUDGET_ENABLED = DEBUG
+QUERY_BUDGET_ACTION = os.environ.get('RMAD_QUERY_BUDGET_ACTION', 'log')
+QUERY_BUDGET_MAX_DUPLICATES = 3
+
+# Request metrics (core.metrics), kept in each worker's memory and shown at
+# /c-admin/metrics/. /metrics/ serves them to Prometheus for admins, or for
+# scrapers sending "Authorization: Bearer <METRICS_TOKEN>" when a token is set.
+METRICS_ENABLED = True
+METRICS_BUFFER_SIZE = 1000
+METRICS_TOKEN = os.environ.get('RMAD_METRICS_TOKEN', '')
+
+# Queries slower than this are logged to "core.slowqueries" with their plan
+# and listed on the metrics page. 0 turns the slow-query log off.
+SLOW_QUERY_THRESHOLD_MS = int(os.environ.get('RMAD_SLOW_QUERY_MS', 100))
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # The stock Django backend with render timing for MetricsMiddleware
+        'BACKEND': 'core.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -76,11 +116,29 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.fragment_cache',
             ],
         },
     },
 ]
 
+if DEPLOYMENT_PROFILE == 'production':
+    # Spelled out instead of APP_DIRS so production never depends on the
+    # default loaders: templates are read and compiled once per worker and
+    # kept until it restarts. Development keeps the default loaders, which
+    # pick up template edits.
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
+# Compile all templates when a worker starts (rmad_system/wsgi.py) instead of
+# on the first request that uses each of them
+TEMPLATE_WARMUP = os.environ.get('RMAD_TEMPLATE_WARMUP', '1' if DEPLOYMENT_PROFILE == 'production' else '0') == '1'
+
 WSGI_APPLICATION = 'rmad_system.wsgi.application'
 
 
@@ -94,6 +152,81 @@ DATABASES = {
     }
 }
 
+# PRAGMAs run on every new SQLite connection (see core/db.py)
+SQLITE_PRAGMAS = {}
+
+# RMAD_DATABASE_PROFILE picks how the database is tuned:
+#   development        plain SQLite, a new connection per request (default)
+#   sqlite-production  SQLite for collection-centre installs. WAL lets readers
+#                      carry on while a supply is being recorded, connections
+#                      are reused between requests and writers wait for the
+#                      lock instead of failing with "database is locked".
+#   postgres           PostgreSQL for the central mill, where many writers run
+#                      at once. Connection details come from RMAD_DB_*; needs
+#                      psycopg[pool] (requirements.txt).
+DATABASE_PROFILE = os.environ.get('RMAD_DATABASE_PROFILE', 'development')
+
+if DATABASE_PROFILE == 'sqlite-production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': int(os.environ.get('RMAD_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Busy timeout, in seconds, when another connection holds the write lock
+            'timeout': 20,
+            # Take the write lock when the transaction starts, so two writers
+            # queue up instead of deadlocking when a read turns into a write
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        # Safe with WAL: a power cut can lose the last commits but never corrupts the file
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,  # 64 MB page cache per connection
+        'mmap_size': 268435456,  # 256 MB
+        'temp_store': 'MEMORY',
+    }
+elif DATABASE_PROFILE == 'postgres':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('RMAD_DB_NAME', 'rmad'),
+        'USER': os.environ.get('RMAD_DB_USER', 'rmad'),
+        'PASSWORD': os.environ.get('RMAD_DB_PASSWORD', ''),
+        'HOST': os.environ.get('RMAD_DB_HOST', 'localhost'),
+        'PORT': os.environ.get('RMAD_DB_PORT', '5432'),
+        # Pooled connections are checked before being handed out
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    pool_size = int(os.environ.get('RMAD_DB_POOL_SIZE', 10))
+    if pool_size:
+        # A per-process psycopg pool. Size it to the worker's threads; set
+        # RMAD_DB_POOL_SIZE=0 when PgBouncer sits in front of the database,
+        # which then gets persistent connections instead.
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': 2,
+            'max_size': pool_size,
+            'timeout': 10,
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('RMAD_CONN_MAX_AGE', 600))
+
+# Read replica for dashboards, lists and reports (views marked with
+# @read_only_view). RMAD_REPLICA_NAME is the replica's database name, or its
+# file for SQLite; RMAD_REPLICA_HOST overrides the host for PostgreSQL. The
+# replica has the same settings as the primary otherwise. After writing,
+# a user reads from the primary for REPLICA_STICKINESS_SECONDS.
+if os.environ.get('RMAD_REPLICA_NAME'):
+    DATABASES['replica'] = copy.deepcopy(DATABASES['default'])
+    DATABASES['replica']['NAME'] = os.environ['RMAD_REPLICA_NAME']
+    if os.environ.get('RMAD_REPLICA_HOST'):
+        DATABASES['replica']['HOST'] = os.environ['RMAD_REPLICA_HOST']
+    # Tests see a single database
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+REPLICA_STICKINESS_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -114,6 +247,23 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing profile. 'fast' puts a cheap hasher first for tests and
+# bulk-loading dev data; never enable it in production. The stock hashers stay
+# listed so existing passwords keep verifying, but accounts created under
+# 'fast' can only log in while it is enabled.
+PASSWORD_HASHER_PROFILE = os.environ.get('RMAD_PASSWORD_HASHER_PROFILE', 'default')
+
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+if PASSWORD_HASHER_PROFILE == 'fast':
+    PASSWORD_HASHERS.insert(0, 'django.contrib.auth.hashers.MD5PasswordHasher')
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -136,10 +286,20 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 # Static & Media Files
+# core/static is found through the app, no STATICFILES_DIRS entry needed
+# (listing it as well made collectstatic copy everything twice)
 STATIC_URL = 'static/'
-STATICFILES_DIRS = [BASE_DIR / 'core/static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+if DEPLOYMENT_PROFILE == 'production':
+    # collectstatic writes content-hashed copies plus .gz/.br versions of
+    # every file, and WhiteNoiseMiddleware serves the hashed names with a
+    # one-year "immutable" Cache-Control header
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+    }
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
@@ -157,7 +317,109 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # messages.success(Self.request, "User added successfully!")
 # messages.error(Self.request, "Error creating user. Please check the form.")
+# EmailOrUsernameModelBackend already covers exact email logins, so the stock
+# ModelBackend is not listed as a fallback: it would repeat the lookup and the
+# password hash on every failed attempt. Permissions for the admin are
+# unchanged, the backend inherits them from ModelBackend.
 AUTHENTICATION_BACKENDS = [
     'core.backends.EmailOrUsernameModelBackend',  # <-- Replace `core` with your app name
-    'django.contrib.auth.backends.ModelBackend',
 ]
+
+# Seconds an unknown email/username is remembered by the login backend
+AUTH_NEGATIVE_CACHE_TIMEOUT = 60
+
+# Seconds a logged-in user (with their profile) is kept in the cache by the
+# login backend instead of being loaded on every request
+USER_CACHE_TIMEOUT = int(os.environ.get('RMAD_USER_CACHE_SECONDS', 300))
+
+# Cache used by the login backend, the sessions and the template fragments
+# (core/fragments.py). The default in-process memory cache is only right for
+# a single worker: with several, a logout or an edit in one worker wouldn't
+# reach the copies cached by the others, so point RMAD_REDIS_URL at a shared
+# Redis (needs the redis package), or, for a single-machine install,
+# RMAD_CACHE_DIR at a directory all workers can write. The production profile
+# refuses to start without one of them (core.checks.check_shared_cache).
+if os.environ.get('RMAD_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['RMAD_REDIS_URL'],
+        }
+    }
+elif os.environ.get('RMAD_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['RMAD_CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'rmad',
+        }
+    }
+
+# Seconds a cached template fragment lives (see core/fragments.py). Edits
+# don't wait for it: they move the fragment to a new version.
+FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('RMAD_FRAGMENT_CACHE_SECONDS', 600))
+
+# Cache-Control policy (see core/httpcache.py) of views that don't pick one
+# with @cache_policy
+CACHE_POLICY_DEFAULT = 'private'
+
+
+def _git_head():
+    """The commit checked out in BASE_DIR, read without running git; None outside a checkout."""
+    git_dir = BASE_DIR / '.git'
+    try:
+        head = (git_dir / 'HEAD').read_text().strip()
+        if not head.startswith('ref: '):
+            return head
+        ref = head[len('ref: '):]
+        if (git_dir / ref).exists():
+            return (git_dir / ref).read_text().strip()
+        for line in (git_dir / 'packed-refs').read_text().splitlines():
+            if line.endswith(' ' + ref):
+                return line.split()[0]
+    except OSError:
+        pass
+    return None
+
+
+# Goes into the ETags of the order pages so a deploy doesn't answer 304 with
+# pages rendered by the old templates, and must be the same in every worker.
+# Set it to the release (e.g. the git commit); production otherwise uses the
+# checked-out commit and refuses to start without either (core.E003).
+# Development counts every restart as a new release, so template edits show.
+RELEASE = os.environ.get('RMAD_RELEASE') or (str(time.time_ns()) if DEBUG else _git_head())
+
+# Seconds an idempotency key and its stored response are kept (see
+# core/idempotency.py)
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('RMAD_IDEMPOTENCY_KEY_SECONDS', 24 * 60 * 60))
+
+# Background tasks (core/tasks.py) run in `manage.py runworker`. With
+# RMAD_TASKS_EAGER=1 (the default in development) they run in the web process
+# right after the commit instead, so no worker is needed; failed tasks are
+# then retried after later commits rather than by a worker loop.
+TASKS_EAGER = os.environ.get('RMAD_TASKS_EAGER', '1' if DEBUG else '0') == '1'
+# Seconds before the first retry of a failed task; doubles with each attempt
+TASK_RETRY_DELAY = 10
+
+# SMS/email notifications are written to an outbox (core/notifications.py)
+# and sent by `manage.py sendnotifications`. Providers are dotted paths per
+# channel; the defaults print to the console, RMAD_*_PROVIDER=
+# core.notifications.FileProvider writes JSON lines to RMAD_NOTIFICATION_FILE,
+# and core.notifications.EmailProvider uses EMAIL_BACKEND.
+NOTIFICATION_PROVIDERS = {
+    'sms': os.environ.get('RMAD_SMS_PROVIDER', 'core.notifications.ConsoleProvider'),
+    'email': os.environ.get('RMAD_EMAIL_PROVIDER', 'core.notifications.ConsoleProvider'),
+}
+NOTIFICATION_FILE = os.environ.get('RMAD_NOTIFICATION_FILE', str(BASE_DIR / 'notifications.jsonl'))
+# Seconds before the first retry of a failed message; doubles with each attempt
+NOTIFICATION_RETRY_DELAY = 30
+NOTIFICATION_MAX_ATTEMPTS = 10
+
+# Sessions are read from the cache and only fall back to the database on a miss
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rmad_system.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.TEMPLATE_WARMUP:
+    # Fill the template cache before the first request (with gunicorn
+    # --preload, once in the master for all workers)
+    from core.warmup import warm_templates  # noqa: E402
+
+    warm_templates()